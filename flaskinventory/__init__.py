@@ -94,6 +94,11 @@ def create_app(config_class=Config, config_json=None):
 
     dgraph.init_app(app)
     login_manager.init_app(app)
+
+    if app.config.get('DEFERRED_ENRICHMENT'):
+        from flaskinventory.main.enrichment import init_enrichment, start_workers_on_first_request
+        init_enrichment(app, workers=0)
+        start_workers_on_first_request(app)
     mail.init_app(app)
 
     csrf = CSRFProtect(app)
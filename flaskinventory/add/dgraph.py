@@ -3,7 +3,6 @@ from flask_login import current_user
 from flaskinventory.users.constants import USER_ROLES
 from flask import flash
 from flaskinventory.auxiliary import icu_codes_list
-from pydgraph import Txn
 import json
 
 
@@ -19,14 +18,7 @@ async def generate_fieldoptions():
     query_string = '{ ' + query_channel + query_country + \
         query_dataset + query_archive + query_subunit + query_multinational + ' }'
 
-    # Use async query here because a lot of data is retrieved
-    query_future = dgraph.connection.txn().async_query(query_string)
-    res = Txn.handle_query_future(query_future)
-
-    # data = dgraph.query(query_string)
-
-    res = dgraph.connection.txn(read_only=True).query(query_string)
-    data = json.loads(res.json, object_hook=dgraph.datetime_hook)
+    data = dgraph.query(query_string, cache=True)
 
     data['language'] = icu_codes_list
 
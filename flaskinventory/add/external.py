@@ -71,19 +71,22 @@ def build_url(site: str):
     except Exception as e:
         return False
 
-def perform_request(site: str) -> requests.Response:
+REQUEST_HEADERS = {'user-agent':
+                   "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.45 Safari/537.36"}
 
-    headers = {'user-agent':
-               "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.45 Safari/537.36"}
+
+def perform_request(site: str, timeout: float = None) -> requests.Response:
+
+    headers = REQUEST_HEADERS
 
     try:
-        r = requests.get(site, headers=headers)
+        r = requests.get(site, headers=headers, timeout=timeout)
     except (requests.exceptions.SSLError, requests.exceptions.ConnectionError):
         try:
-            r = requests.get(site, verify=False, headers=headers)
+            r = requests.get(site, verify=False, headers=headers, timeout=timeout)
         except (requests.exceptions.SSLError, requests.exceptions.ConnectionError):
             try:
-                r = requests.get(site.replace('https', 'http'), verify=False, headers=headers)
+                r = requests.get(site.replace('https', 'http'), verify=False, headers=headers, timeout=timeout)
             except Exception as e:
                 current_app.logger.error(f'Error when requesting {site}: {e}')
                 raise InventoryValidationError(
@@ -111,7 +114,11 @@ def test_url(site):
     return False
 
 
-def find_sitemaps(site: str) -> list:
+def find_sitemaps(site: str, response: requests.Response = None, timeout: float = None) -> list:
+    """
+        Sitemaps listed in the robots.txt of `site`.
+        `response` is the already fetched homepage (if available)
+    """
     site = build_url(site)
     if not site:
         return []
@@ -119,7 +126,7 @@ def find_sitemaps(site: str) -> list:
     if site.endswith('/'):
         site = site[:-1]
 
-    r = perform_request(site)
+    r = response if response is not None else perform_request(site, timeout=timeout)
     if not r:
         return []
 
@@ -127,10 +134,13 @@ def find_sitemaps(site: str) -> list:
         raise requests.RequestException(
             f'Could not reach {site}. Status: {r.status_code}')
     try:
+        robots = requests.get(site + '/robots.txt', headers=REQUEST_HEADERS, timeout=timeout)
+        if not robots.ok:
+            return []
         rp = RobotFileParser()
         rp.set_url(site + '/robots.txt')
-        rp.read()
-        if len(rp.sitemaps) > 0:
+        rp.parse(robots.text.splitlines())
+        if rp.sitemaps and len(rp.sitemaps) > 0:
             return rp.sitemaps
         else:
             return []
@@ -139,7 +149,19 @@ def find_sitemaps(site: str) -> list:
         return []
 
 
-def find_feeds(site: str) -> list:
+def _parse_feed(url: str, timeout: float = None) -> feedparser.FeedParserDict:
+    try:
+        r = requests.get(url, headers=REQUEST_HEADERS, timeout=timeout)
+    except requests.RequestException:
+        return None
+    return feedparser.parse(r.content)
+
+
+def find_feeds(site: str, response: requests.Response = None, timeout: float = None) -> list:
+    """
+        RSS feeds of `site`.
+        `response` is the already fetched homepage (if available)
+    """
     site = build_url(site)
     if not site:
         return []
@@ -149,13 +171,13 @@ def find_feeds(site: str) -> list:
 
     # first: naive approach
     try:
-        r = perform_request(site + '/rss')
+        r = perform_request(site + '/rss', timeout=timeout)
         if 'xml' in r.headers['Content-Type'] or 'rss' in r.headers['Content-Type']:
             return [site + '/rss']
     except Exception:
         pass
 
-    r = perform_request(site)
+    r = response if response is not None else perform_request(site, timeout=timeout)
     if not r:
         return []
 
@@ -190,14 +212,18 @@ def find_feeds(site: str) -> list:
         else:
             netloc = parsed_feed_url.netloc
         feed_url = scheme + '://' + netloc + parsed_feed_url.path
-        f = feedparser.parse(feed_url)
-        if len(f.entries) > 0:
+        f = _parse_feed(feed_url, timeout=timeout)
+        if f and len(f.entries) > 0:
             if feed_url not in result:
                 result.append(feed_url)
     return result
 
 
-def parse_meta(url: str) -> dict:
+def parse_meta(url: str, response: requests.Response = None, timeout: float = None) -> dict:
+    """
+        Names and urls from the opengraph and schema.org tags of `url`.
+        `response` is the already fetched homepage (if available)
+    """
 
     urls = []
     names = []
@@ -206,7 +232,7 @@ def parse_meta(url: str) -> dict:
     if not site:
         return {'names': False, 'urls': False}
 
-    r = perform_request(site)
+    r = response if response is not None else perform_request(site, timeout=timeout)
 
     if not r:
         return {'names': False, 'urls': False}
@@ -270,7 +296,7 @@ def schemaorg(soup: str) -> Tuple[str, str]:
     return name, url
 
 
-def siterankdata(site: str) -> Union[int, bool]:
+def siterankdata(site: str, timeout: float = 30) -> Union[int, bool]:
     if not isinstance(site, str):
         site = str(site)
     site = site.replace('http://', '').replace('https://',
@@ -279,7 +305,7 @@ def siterankdata(site: str) -> Union[int, bool]:
         site = site[:-1]
 
     current_app.logger.debug(f'requesting: {"https://siterankdata.com/" + site}')
-    r = requests.get("https://siterankdata.com/" + site, timeout=30)
+    r = requests.get("https://siterankdata.com/" + site, timeout=timeout)
 
     if r.status_code != 200:
         current_app.logger.debug(f'Getting siterankdata failed! Status code: {r.status_code}')
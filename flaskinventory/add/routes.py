@@ -155,11 +155,7 @@ def new(dgraph_type=None, draft=None, populate_form: dict = None):
                 return redirect(url_for('add.new', dgraph_type=dgraph_type))
 
         try:
-            if sanitizer.is_upsert:
-                result = dgraph.upsert(
-                    sanitizer.upsert_query, del_nquads=sanitizer.delete_nquads, set_nquads=sanitizer.set_nquads)
-            else:
-                result = dgraph.upsert(None, set_nquads=sanitizer.set_nquads)
+            result = sanitizer.commit()
             flash(f'{dgraph_type} has been added!', 'success')
             if sanitizer.is_upsert:
                 uid = str(sanitizer.entry_uid)
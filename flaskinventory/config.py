@@ -32,6 +32,18 @@ class Config:
     INSTAGRAM_USERNAME = os.environ.get("INSTAGRAM_USERNAME", None)
     INSTAGRAM_PASSWORD = os.environ.get("INSTAGRAM_PASSWORD", None)
 
+    # seconds, timeout of each request to external websites / APIs
+    EXTERNAL_REQUEST_TIMEOUT = float(os.environ.get("EXTERNAL_REQUEST_TIMEOUT", 10))
+    # seconds, all lookups for a new website source have to finish within this time
+    SOURCE_ENRICHMENT_DEADLINE = float(os.environ.get("SOURCE_ENRICHMENT_DEADLINE", 20))
+
+    # store new entries right away and run wikidata / geocoding / profile lookups in the background
+    DEFERRED_ENRICHMENT = os.environ.get("DEFERRED_ENRICHMENT", "").lower() in ('1', 'true', 'yes')
+    # SQLite database of the enrichment job queue
+    ENRICHMENT_QUEUE = os.environ.get("ENRICHMENT_QUEUE", os.path.join(os.getcwd(), 'enrichment_queue.sqlite'))
+    # number of worker threads per app process (0: only use `tools/enrichment.py`)
+    ENRICHMENT_WORKERS = int(os.environ.get("ENRICHMENT_WORKERS", 2))
+
 
 """ Configure Logging """
 
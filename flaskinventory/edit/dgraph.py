@@ -3,7 +3,7 @@ from string import ascii_letters
 from flaskinventory import dgraph
 from flask import current_app
 from flaskinventory.flaskdgraph import Schema
-from flaskinventory.flaskdgraph.dgraph_types import UID, Variable, Scalar, make_nquad, dict_to_nquad
+from flaskinventory.flaskdgraph.dgraph_types import UID, Variable, Scalar, make_nquad, serialize_nquads
 
 def get_entry(unique_name=None, uid=None):
     query_string = 'query get_entry($query: string) {'
@@ -83,7 +83,7 @@ def draft_delete(uid):
     del_nquads = " \n ".join(del_nquads)
 
     deleted = {'uid': uid, 'entry_review_status': 'deleted'}
-    set_nquads = " \n ".join(dict_to_nquad(deleted))
+    set_nquads = serialize_nquads(deleted, sep=" \n ")
 
     dgraph.upsert(query, del_nquads=del_nquads)
     dgraph.upsert(None, set_nquads=set_nquads)
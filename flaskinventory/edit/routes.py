@@ -100,8 +100,7 @@ def refresh_wikidata():
         return redirect(url_for('edit.edit_uid', uid=uid, **request.args))
 
     try:
-        result = dgraph.upsert(
-            sanitizer.upsert_query, del_nquads=sanitizer.delete_nquads, set_nquads=sanitizer.set_nquads)
+        result = sanitizer.commit()
         current_app.logger.debug(result)
         flash(f'WikiData has been refreshed', 'success')
         return redirect(url_for('edit.edit_uid', uid=uid, **request.args))
@@ -178,8 +177,7 @@ def entry(dgraph_type=None, unique_name=None, uid=None):
             flash(f'{dgraph_type} could not be updated: {e}', 'danger')
             return redirect(url_for('edit.entry', dgraph_type=dgraph_type, uid=uid, **request.args))
         try:
-            result = dgraph.upsert(
-                sanitizer.upsert_query, del_nquads=sanitizer.delete_nquads, set_nquads=sanitizer.set_nquads)
+            result = sanitizer.commit()
             if request.form.get('accept'):
                 flash(f'{dgraph_type} has been edited and accepted', 'success')
                 send_acceptance_notification(uid)
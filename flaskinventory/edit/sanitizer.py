@@ -1,4 +1,4 @@
-from flaskinventory.flaskdgraph.dgraph_types import (UID, dict_to_nquad, Scalar)
+from flaskinventory.flaskdgraph.dgraph_types import (UID, serialize_nquads, Scalar)
 from flaskinventory.errors import InventoryValidationError, InventoryPermissionError
 from flaskinventory.main.sanitizer import Sanitizer
 from flaskinventory.users.constants import USER_ROLES
@@ -47,8 +47,7 @@ class EditAudienceSizeSanitizer(Sanitizer):
         self.parse_audience_size()
 
         self.delete_nquads = self._make_delete_nquads()
-        nquads = dict_to_nquad(self.entry)
-        self.set_nquads = " \n ".join(nquads)
+        self.set_nquads = serialize_nquads(self.entry, sep=" \n ")
 
     def _add_entry_meta(self, entry):
         facets = {'timestamp': datetime.datetime.now(
@@ -69,8 +68,7 @@ class EditAudienceSizeSanitizer(Sanitizer):
             for predicate in val:
                 del_obj.append({'uid': key, predicate: '*'})
 
-        nquads = [" \n ".join(dict_to_nquad(obj)) for obj in del_obj]
-        return " \n ".join(nquads)
+        return serialize_nquads(*del_obj, sep=" \n ")
 
     def _check_channel(self):
         query_string = f'{{ q(func: uid({self.entry_uid.query})) {{ channel {{ unique_name }} }} }}'
@@ -143,10 +143,7 @@ def submit():
 
     
     try:
-        if sanitizer.is_upsert:
-            result = dgraph.upsert(sanitizer.upsert_query, del_nquads=sanitizer.delete_nquads, set_nquads=sanitizer.set_nquads)
-        else:
-            result = dgraph.upsert(None, del_nquads=sanitizer.delete_nquads, set_nquads=sanitizer.set_nquads)
+        result = sanitizer.commit()
     except Exception as e:
         error = {'error': f'{e}'}
         tb_str = ''.join(traceback.format_exception(
@@ -0,0 +1,198 @@
+"""
+    Bulk mutations in bounded transactions
+    Streams nquads or mutation objects into chunks of a fixed size and
+    commits each chunk in its own transaction.
+    Blank nodes (`_:name`) that were created by an earlier chunk are replaced
+    by their uid in later chunks, so references across chunks stay intact.
+"""
+
+import itertools
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Union
+
+import pydgraph
+
+from .retry import RetryPolicy, creates_nodes
+
+_blank_node_regex = re.compile(r'_:([\w.\-]+)')
+
+
+class BulkResult:
+
+    """
+        Outcome of a bulk mutation.
+        `uids` maps blank node names to the uids DGraph assigned to them,
+        `failed` is a list of `(chunk number, error, items)`
+    """
+
+    def __init__(self) -> None:
+        self.chunks = 0
+        self.items = 0
+        self.uids = {}
+        self.failed = []
+
+    def __repr__(self) -> str:
+        return f'<DGraph BulkResult {self.chunks} chunks, {self.items} items, {len(self.failed)} failed chunks>'
+
+    @property
+    def ok(self) -> bool:
+        return len(self.failed) == 0
+
+
+def transaction_writer(client: pydgraph.DgraphClient, retry_policy: RetryPolicy = None) -> Callable:
+    """
+        Make a `write(operation)` function for a plain pydgraph client
+        (e.g., in scripts without a flask app)
+    """
+    retry_policy = retry_policy or RetryPolicy()
+
+    def write(operation, idempotent=True):
+        def attempt():
+            txn = client.txn()
+            try:
+                return operation(txn)
+            finally:
+                txn.discard()
+        return retry_policy.call(attempt, idempotent=idempotent)
+
+    return write
+
+
+def _chunks(items: Iterable, chunk_size: int):
+    # consecutive items of the same kind (nquads or objects) form a chunk
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if len(chunk) == 0:
+            return
+        start = 0
+        for i in range(1, len(chunk)):
+            if isinstance(chunk[i], (str, bytes)) != isinstance(chunk[start], (str, bytes)):
+                yield chunk[start:i]
+                start = i
+        yield chunk[start:]
+
+
+def _resolve_blank_nodes(item: Union[str, dict, list], uids: dict):
+    if len(uids) == 0:
+        return item
+    if isinstance(item, bytes):
+        item = item.decode('utf-8')
+    if isinstance(item, str):
+        return _blank_node_regex.sub(
+            lambda m: f'<{uids[m.group(1)]}>' if m.group(1) in uids else m.group(0), item)
+    if isinstance(item, list):
+        return [_resolve_blank_nodes(i, uids) for i in item]
+    if isinstance(item, dict):
+        resolved = {}
+        for key, val in item.items():
+            if key == 'uid' and isinstance(val, str) and val.startswith('_:') and val[2:] in uids:
+                resolved[key] = uids[val[2:]]
+            elif isinstance(val, (dict, list)):
+                resolved[key] = _resolve_blank_nodes(val, uids)
+            else:
+                resolved[key] = val
+        return resolved
+    return item
+
+
+def bulk_mutate(write: Callable,
+                items: Iterable,
+                chunk_size: int = 1000,
+                concurrency: int = 1,
+                delete: bool = False,
+                progress: Callable = None) -> BulkResult:
+    """
+        Commit `items` (nquad strings or mutation objects) in chunks of `chunk_size`.
+
+        :param write:
+            function `write(operation, idempotent=...)` that runs `operation(txn)` in a transaction
+            (e.g., `DGraph.write` or `transaction_writer(client)`)
+        :param concurrency:
+            number of chunks in flight at once. Blank nodes can only be shared
+            across chunks when chunks are committed one after another (`concurrency=1`)
+        :param delete:
+            delete the nquads / objects instead of setting them
+        :param progress:
+            called after every chunk with `(chunk number, number of items, error or None)`
+
+        Failing chunks do not stop the import, they are collected in `BulkResult.failed`
+    """
+    logger = logging.getLogger(__name__)
+    result = BulkResult()
+
+    def commit(chunk: list):
+        nquads = [item for item in chunk if isinstance(item, (str, bytes))]
+        payload = "\n".join(n.decode('utf-8') if isinstance(n, bytes) else n
+                            for n in nquads)
+
+        def operation(txn):
+            if len(nquads) > 0:
+                if delete:
+                    response = txn.mutate(del_nquads=payload)
+                else:
+                    response = txn.mutate(set_nquads=payload)
+            else:
+                if delete:
+                    response = txn.mutate(del_obj=chunk)
+                else:
+                    response = txn.mutate(set_obj=chunk)
+            txn.commit()
+            return response
+
+        # a chunk with new nodes is not retried after a transient error,
+        # it might have been committed already
+        if delete:
+            idempotent = True
+        elif len(nquads) > 0:
+            idempotent = not creates_nodes(set_nquads=payload)
+        else:
+            idempotent = not creates_nodes(set_obj=chunk)
+        return write(operation, idempotent=idempotent)
+
+    def finish(number: int, chunk: list, response=None, error=None):
+        result.chunks += 1
+        result.items += len(chunk)
+        if error is not None:
+            logger.error(f'Bulk mutation: chunk {number} failed: {error}')
+            result.failed.append((number, error, chunk))
+        elif response is not None:
+            result.uids.update(dict(response.uids))
+        if progress:
+            progress(number, len(chunk), error)
+
+    if concurrency <= 1:
+        for number, chunk in enumerate(_chunks(items, chunk_size)):
+            chunk = _resolve_blank_nodes(chunk, result.uids)
+            try:
+                response = commit(chunk)
+            except Exception as e:
+                finish(number, chunk, error=e)
+                continue
+            finish(number, chunk, response=response)
+        return result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = {}
+        for number, chunk in enumerate(_chunks(items, chunk_size)):
+            in_flight[number] = (chunk, executor.submit(commit, chunk))
+            # keep the number of buffered chunks bounded
+            if len(in_flight) >= concurrency * 2:
+                oldest = min(in_flight)
+                _collect(oldest, in_flight.pop(oldest), finish)
+        for number in sorted(in_flight):
+            _collect(number, in_flight[number], finish)
+
+    return result
+
+
+def _collect(number: int, pending: tuple, finish: Callable) -> None:
+    chunk, future = pending
+    try:
+        response = future.result()
+    except Exception as e:
+        finish(number, chunk, error=e)
+        return
+    finish(number, chunk, response=response)
@@ -0,0 +1,282 @@
+"""
+    Result cache for read-only DGraph queries
+    Entries are keyed by query text plus variables and expire after a TTL.
+    The least recently used entry is evicted when the cache is full.
+    Each entry carries tags (`uid:0x123`, `type:Source`) so writes can
+    invalidate only what they touch. Entries are also tagged with the uids
+    of all nodes in the response, so a change to an embedded node
+    (e.g., the country of a source) drops the entry.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+
+# tag for entries that do not refer to a specific uid
+# (e.g., lists of all entries of a type)
+COLLECTION_TAG = 'collection'
+# tag for collections that are not restricted to any type
+UNTYPED_TAG = 'untyped'
+
+_uid_regex = re.compile(r'\b(0x[0-9a-fA-F]+)\b')
+_type_regex = re.compile(r'type\(\s*"?([A-Za-z_]+)"?\s*\)')
+_nquad_type_regex = re.compile(r'<dgraph\.type>\s+"([A-Za-z_]+)"')
+_nquad_var_regex = re.compile(r'\b(?:uid|val)\(')
+_response_uid_regex = re.compile(rb'"uid"\s*:\s*"(0x[0-9a-fA-F]+)"')
+
+
+def make_key(query_string: str, variables: dict = None) -> tuple:
+    if variables:
+        return (query_string, tuple(sorted(variables.items())))
+    return (query_string, None)
+
+
+def response_uids(raw: bytes) -> set:
+    """ Uids of all nodes in a raw JSON response """
+    if isinstance(raw, str):
+        raw = raw.encode('utf-8')
+    return {uid.decode('ascii').lower() for uid in _response_uid_regex.findall(raw or b'')}
+
+
+def query_tags(query_string: str, variables: dict = None, response: bytes = None) -> set:
+    """
+        Derive invalidation tags from a query
+        Queries about specific uids are tagged by uid, all other queries are
+        tagged as collections of the dgraph types they filter for.
+        With the raw `response`, the uids of all nodes it contains are added.
+        `query_tags('{ q(func: type("Source")) { uid } }')` -> {'type:Source', 'collection'}
+    """
+    uids = set(_uid_regex.findall(query_string))
+    if variables:
+        for val in variables.values():
+            uids.update(_uid_regex.findall(str(val)))
+    if len(uids) > 0:
+        tags = {f'uid:{uid.lower()}' for uid in uids}
+    else:
+        tags = {f'type:{t}' for t in _type_regex.findall(query_string)}
+        if len(tags) == 0:
+            tags.add(UNTYPED_TAG)
+        tags.add(COLLECTION_TAG)
+    if response:
+        tags.update(f'uid:{uid}' for uid in response_uids(response))
+    return tags
+
+
+def mutation_targets(obj: Union[dict, list, str, None]) -> tuple:
+    """
+        Find uids and dgraph types that are touched by a mutation.
+        Accepts JSON mutation objects or nquad strings.
+        Returns a tuple of two sets and a bool: `(uids, types, has_variables)`
+    """
+    uids = set()
+    types = set()
+    has_variables = False
+
+    if obj is None:
+        pass
+    elif isinstance(obj, (str, bytes)):
+        if isinstance(obj, bytes):
+            obj = obj.decode('utf-8')
+        uids.update(uid.lower() for uid in _uid_regex.findall(obj))
+        types.update(_nquad_type_regex.findall(obj))
+        has_variables = _nquad_var_regex.search(obj) is not None
+    elif isinstance(obj, dict):
+        for key, val in obj.items():
+            if key == 'uid' and isinstance(val, str):
+                if val.startswith('0x'):
+                    uids.add(val.lower())
+                elif _nquad_var_regex.match(val):
+                    has_variables = True
+            elif key == 'dgraph.type':
+                if isinstance(val, str):
+                    types.add(val)
+                else:
+                    types.update(val)
+            elif isinstance(val, (dict, list)):
+                u, t, v = mutation_targets(val)
+                uids |= u
+                types |= t
+                has_variables = has_variables or v
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            u, t, v = mutation_targets(item)
+            uids |= u
+            types |= t
+            has_variables = has_variables or v
+
+    return uids, types, has_variables
+
+
+class QueryCache:
+
+    """
+        LRU cache with TTL for raw DGraph query responses.
+        Stores the raw JSON (bytes) so every hit returns a fresh object.
+
+        :param maxsize:
+            maximum number of cached queries
+        :param ttl:
+            seconds a cached response stays valid
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f'<DGraph QueryCache {len(self)}/{self.maxsize} entries, ttl={self.ttl}>'
+
+    def get(self, key: tuple) -> Union[bytes, None]:
+        with self._lock:
+            try:
+                expires, value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: tuple, value: bytes, tags: set = None, ttl: float = None) -> None:
+        tags = frozenset(tags or [COLLECTION_TAG])
+        ttl = ttl or self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def _remove(self, key: tuple) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if len(keys) == 0:
+                del self._tags[tag]
+
+    def invalidate_tags(self, tags: list) -> int:
+        """ Drop all entries that carry any of the tags. Returns number of dropped entries """
+        dropped = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, [])):
+                    if key in self._entries:
+                        self._remove(key)
+                        dropped += 1
+        return dropped
+
+    def invalidate(self, uids: set = None, types: set = None, collections=False) -> int:
+        """
+            Invalidate entries by uid and by dgraph type.
+            Collections that are not restricted to a type are always dropped.
+            If `collections` is True, drops all entries that are not about specific uids.
+        """
+        tags = [f'uid:{uid.lower()}' for uid in (uids or [])]
+        tags += [f'type:{t}' for t in (types or [])]
+        tags.append(UNTYPED_TAG)
+        if collections:
+            tags.append(COLLECTION_TAG)
+        return self.invalidate_tags(tags)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+class ChoicesCache:
+
+    """
+        Shared choice lists of relationship predicates (e.g., all countries for a form field).
+        Each list is dropped when a write creates or changes a node of one of its
+        dgraph types, or touches one of the nodes in the list.
+
+        :param ttl:
+            seconds a choice list stays valid (picks up writes of other processes)
+    """
+
+    def __init__(self, ttl: float = 300) -> None:
+        self.ttl = ttl
+
+        # key -> (expires, types, uids, value)
+        self._entries = {}
+        self._lock = threading.Lock()
+        # changes with every invalidation, so loads that raced
+        # with a write are not stored
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f'<DGraph ChoicesCache {len(self)} entries, ttl={self.ttl}>'
+
+    def get(self, key: tuple, types: list, load) -> tuple:
+        """
+            Get the choices for `key` or call `load()` to get them.
+            `load()` returns a tuple `(choices, choices_tuples)`,
+            where `choices` is a dict with uids as keys.
+            Cached values are shared, do not change them.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[3]
+        self.misses += 1
+        generation = self._generation
+        value = load()
+        choices, _ = value
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl,
+                                      frozenset(types),
+                                      frozenset(uid.lower() for uid in choices),
+                                      value)
+        return value
+
+    def invalidate(self, uids: set = None, types: set = None) -> int:
+        """
+            Drop choice lists that contain one of the `uids` or one of the `types`.
+            Drops everything if `uids` or `types` is None (write with unknown targets).
+        """
+        with self._lock:
+            self._generation += 1
+            if uids is None or types is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            stale = [key for key, (_, entry_types, entry_uids, _) in self._entries.items()
+                     if entry_types & types or entry_uids & uids]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
@@ -1,8 +1,20 @@
-import json
-from dateutil.parser import isoparse
-from flask import current_app, _app_ctx_stack
+from flask import current_app, g, has_app_context
 import pydgraph
+import atexit
 import logging
+import os
+import threading
+import time
+
+from .pool import DGraphPool, is_connection_failure
+from .cache import QueryCache, make_key, query_tags, mutation_targets
+from .decoder import ResponseDecoder, parse_datetime
+from .loader import DGraphLoader
+from .pagination import iter_query
+from .retry import RetryPolicy, creates_nodes
+from .bulk import BulkResult, bulk_mutate
+from .instrumentation import Instrumentation, current_route
+from .slowlog import SlowQueryLog
 
 
 class DGraph(object):
@@ -10,21 +22,92 @@ class DGraph(object):
         Class for dgraph database connection
     """
 
-    _client = None
+    _pool = None
+    _pool_lock = threading.Lock()
+    cache = None
+    decoder = ResponseDecoder()
+
+    retry_policy = RetryPolicy()
+    instrumentation = Instrumentation()
+    instrumentation_enabled = True
+    slow_query_log = None
+
+    # incremented by every write, so caches outside of the client
+    # (e.g., form choices) can tell that they might be stale
+    generation = 0
 
     def __init__(self, app=None):
 
         self.logger = logging.getLogger(__name__)
+        self._invalidation_listeners = []
 
         self.app = app
         if app is not None:
             self.init_app(app)
 
+        # forked workers must not use the channels of the parent process
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.close)
+
     def init_app(self, app):
 
         app.config.setdefault('DGRAPH_ENDPOINT', 'localhost:9080')
+        # list of alpha endpoints, falls back to `DGRAPH_ENDPOINT`
+        app.config.setdefault('DGRAPH_ENDPOINTS', None)
         app.config.setdefault('DGRAPH_CREDENTIALS', None)
+        # gRPC channel options, list of tuples or a dict with short names, e.g.:
+        # {'keepalive_time': 30, 'max_message_length': 67108864, 'compression': 'gzip'}
         app.config.setdefault('DGRAPH_OPTIONS', None)
+        # client stubs per endpoint
+        app.config.setdefault('DGRAPH_POOL_SIZE', 2)
+        # consecutive failures before an endpoint is ejected
+        app.config.setdefault('DGRAPH_POOL_MAX_FAILURES', 3)
+        # seconds until an ejected endpoint is probed again
+        app.config.setdefault('DGRAPH_POOL_RETRY_INTERVAL', 30)
+        # result cache for queries that opt in with `query(..., cache=True)`
+        app.config.setdefault('DGRAPH_CACHE_ENABLED', False)
+        # seconds a cached result stays valid
+        app.config.setdefault('DGRAPH_CACHE_TTL', 60)
+        # maximum number of cached results
+        app.config.setdefault('DGRAPH_CACHE_MAXSIZE', 512)
+        if app.config['DGRAPH_CACHE_ENABLED']:
+            self.cache = QueryCache(maxsize=app.config['DGRAPH_CACHE_MAXSIZE'],
+                                    ttl=app.config['DGRAPH_CACHE_TTL'])
+        # 'json' or 'orjson'
+        app.config.setdefault('DGRAPH_JSON_BACKEND', 'json')
+        self.decoder = ResponseDecoder(backend=app.config['DGRAPH_JSON_BACKEND'])
+        # retries for aborted transactions and transient errors
+        app.config.setdefault('DGRAPH_RETRY_MAX_ATTEMPTS', 5)
+        # seconds before the first retry, doubles with every attempt
+        app.config.setdefault('DGRAPH_RETRY_BASE_DELAY', 0.05)
+        app.config.setdefault('DGRAPH_RETRY_MAX_DELAY', 2)
+        self.retry_policy = RetryPolicy(max_attempts=app.config['DGRAPH_RETRY_MAX_ATTEMPTS'],
+                                        base_delay=app.config['DGRAPH_RETRY_BASE_DELAY'],
+                                        max_delay=app.config['DGRAPH_RETRY_MAX_DELAY'])
+        # record fingerprint, duration and size of every query / mutation
+        app.config.setdefault('DGRAPH_INSTRUMENTATION', True)
+        # add per request aggregates as response headers, default: in debug mode
+        app.config.setdefault('DGRAPH_INSTRUMENTATION_HEADERS', None)
+        self.instrumentation_enabled = app.config['DGRAPH_INSTRUMENTATION']
+        if self.instrumentation_enabled:
+            app.after_request(self._add_stats_headers)
+        # seconds, slower calls are written to logs/dgraph_slow_queries.log
+        # set to None to disable the slow query log
+        app.config.setdefault('DGRAPH_SLOW_QUERY_THRESHOLD', 1)
+        # share of slow query records that include the full query text
+        app.config.setdefault('DGRAPH_SLOW_QUERY_SAMPLE_RATE', 0.1)
+        if app.config['DGRAPH_SLOW_QUERY_THRESHOLD'] is not None:
+            from flaskinventory.config import create_filehandler
+            self.slow_query_log = SlowQueryLog(app.config['DGRAPH_SLOW_QUERY_THRESHOLD'],
+                                               sample_rate=app.config['DGRAPH_SLOW_QUERY_SAMPLE_RATE'],
+                                               handler=create_filehandler('dgraph_slow_queries'))
+        # connect to all endpoints right away instead of on the first query
+        # with a preforking server (gunicorn --preload) use `warmup()` in the
+        # worker hook instead, see tools/gunicorn.conf.py
+        app.config.setdefault('DGRAPH_WARMUP', False)
+        if app.config['DGRAPH_WARMUP']:
+            self.warmup(app)
         app.teardown_appcontext(self.teardown)
 
     """ 
@@ -32,51 +115,109 @@ class DGraph(object):
     """
 
     @property
-    def connection(self):
-        # ctx = _app_ctx_stack.top
-        # if ctx is not None:
-        #     if not hasattr(ctx, 'dgraph'):
-        #         ctx.dgraph = self.connect()
-        #     return ctx.dgraph
-        if self._client is None:
-            self._client = self.connect()
-        return self._client
-
-    def connect(self):
+    def pool(self) -> DGraphPool:
+        pool = self._pool
+        if pool is not None and not pool.owned:
+            # fork without `os.register_at_fork` (e.g., from C extensions)
+            self._after_fork()
+            pool = None
+        if pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self.connect()
+                pool = self._pool
+        return pool
+
+    @property
+    def connection(self) -> pydgraph.DgraphClient:
+        return self.pool.client()
+
+    def connect(self) -> DGraphPool:
+        endpoints = current_app.config['DGRAPH_ENDPOINTS'] or [
+            current_app.config['DGRAPH_ENDPOINT']]
         self.logger.debug(
-            f"Establishing connection to DGraph: {current_app.config['DGRAPH_ENDPOINT']}")
+            f"Establishing connection to DGraph: {endpoints}")
 
-        self.client_stub = pydgraph.DgraphClientStub(current_app.config['DGRAPH_ENDPOINT'],
-                                                     credentials=current_app.config['DGRAPH_CREDENTIALS'],
-                                                     options=current_app.config['DGRAPH_OPTIONS'])
+        return DGraphPool(endpoints,
+                          size=current_app.config['DGRAPH_POOL_SIZE'],
+                          credentials=current_app.config['DGRAPH_CREDENTIALS'],
+                          options=current_app.config['DGRAPH_OPTIONS'],
+                          max_failures=current_app.config['DGRAPH_POOL_MAX_FAILURES'],
+                          retry_interval=current_app.config['DGRAPH_POOL_RETRY_INTERVAL'])
 
-        return pydgraph.DgraphClient(self.client_stub)
+    @property
+    def loader(self) -> DGraphLoader:
+        """ Batching loader for point lookups, lives as long as the app context (request) """
+        if not has_app_context():
+            return DGraphLoader(self)
+        if 'dgraph_loader' not in g:
+            g.dgraph_loader = DGraphLoader(self)
+        return g.dgraph_loader
+
+    def _record(self, kind, query_string, start, response=None, variables=None):
+        wall = time.perf_counter() - start
+        record = None
+        if self.instrumentation_enabled:
+            record = self.instrumentation.record(
+                kind, query_string, wall, response=response)
+        if self.slow_query_log is not None:
+            size = len(getattr(response, 'json', b'') or b'')
+            self.slow_query_log.check(kind, query_string, wall, variables=variables,
+                                      size=size, route=current_route())
+        return record
+
+    def _add_stats_headers(self, response):
+        show = current_app.config['DGRAPH_INSTRUMENTATION_HEADERS']
+        if show is None:
+            show = current_app.debug
+        if not show:
+            return response
+        stats = self.instrumentation.request_stats()
+        response.headers['X-DGraph-Queries'] = str(stats['count'])
+        response.headers['X-DGraph-Time'] = f"{stats['wall'] * 1000:.1f}ms"
+        response.headers['X-DGraph-Server-Time'] = f"{stats['server'] * 1000:.1f}ms"
+        response.headers['X-DGraph-Bytes'] = str(stats['bytes'])
+        return response
+
+    def warmup(self, app=None) -> int:
+        """
+            Open the channels of this process to all endpoints.
+            Returns the number of reachable endpoints.
+        """
+        if app is not None:
+            with app.app_context():
+                return self.warmup()
+        reachable = self.pool.warmup()
+        self.logger.info(
+            f"DGraph warm-up (pid {os.getpid()}): {reachable} of {len(self.pool)} endpoints reachable")
+        return reachable
+
+    def _after_fork(self):
+        # drop everything that belongs to the parent process
+        # the inherited channels are not closed, they are still used by the parent
+        self._pool = None
+        self._pool_lock = threading.Lock()
 
     def close(self, *args):
-        # Close each DGraph client stub
-        self.client_stub.close()
+        # Close each DGraph client stub of this process
+        pool = self._pool
+        self._pool = None
+        if pool is not None and pool.owned:
+            self.logger.info(f"Closing DGraph connections (pid {os.getpid()})")
+            pool.close()
 
     def teardown(self, exception):
-        ctx = _app_ctx_stack.top
-        if hasattr(ctx, 'dgraph'):
-            self.logger.info(
-                f"Closing Connection: {current_app.config['DGRAPH_ENDPOINT']}")
-            self.client_stub.close()
+        # connections are kept for the lifetime of the process
+        # only request scoped state is dropped
+        g.pop('dgraph_loader', None)
 
     ''' Static Methods '''
 
     # Helper function for parsing dgraph's iso strings
-    @staticmethod
-    def parse_datetime(s):
-        if type(s) == str:
-            if len(s) <= 4:
-                return s
-        try:
-            return isoparse(s)
-        except:
-            return s
+    parse_datetime = staticmethod(parse_datetime)
 
     # json decoder object_hook function
+    # tries to parse every string, prefer `DGraph.decode()`
     @staticmethod
     def datetime_hook(obj):
         for k, v in obj.items():
@@ -133,27 +274,186 @@ class DGraph(object):
         Generic Query Methods 
     """
 
-    def query(self, query_string, variables=None):
+    def query(self, query_string, variables=None, cache=False):
+        """
+            Send a read-only query.
+            With `cache=True` the result is served from the query cache
+            (if enabled) and invalidated when a mutation touches it.
+        """
         self.logger.debug(f"Sending dgraph query: {query_string}")
-        if variables is None:
-            res = self.connection.txn(read_only=True).query(query_string)
-        else:
+        if variables is not None:
             self.logger.debug(f"Got the following variables {variables}")
-            res = self.connection.txn(read_only=True).query(
-                query_string, variables=variables)
+        if cache and self.cache is not None:
+            key = make_key(query_string, variables)
+            raw = self.cache.get(key)
+            if raw is None:
+                raw = self._read(query_string, variables=variables).json
+                self.cache.set(key, raw, tags=query_tags(
+                    query_string, variables, response=raw))
+            else:
+                self.logger.debug(f"Serving dgraph query from cache.")
+        else:
+            raw = self._read(query_string, variables=variables).json
         self.logger.debug(f"Received response for dgraph query.")
-        data = json.loads(res.json, object_hook=self.datetime_hook)
+        data = self.decode(raw)
         return data
 
+    def decode(self, raw):
+        """ Decode a raw JSON response, parses only datetime predicates """
+        return self.decoder.decode(raw)
+
+    def iter_query(self, query_string, variables=None, page_size=1000, block=None):
+        """
+            Generator over all nodes of a query block, fetched page by page
+            with an `after: uid` cursor. The query has to use `$first` and `$after`:
+            `query q($first: int, $after: string) { q(func: type(Source), first: $first, after: $after) { uid } }`
+        """
+        self.logger.debug(f"Iterating over dgraph query: {query_string}")
+        def on_page(start, response):
+            self._record('query', query_string, start,
+                         response=response, variables=variables)
+
+        return iter_query(self.connection, query_string, variables=variables,
+                          page_size=page_size, block=block, decode=self.decode,
+                          on_page=on_page)
+
+    def query_many(self, queries, cache=False):
+        """
+            Send several independent queries at once.
+            All queries are sent concurrently as best-effort reads, so the
+            whole batch takes one round trip. Each query reads the latest
+            state the alpha has applied: a write that lands while the batch
+            is running can be visible to some queries and not to others.
+
+            `queries` is a dict (or list) of query strings or
+            `(query_string, variables)` tuples, returns results in the same shape.
+            `dgraph.query_many({'entry': q1, 'count': (q2, {'$value': uid})})`
+        """
+        if isinstance(queries, dict):
+            keys = list(queries.keys())
+            items = list(queries.values())
+        else:
+            keys = None
+            items = list(queries)
+
+        items = [item if isinstance(item, tuple) else (item, None)
+                 for item in items]
+        raws = [None] * len(items)
+
+        if cache and self.cache is not None:
+            for i, (query_string, variables) in enumerate(items):
+                raws[i] = self.cache.get(make_key(query_string, variables))
+
+        missing = [i for i, raw in enumerate(raws) if raw is None]
+        if len(missing) > 0:
+            self.logger.debug(
+                f"Sending {len(missing)} dgraph queries concurrently")
+            responses = self._read_many([items[i] for i in missing])
+            for i, response in zip(missing, responses):
+                raws[i] = response.json
+                if cache and self.cache is not None:
+                    self.cache.set(make_key(*items[i]), raws[i],
+                                   tags=query_tags(*items[i], response=raws[i]))
+
+        results = [self.decode(raw) for raw in raws]
+        if keys is None:
+            return results
+        return dict(zip(keys, results))
+
+    def _read(self, query_string, variables=None):
+        # spread read-only queries over the pool
+        # if an endpoint cannot be reached, try the next one
+        tried = []
+        while True:
+            endpoint, client = self.pool.acquire(exclude=tried)
+            start = time.perf_counter()
+            try:
+                txn = client.txn(read_only=True)
+                res = txn.query(query_string, variables=variables)
+            except Exception as e:
+                if not is_connection_failure(e):
+                    raise
+                self.pool.mark_failed(endpoint)
+                tried.append(endpoint)
+                if len(tried) >= len(self.pool):
+                    raise
+                self.logger.warning(
+                    f'DGraph endpoint {endpoint.address} not reachable, trying next one: {e}')
+                continue
+            self.pool.mark_healthy(endpoint)
+            self._record('query', query_string, start,
+                         response=res, variables=variables)
+            return res
+
+    def _read_many(self, items: list) -> list:
+        endpoint, client = self.pool.acquire()
+        # best effort: no read timestamp has to be fetched first,
+        # so all queries can be sent at once
+        txn = client.txn(read_only=True, best_effort=True)
+        start = time.perf_counter()
+        try:
+            futures = [txn.async_query(query_string, variables=variables)
+                       for query_string, variables in items]
+            responses = [future.result() for future in futures]
+        except Exception as e:
+            if not is_connection_failure(e):
+                raise
+            self.pool.mark_failed(endpoint)
+            self.logger.warning(
+                f'DGraph endpoint {endpoint.address} not reachable, sending queries one by one: {e}')
+            return [self._read(query_string, variables=variables)
+                    for query_string, variables in items]
+        self.pool.mark_healthy(endpoint)
+        # queries ran concurrently, each is recorded with the time of the whole batch
+        for (query_string, variables), response in zip(items, responses):
+            self._record('query', query_string, start,
+                         response=response, variables=variables)
+        return responses
+
+    def on_invalidate(self, listener):
+        """
+            Register `listener(uids, types)` that is called after every write
+            (e.g., to drop caches outside of the client).
+            `uids` and `types` are sets of the touched nodes and dgraph types,
+            both are None if the write could have changed anything.
+        """
+        self._invalidation_listeners.append(listener)
+        return listener
+
+    def invalidate(self, *payloads, query=None) -> None:
+        """
+            Drop cached query results that are affected by a write.
+            `payloads` are mutation objects or nquad strings.
+        """
+        if has_app_context() and 'dgraph_loader' in g:
+            g.dgraph_loader.clear()
+        self.generation += 1
+
+        uids, types = set(), set()
+        for payload in payloads:
+            u, t, has_variables = mutation_targets(payload)
+            # upserts and variables can touch anything their query finds
+            query = query or has_variables
+            uids |= u
+            types |= t
+
+        for listener in self._invalidation_listeners:
+            if query:
+                listener(None, None)
+            else:
+                listener(uids, types)
+
+        if self.cache is None:
+            return
+        if query:
+            self.cache.clear()
+            return
+        # editing existing nodes can change any list they appear in
+        self.cache.invalidate(uids=uids, types=types,
+                              collections=len(uids) > 0)
+
     def get_uid(self, field: str, value: str) -> str:
-        value = str(value).strip()
-        query_string = f'''
-            query quicksearch($value: string)
-            {{ q(func: eq({field}, $value)) {{ uid {field} }} }}'''
-        data = self.query(query_string, variables={'$value': value})
-        if len(data['q']) == 0:
-            return None
-        return data['q'][0]['uid']
+        return self.loader.uid(field, value)
 
     def get_uids(self, field: str, value: str) -> list:
         value = str(value).strip()
@@ -166,31 +466,27 @@ class DGraph(object):
         return [entry['uid'] for entry in data['q']]
 
     def get_unique_name(self, uid):
-
-        query_string = f''' query get_unique_name($value: string)
-                            {{ q(func: uid($value)) @filter(has(dgraph.type)) {{ uid unique_name }} }}'''
-        data = self.query(query_string, variables={'$value': uid})
-        if len(data['q']) == 0:
+        node = self.loader.node(uid)
+        if node is None:
             return None
-        return data['q'][0]['unique_name']
+        return node.get('unique_name')
 
     def get_dgraphtype(self, uid: str, clean: list = ['Entry', 'Resource']):
-        query_string = f'''query get_dgraphtype($value: string)
-                            {{ q(func: uid($value)) @filter(has(dgraph.type)) {{  dgraph.type  }} }}'''
-
-        data = self.query(query_string, variables={'$value': uid})
-        if len(data['q']) == 0:
+        node = self.loader.node(uid)
+        if node is None:
             return False
-        if 'User' in data['q'][0]['dgraph.type']:
+        if 'User' in node['dgraph.type']:
             return False
 
+        # copy, the memoized node must stay untouched
+        dgraph_types = list(node['dgraph.type'])
         if len(clean) > 0:
             for item in clean:
-                if item in data['q'][0]['dgraph.type']:
-                    data['q'][0]['dgraph.type'].remove(item)
-            return data['q'][0]['dgraph.type'][0]
+                if item in dgraph_types:
+                    dgraph_types.remove(item)
+            return dgraph_types[0]
         else:
-            return data['q'][0]['dgraph.type']
+            return dgraph_types
 
     """
         New Entries
@@ -200,18 +496,19 @@ class DGraph(object):
         # if type(data) is not dict or type(data) is not list:
         #     raise TypeError()
 
-        txn = self.connection.txn()
-
-        try:
+        def operation(txn):
             response = txn.mutate(set_obj=data)
             txn.commit()
+            return response
+
+        try:
+            response = self.write(operation, idempotent=not creates_nodes(set_obj=data))
         except Exception as e:
             self.logger.error(e)
             response = False
-        finally:
-            txn.discard()
 
         if response:
+            self.invalidate(data)
             return response
         else:
             return False
@@ -229,23 +526,34 @@ class DGraph(object):
         if uid:
             input_data['uid'] = str(uid)
 
-        txn = self.connection.txn()
-
-        try:
+        def operation(txn):
             response = txn.mutate(set_obj=input_data)
             txn.commit()
+            return response
+
+        try:
+            response = self.write(operation, kind='update_entry',
+                                  idempotent=not creates_nodes(set_obj=input_data))
         except Exception as e:
             self.logger.warning(e)
             response = False
-        finally:
-            txn.discard()
 
         if response:
+            self.invalidate(input_data)
             return True
         else:
             return False
 
-    def upsert(self, query, set_nquads=None, del_nquads=None, cond=None):
+    def upsert(self, query, set_nquads=None, del_nquads=None, cond=None, set_obj=None, del_obj=None,
+               idempotent=None):
+        """
+            Run a mutation, optionally with an upsert query (and condition `cond`).
+            Takes nquad strings (`set_nquads`, `del_nquads`) and / or
+            JSON mutation objects (`set_obj`, `del_obj`).
+            `idempotent` (see `write`) defaults to whether the mutation adds no new nodes
+        """
+        if idempotent is None:
+            idempotent = not creates_nodes(set_nquads, set_obj)
         if query:
             if not query.startswith('{'):
                 query = '{' + query + '}'
@@ -253,22 +561,28 @@ class DGraph(object):
         self.logger.debug(f'Query:\n{query}')
         self.logger.debug(f'set nquads:\n{set_nquads}')
         self.logger.debug(f'delete nquads:\n{del_nquads}')
-        txn = self.connection.txn()
-        mutation = txn.create_mutation(
-            set_nquads=set_nquads, del_nquads=del_nquads, cond=cond)
-        request = txn.create_request(query=query, mutations=[
-                                     mutation], commit_now=True)
+        if set_obj or del_obj:
+            self.logger.debug(f'set obj:\n{set_obj}')
+            self.logger.debug(f'delete obj:\n{del_obj}')
+
+        def operation(txn):
+            mutation = txn.create_mutation(
+                set_nquads=set_nquads, del_nquads=del_nquads,
+                set_obj=set_obj, del_obj=del_obj, cond=cond)
+            request = txn.create_request(query=query, mutations=[
+                                         mutation], commit_now=True)
+            return txn.do_request(request)
 
         try:
-            response = txn.do_request(request)
+            response = self.write(operation, kind='upsert', query_string=query,
+                                  idempotent=idempotent)
         except Exception as e:
             self.logger.warning(e)
             response = False
-        finally:
-            txn.discard()
 
         if response:
             self.logger.debug(f'Response: {response}')
+            self.invalidate(set_nquads, del_nquads, set_obj, del_obj, query=query)
             return response
         else:
             self.logger.debug(f'No Response')
@@ -276,17 +590,74 @@ class DGraph(object):
 
     def delete(self, mutation):
 
-        txn = self.connection.txn()
-
-        try:
+        def operation(txn):
             response = txn.mutate(del_obj=mutation)
             txn.commit()
+            return response
+
+        try:
+            response = self.write(operation, kind='delete')
         except:
             response = False
-        finally:
-            txn.discard()
 
         if response:
+            self.invalidate(mutation)
             return True
         else:
             return False
+
+    def bulk_mutate(self, items, chunk_size=1000, concurrency=1, delete=False, progress=None) -> BulkResult:
+        """
+            Commit many nquads or mutation objects in chunks of `chunk_size`,
+            each chunk in its own transaction. Failing chunks are reported
+            in the returned `BulkResult`, they do not stop the remaining chunks.
+            `progress(chunk number, number of items, error or None)` is called after each chunk.
+        """
+        self.logger.debug(
+            f"Performing bulk mutation: chunk_size={chunk_size}, concurrency={concurrency}")
+        result = bulk_mutate(self.write, items, chunk_size=chunk_size,
+                             concurrency=concurrency, delete=delete, progress=progress)
+        self.logger.debug(f"Bulk mutation done: {result}")
+        if result.chunks > 0:
+            # too many targets to track one by one
+            self.invalidate(query=True)
+        return result
+
+    """
+        Transactions
+    """
+
+    def write(self, operation, kind='mutation', query_string=None, idempotent=True):
+        """
+            Run `operation(txn)` in a new transaction and return its result.
+            Aborted transactions and transient errors are retried with
+            exponential backoff (see `DGRAPH_RETRY_*` settings),
+            other errors are raised right away.
+            A transient error does not tell whether the write was committed,
+            so operations that are not `idempotent` are only retried when aborted.
+            `kind` and `query_string` label the call for instrumentation.
+        """
+        start = time.perf_counter()
+
+        def attempt():
+            endpoint, client = self.pool.acquire()
+            txn = client.txn()
+            try:
+                response = operation(txn)
+            except Exception as e:
+                if is_connection_failure(e):
+                    self.pool.mark_failed(endpoint)
+                raise
+            finally:
+                txn.discard()
+            self.pool.mark_healthy(endpoint)
+            return response
+
+        response = self.retry_policy.call(attempt, idempotent=idempotent)
+        self._record(kind, query_string, start, response=response)
+        return response
+
+    @property
+    def retry_stats(self) -> dict:
+        """ Counters of retried, conflicting and failed transactions """
+        return self.retry_policy.stats
@@ -0,0 +1,113 @@
+"""
+    Decoding of DGraph JSON responses
+    Only values of datetime predicates (and datetime facets) are parsed,
+    all other strings are returned as they are.
+    If `orjson` is installed, it can be used as faster JSON backend.
+"""
+
+import json
+import logging
+
+from dateutil.parser import isoparse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .schema import Schema
+
+# datetime predicates that are not declared in the Schema
+SYSTEM_DATETIME_PREDICATES = {'creation_date', 'date_joined'}
+
+# datetime facets that are not declared in the Schema
+# (e.g., `entry_added|timestamp`, `invited_by|date`, `sources_included|from`)
+SYSTEM_DATETIME_FACETS = {'timestamp', 'date', 'from', 'to'}
+
+JSON_BACKENDS = ['json', 'orjson']
+
+
+def parse_datetime(s):
+    # Helper function for parsing dgraph's iso strings
+    if type(s) == str:
+        if len(s) <= 4:
+            return s
+    try:
+        return isoparse(s)
+    except:
+        return s
+
+
+class ResponseDecoder:
+
+    """
+        Turns raw DGraph responses into python objects.
+
+        :param backend:
+            `'json'` (standard library) or `'orjson'`
+    """
+
+    def __init__(self, backend: str = 'json') -> None:
+        self.logger = logging.getLogger(__name__)
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f'Unknown JSON backend: {backend}. Use one of {JSON_BACKENDS}')
+        if backend == 'orjson' and orjson is None:
+            self.logger.warning('orjson is not installed, falling back to json')
+            backend = 'json'
+        self.backend = backend
+
+        # memo of response keys: key -> bool (is datetime)
+        self._keys = {}
+        self._registry_size = 0
+
+    def __repr__(self) -> str:
+        return f'<DGraph ResponseDecoder ({self.backend})>'
+
+    def is_datetime_key(self, key: str) -> bool:
+        # types can register after the first response was decoded
+        if self._registry_size != len(Schema.__datetime_predicates__):
+            self._keys = {}
+            self._registry_size = len(Schema.__datetime_predicates__)
+        try:
+            return self._keys[key]
+        except KeyError:
+            pass
+        if key in Schema.__datetime_predicates__ or key in SYSTEM_DATETIME_PREDICATES:
+            result = True
+        elif '|' in key:
+            # facets can be aliased (e.g., `drafts|timestamp`)
+            result = key.rsplit('|', 1)[1] in SYSTEM_DATETIME_FACETS
+        else:
+            result = False
+        self._keys[key] = result
+        return result
+
+    def _parse_values(self, obj: dict) -> dict:
+        for k, v in obj.items():
+            if not self.is_datetime_key(k):
+                continue
+            if isinstance(v, str):
+                obj[k] = parse_datetime(v)
+            elif isinstance(v, list):
+                obj[k] = [parse_datetime(s) for s in v]
+            elif isinstance(v, dict):
+                # facets of list predicates: {"0": <value>, "1": <value>}
+                obj[k] = {i: parse_datetime(s) for i, s in v.items()}
+        return obj
+
+    def _walk(self, obj):
+        if isinstance(obj, dict):
+            for v in obj.values():
+                if isinstance(v, (dict, list)):
+                    self._walk(v)
+            self._parse_values(obj)
+        elif isinstance(obj, list):
+            for item in obj:
+                if isinstance(item, (dict, list)):
+                    self._walk(item)
+        return obj
+
+    def decode(self, raw: bytes):
+        if self.backend == 'orjson':
+            return self._walk(orjson.loads(raw))
+        return json.loads(raw, object_hook=self._parse_values)
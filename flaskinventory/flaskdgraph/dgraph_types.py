@@ -5,9 +5,11 @@
     May later be used for automatic query building
 """
 
-from typing import Union, Any, Literal
+from typing import Union, Any, Literal, Iterator, TextIO
 import datetime
 import json
+from functools import lru_cache
+from itertools import chain
 from copy import deepcopy
 
 # external utils
@@ -19,6 +21,7 @@ from dateutil import parser as dateparser
 from flaskinventory import dgraph
 
 from .schema import Schema
+from .cache import ChoicesCache
 from .customformfields import NullableDateField, TomSelectField, TomSelectMultipleField
 from .utils import validate_uid, strip_query
 
@@ -38,13 +41,27 @@ from wtforms.validators import DataRequired, Optional
 AvailableOperators = Literal['eq', 'between', 'gt', 'lt', 'ge', 'le']
 AvailableConnectors = Literal['AND', 'OR', 'NOT']
 
+
+"""
+    Choices of relationship predicates are shared by all predicates with the
+    same constraint and dropped when a write touches one of the constraint types
+"""
+
+relationship_choices = ChoicesCache(ttl=300)
+dgraph.on_invalidate(relationship_choices.invalidate)
+
 """
     DGraph Primitives
 """
 
+# same output as `json.dumps(string)`, but without the overhead of the encoder
+_encode_string = json.encoder.encode_basestring_ascii
+
 
 class UID:
 
+    __slots__ = ('uid', 'facets')
+
     def __init__(self, uid, facets=None):
         self.uid = uid.strip()
         self.facets = facets
@@ -72,6 +89,8 @@ class UID:
 
 class NewID:
 
+    __slots__ = ('newid', 'facets', 'original_value')
+
     def __init__(self, newid, facets=None, suffix=None):
         if newid.startswith('_:'):
             self.newid = newid.strip()
@@ -110,7 +129,9 @@ class Facet:
         Facet keys are strings and values can be string, bool, int, float and dateTime. 
     """
 
-    predicate = None
+    __slots__ = ('key', 'type', 'queryable', '_query_label', 'operators',
+                 'render_kw', 'choices', 'predicate')
+
     default_operator = "eq"
     is_list_predicate = False
 
@@ -123,6 +144,7 @@ class Facet:
                  render_kw=None,
                  choices=None) -> None:
 
+        self.predicate = None
         self.key = key
         self.type = dtype
         self.queryable = queryable
@@ -258,6 +280,16 @@ class _PrimitivePredicate:
     default_connector = "OR"
     bound_dgraph_type = None
 
+    def _cached_choices(self, load, depends_on: list = None) -> None:
+        """
+            Set `choices` and `choices_tuples` from the shared choices cache.
+            `load()` queries DGraph and returns a tuple `(choices, choices_tuples)`.
+            `depends_on`: dgraph types that change the choices, default: relationship constraint
+        """
+        key = (type(self).__name__, tuple(self.relationship_constraint))
+        types = depends_on or self.relationship_constraint
+        self.choices, self.choices_tuples = relationship_choices.get(key, types, load)
+
     def __init__(self,
                  label: str = None,
                  default: str = None,
@@ -530,28 +562,50 @@ class Predicate(_PrimitivePredicate):
 class Scalar:
 
     """
-        Utility class for 
+        Utility class for scalar values (strings, numbers, dates, bools)
+        The value is kept as plain string and only encoded
+        for DGraph when it is accessed via `value` or `nquad`
     """
 
+    __slots__ = ('_value', '_date', 'facets')
+
     def __init__(self, value, facets=None):
+        self._date = None
         if type(value) in [datetime.date, datetime.datetime]:
-            self.year = value.year
-            self.month = value.month
-            self.day = value.day
+            self._date = value
             value = value.isoformat()
         elif type(value) is bool:
             value = str(value).lower()
 
-        self.value = str(value).strip()
-        if self.value != '*':
-            self.value = json.dumps(self.value)
+        self._value = str(value).strip()
         self.facets = facets
 
+    @property
+    def value(self) -> str:
+        if self._value == '*':
+            return self._value
+        return _encode_string(self._value)
+
+    @property
+    def year(self) -> int:
+        if self._date is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute 'year'")
+        return self._date.year
+
+    @property
+    def month(self) -> int:
+        if self._date is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute 'month'")
+        return self._date.month
+
+    @property
+    def day(self) -> int:
+        if self._date is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute 'day'")
+        return self._date.day
+
     def __str__(self) -> str:
-        if self.value != '*':
-            return json.loads(self.value)
-        else:
-            return self.value
+        return self._value
 
     def __repr__(self) -> str:
         if self.facets:
@@ -566,10 +620,7 @@ class Scalar:
 
     @property
     def nquad(self) -> str:
-        if self.value == '*':
-            return '*'
-        else:
-            return f'''{self.value}'''
+        return self.value
 
 
 class GeoScalar(Scalar):
@@ -579,6 +630,8 @@ class GeoScalar(Scalar):
         Currently only supports Point Locations
     """
 
+    __slots__ = ('geotype', 'coordinates', 'lat', 'lon')
+
     def __init__(self, geotype, coordinates, facets=None):
         self.geotype = geotype
         if isinstance(coordinates, (list, tuple)):
@@ -591,9 +644,14 @@ class GeoScalar(Scalar):
                 'lat'), 12), round(coordinates.get('lon'), 12)]
             self.lat = coordinates.get('lat')
             self.lon = coordinates.get('lon')
-        self.value = {'type': geotype, 'coordinates': coordinates}
+        self._date = None
+        self._value = coordinates
         self.facets = facets
 
+    @property
+    def value(self) -> dict:
+        return {'type': self.geotype, 'coordinates': self._value}
+
     def __str__(self) -> str:
         return str(self.value)
 
@@ -606,6 +664,8 @@ class Variable:
 
     """ Represents DGraph Query Variable """
 
+    __slots__ = ('var', 'predicate', 'val')
+
     def __init__(self, var, predicate, val=False):
         self.var = var
         self.predicate = predicate
@@ -702,6 +762,9 @@ class ReverseRelationship(_PrimitivePredicate):
 
     def get_choices(self):
         assert self.relationship_constraint
+        self._cached_choices(self._query_choices)
+
+    def _query_choices(self) -> tuple:
 
         query_string = '{ '
 
@@ -710,22 +773,24 @@ class ReverseRelationship(_PrimitivePredicate):
 
         query_string += '}'
 
-        choices = dgraph.query(query_string=query_string)
+        result = dgraph.query(query_string=query_string)
 
         if len(self.relationship_constraint) == 1:
-            self.choices = {c['uid']: c['name']
-                            for c in choices[self.relationship_constraint[0].lower()]}
-            self.choices_tuples = [
-                (c['uid'], c['name']) for c in choices[self.relationship_constraint[0].lower()]]
+            choices = {c['uid']: c['name']
+                       for c in result[self.relationship_constraint[0].lower()]}
+            choices_tuples = [
+                (c['uid'], c['name']) for c in result[self.relationship_constraint[0].lower()]]
 
         else:
-            self.choices = {}
-            self.choices_tuples = {}
+            choices = {}
+            choices_tuples = {}
             for dgraph_type in self.relationship_constraint:
-                self.choices_tuples[dgraph_type] = [
-                    (c['uid'], c['name']) for c in choices[dgraph_type.lower()]]
-                self.choices.update({c['uid']: c['name']
-                                     for c in choices[dgraph_type.lower()]})
+                choices_tuples[dgraph_type] = [
+                    (c['uid'], c['name']) for c in result[dgraph_type.lower()]]
+                choices.update({c['uid']: c['name']
+                                for c in result[dgraph_type.lower()]})
+
+        return choices, choices_tuples
 
     @property
     def wtf_field(self) -> TomSelectField:
@@ -777,33 +842,6 @@ class ReverseListRelationship(ReverseRelationship):
 
         return uids
 
-    def get_choices(self):
-        assert self.relationship_constraint
-
-        query_string = '{ '
-
-        for dgraph_type in self.relationship_constraint:
-            query_string += f'''{dgraph_type.lower()}(func: type("{dgraph_type}"), orderasc: name) {{ uid name unique_name }} '''
-
-        query_string += '}'
-
-        choices = dgraph.query(query_string=query_string)
-
-        if len(self.relationship_constraint) == 1:
-            self.choices = {c['uid']: c['name']
-                            for c in choices[self.relationship_constraint[0].lower()]}
-            self.choices_tuples = [
-                (c['uid'], c['name']) for c in choices[self.relationship_constraint[0].lower()]]
-
-        else:
-            self.choices = {}
-            self.choices_tuples = {}
-            for dgraph_type in self.relationship_constraint:
-                self.choices_tuples[dgraph_type] = [
-                    (c['uid'], c['name']) for c in choices[dgraph_type.lower()]]
-                self.choices.update({c['uid']: c['name']
-                                     for c in choices[dgraph_type.lower()]})
-
     @property
     def wtf_field(self) -> TomSelectMultipleField:
         if self.autoload_choices and self.relationship_constraint:
@@ -875,6 +913,9 @@ class MutualRelationship(_PrimitivePredicate):
 
     def get_choices(self):
         assert self.relationship_constraint
+        self._cached_choices(self._query_choices)
+
+    def _query_choices(self) -> tuple:
 
         query_string = '{ '
 
@@ -883,22 +924,24 @@ class MutualRelationship(_PrimitivePredicate):
 
         query_string += '}'
 
-        choices = dgraph.query(query_string=query_string)
+        result = dgraph.query(query_string=query_string)
 
         if len(self.relationship_constraint) == 1:
-            self.choices = {c['uid']: c['name']
-                            for c in choices[self.relationship_constraint[0].lower()]}
-            self.choices_tuples = [
-                (c['uid'], c['name']) for c in choices[self.relationship_constraint[0].lower()]]
+            choices = {c['uid']: c['name']
+                       for c in result[self.relationship_constraint[0].lower()]}
+            choices_tuples = [
+                (c['uid'], c['name']) for c in result[self.relationship_constraint[0].lower()]]
 
         else:
-            self.choices = {}
-            self.choices_tuples = {}
+            choices = {}
+            choices_tuples = {}
             for dgraph_type in self.relationship_constraint:
-                self.choices_tuples[dgraph_type] = [
-                    (c['uid'], c['name']) for c in choices[dgraph_type.lower()]]
-                self.choices.update({c['uid']: c['name']
-                                     for c in choices[dgraph_type.lower()]})
+                choices_tuples[dgraph_type] = [
+                    (c['uid'], c['name']) for c in result[dgraph_type.lower()]]
+                choices.update({c['uid']: c['name']
+                                for c in result[dgraph_type.lower()]})
+
+        return choices, choices_tuples
 
     @property
     def wtf_field(self) -> TomSelectField:
@@ -1346,6 +1389,9 @@ class SingleRelationship(Predicate):
 
     def get_choices(self):
         assert self.relationship_constraint
+        self._cached_choices(self._query_choices)
+
+    def _query_choices(self) -> tuple:
 
         query_string = '{ '
 
@@ -1354,23 +1400,25 @@ class SingleRelationship(Predicate):
 
         query_string += '}'
 
-        choices = dgraph.query(query_string=query_string)
+        result = dgraph.query(query_string=query_string)
 
         if len(self.relationship_constraint) == 1:
-            self.choices = {c['uid']: c.get('name') or c.get('unique_name')
-                            for c in choices[self.relationship_constraint[0].lower()]}
-            self.choices_tuples = [
-                (c['uid'], c.get('name') or c.get('unique_name')) for c in choices[self.relationship_constraint[0].lower()]]
-            self.choices_tuples.insert(0, ('', ''))
+            choices = {c['uid']: c.get('name') or c.get('unique_name')
+                       for c in result[self.relationship_constraint[0].lower()]}
+            choices_tuples = [
+                (c['uid'], c.get('name') or c.get('unique_name')) for c in result[self.relationship_constraint[0].lower()]]
+            choices_tuples.insert(0, ('', ''))
 
         else:
-            self.choices = {}
-            self.choices_tuples = {}
+            choices = {}
+            choices_tuples = {}
             for dgraph_type in self.relationship_constraint:
-                self.choices_tuples[dgraph_type] = [
-                    (c['uid'], c.get('name') or c.get('unique_name')) for c in choices[dgraph_type.lower()]]
-                self.choices.update({c['uid']: c.get('name') or c.get('unique_name')
-                                     for c in choices[dgraph_type.lower()]})
+                choices_tuples[dgraph_type] = [
+                    (c['uid'], c.get('name') or c.get('unique_name')) for c in result[dgraph_type.lower()]]
+                choices.update({c['uid']: c.get('name') or c.get('unique_name')
+                                for c in result[dgraph_type.lower()]})
+
+        return choices, choices_tuples
 
     @property
     def wtf_field(self) -> TomSelectField:
@@ -1462,56 +1510,201 @@ def _enquote(string) -> str:
     return f'"{string}"'
 
 
-def make_nquad(s, p, o) -> str:
-    """ Strings, Ints, Floats, Bools, Date(times) are converted automatically to Scalar """
+@lru_cache(maxsize=1024)
+def _predicate_token(key: str) -> str:
+    # `Predicate.from_key(key).nquad` without building a Predicate every time
+    if key == '*':
+        return '*'
+    return f'<{key}>'
+
+
+def _escape(value) -> str:
+    """ Encode a plain python value the same way as `Scalar(value).nquad` """
+    if type(value) is not str:
+        if type(value) in (datetime.date, datetime.datetime):
+            value = value.isoformat()
+        elif type(value) is bool:
+            value = str(value).lower()
+        value = str(value)
+    value = value.strip()
+    if value == '*':
+        return value
+    return _encode_string(value)
+
+
+def _facets_token(facets: dict) -> str:
+    tokens = []
+    for key, val in facets.items():
+        if isinstance(val, list):
+            val = val[0]
+        if isinstance(val, (datetime.date, datetime.datetime)):
+            tokens.append(f'{key}={val.isoformat()}')
+        elif isinstance(val, (int, float)):
+            tokens.append(f'{key}={val}')
+        else:
+            tokens.append(f'{key}={_enquote(val)}')
+    return f' ({", ".join(tokens)})'
+
 
+def _subject_token(s) -> str:
     if not isinstance(s, (UID, NewID, Variable)):
         s = NewID(s)
+    return s.nquad
 
-    if not isinstance(p, Predicate):
-        p = Predicate.from_key(p)
 
-    if not isinstance(o, (list, set, Scalar, Variable, UID, NewID)):
-        o = Scalar(o)
+def _predicate_key_token(p) -> str:
+    if isinstance(p, str):
+        return _predicate_token(p)
+    if isinstance(p, Predicate):
+        return p.nquad
+    return _predicate_token(str(p))
 
-    nquad_string = f'{s.nquad} {p.nquad} {o.nquad}'
 
-    if hasattr(o, "facets"):
-        if o.facets is not None:
-            facets = []
-            for key, val in o.facets.items():
-                if isinstance(val, list):
-                    val = val[0]
-                if isinstance(val, (datetime.date, datetime.datetime)):
-                    facets.append(f'{key}={val.isoformat()}')
-                elif isinstance(val, (int, float)):
-                    facets.append(f'{key}={val}')
-                else:
-                    facets.append(f'{key}={_enquote(val)}')
-            nquad_string += f' ({", ".join(facets)})'
+def _triple(subject: str, predicate: str, o) -> str:
+    """ One nquad from already encoded subject and predicate tokens """
+    if type(o) is str:
+        return f'{subject} {predicate} {_escape(o)} .'
+    if isinstance(o, (Scalar, Variable, UID, NewID)):
+        facets = getattr(o, 'facets', None)
+        if facets:
+            return f'{subject} {predicate} {o.nquad}{_facets_token(facets)} .'
+        return f'{subject} {predicate} {o.nquad} .'
+    return f'{subject} {predicate} {_escape(o)} .'
 
-    nquad_string += ' .'
-    return nquad_string
 
+def make_nquad(s, p, o) -> str:
+    """ Strings, Ints, Floats, Bools, Date(times) are converted automatically to Scalar """
 
-def dict_to_nquad(d: dict) -> list:
+    return _triple(_subject_token(s), _predicate_key_token(p), o)
+
+
+def iter_nquads(d: dict) -> Iterator[str]:
+    """
+        Generator that yields one nquad per triple of the mutation dict `d`.
+        Subject and predicate tokens are encoded once per dict and key,
+        so this is the preferred way to stream large imports (e.g., into `bulk_mutate`)
+    """
     if d.get('uid'):
-        uid = d['uid']
+        subject = _subject_token(d['uid'])
     else:
-        uid = NewID('_:newentry')
-    nquads = []
+        subject = NewID('_:newentry').nquad
     for key, val in d.items():
         if val is None:
             continue
         if key == 'uid':
             continue
-        if not isinstance(key, Predicate):
-            key = Predicate.from_key(key)
+        predicate = _predicate_key_token(key)
         if isinstance(val, (list, set)):
-            if len(val) > 0:
-                for item in val:
-                    nquads.append(make_nquad(uid, key, item))
+            for item in val:
+                yield _triple(subject, predicate, item)
         else:
-            nquads.append(make_nquad(uid, key, val))
+            yield _triple(subject, predicate, val)
+
+
+def write_nquads(buffer: TextIO, *objs: dict, sep: str = ' \n') -> int:
+    """
+        Write the nquads of all mutation dicts in `objs` into `buffer`
+        (e.g., `io.StringIO` or a file), returns the number of nquads written
+    """
+    count = 0
+    for d in objs:
+        for nquad in iter_nquads(d):
+            if count > 0:
+                buffer.write(sep)
+            buffer.write(nquad)
+            count += 1
+    return count
+
+
+def serialize_nquads(*objs: dict, sep: str = ' \n') -> str:
+    """ All nquads of the mutation dicts in `objs` as one string """
+    return sep.join(chain.from_iterable(iter_nquads(d) for d in objs))
+
 
-    return nquads
+def dict_to_nquad(d: dict) -> list:
+    return list(iter_nquads(d))
+
+
+""" Functions for making JSON mutation objects """
+
+
+def _obj_uid(s) -> str:
+    if isinstance(s, UID):
+        return s.uid
+    if isinstance(s, NewID):
+        return s.newid
+    if isinstance(s, Variable):
+        return f'uid({s.var})'
+    return NewID(s).newid
+
+
+def _obj_plain(val) -> Any:
+    if isinstance(val, (datetime.date, datetime.datetime)):
+        return val.isoformat()
+    return val
+
+
+def _obj_value(predicate: str, o) -> tuple:
+    """ JSON value of `o` and the facets that have to be set next to it """
+    if type(o) is str:
+        o = o.strip()
+        return (None if o == '*' else o), None
+    if isinstance(o, (UID, NewID)):
+        node = {'uid': _obj_uid(o)}
+        # facets of edges are set on the target node
+        for key, val in (o.facets or {}).items():
+            if isinstance(val, list):
+                val = val[0]
+            node[f'{predicate}|{key}'] = _obj_plain(val)
+        return node, None
+    if isinstance(o, Variable):
+        if o.val:
+            return f'val({o.var})', None
+        return {'uid': f'uid({o.var})'}, None
+    if isinstance(o, GeoScalar):
+        return o.value, o.facets
+    if isinstance(o, Scalar):
+        o_str = str(o)
+        return (None if o_str == '*' else o_str), o.facets
+    return _obj_plain(o), None
+
+
+def dict_to_obj(d: dict) -> dict:
+    """
+        Convert a mutation dict (same as for `dict_to_nquad`) into a JSON mutation
+        object for `set_obj` / `del_obj`. Blank nodes become `_:` uids, facets
+        are written as `predicate|facet` keys (facets of list values are
+        keyed by the index of the value). A `'*'` value deletes all values of a
+        predicate, a `'*'` predicate all predicates of the node.
+    """
+    if d.get('uid'):
+        obj = {'uid': _obj_uid(d['uid'])}
+    else:
+        obj = {'uid': NewID('_:newentry').newid}
+    for key, val in d.items():
+        if val is None:
+            continue
+        if key == 'uid' or key == '*':
+            continue
+        if isinstance(key, Predicate):
+            key = key.predicate
+        elif not isinstance(key, str):
+            key = str(key)
+        if isinstance(val, (list, set)):
+            values = []
+            for i, item in enumerate(val):
+                value, facets = _obj_value(key, item)
+                values.append(value)
+                for facet, facet_val in (facets or {}).items():
+                    if isinstance(facet_val, list):
+                        facet_val = facet_val[0]
+                    obj.setdefault(f'{key}|{facet}', {})[str(i)] = _obj_plain(facet_val)
+            obj[key] = values
+        else:
+            value, facets = _obj_value(key, val)
+            obj[key] = value
+            for facet, facet_val in (facets or {}).items():
+                if isinstance(facet_val, list):
+                    facet_val = facet_val[0]
+                obj[f'{key}|{facet}'] = _obj_plain(facet_val)
+    return obj
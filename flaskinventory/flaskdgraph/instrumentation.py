@@ -0,0 +1,164 @@
+"""
+    Instrumentation of DGraph queries and mutations
+    Every call is recorded with a fingerprint (normalized query text),
+    wall time, server side latency, response size and the calling route.
+    Aggregates are kept per request (in `flask.g`) and per process.
+"""
+
+import hashlib
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+from flask import g, has_app_context, has_request_context, request
+
+_string_regex = re.compile(r'"(?:[^"\\]|\\.)*"')
+_regex_literal_regex = re.compile(r'/(?:[^/\\\n]|\\.)+/[a-z]*')
+_uid_regex = re.compile(r'\b0x[0-9a-fA-F]+\b')
+_number_regex = re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?\b')
+_whitespace_regex = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(query_string: str) -> str:
+    """
+        Normalize a query, so queries that only differ in their literals are grouped.
+        `fingerprint('{ q(func: eq(name, "Falter"), first: 5) { uid } }')`
+        -> '{ q(func: eq(name, ?), first: ?) { uid } }'
+    """
+    if not query_string:
+        return ''
+    normalized = redact_literals(query_string)
+    normalized = _uid_regex.sub('?', normalized)
+    normalized = _number_regex.sub('?', normalized)
+    return _whitespace_regex.sub(' ', normalized).strip()
+
+
+def redact_literals(query_string: str) -> str:
+    """
+        Replace string and regex literals of a query, they can hold user input.
+        `redact_literals('{ q(func: eq(email, "me@example.com")) { uid } }')`
+        -> '{ q(func: eq(email, ?)) { uid } }'
+    """
+    redacted = _string_regex.sub('?', query_string)
+    return _regex_literal_regex.sub('/?/', redacted)
+
+
+def fingerprint_id(fingerprint: str) -> str:
+    """ Short id of a fingerprint (for logs and headers) """
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:12]
+
+
+def server_latency(response) -> float:
+    """ Server side latency of a pydgraph response in seconds """
+    latency = getattr(response, 'latency', None)
+    if latency is None:
+        return None
+    total_ns = latency.total_ns or (
+        latency.parsing_ns + latency.processing_ns + latency.encoding_ns)
+    return total_ns / 1e9
+
+
+def current_route() -> str:
+    if has_request_context():
+        return request.endpoint
+    return None
+
+
+class Instrumentation:
+
+    """
+        Process wide statistics of DGraph calls, grouped by fingerprint and by route.
+
+        :param max_fingerprints:
+            limit of distinct fingerprints that are tracked,
+            further ones are grouped under `'<other>'`
+    """
+
+    REQUEST_KEY = 'dgraph_stats'
+
+    def __init__(self, max_fingerprints: int = 1000) -> None:
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._fingerprints = {}
+        self._routes = {}
+
+    def __repr__(self) -> str:
+        return f'<DGraph Instrumentation ({len(self._fingerprints)} fingerprints)>'
+
+    @staticmethod
+    def _empty() -> dict:
+        return {'count': 0, 'wall': 0.0, 'server': 0.0, 'bytes': 0, 'max_wall': 0.0}
+
+    @staticmethod
+    def _add(stats: dict, wall: float, server: float, size: int) -> None:
+        stats['count'] += 1
+        stats['wall'] += wall
+        stats['server'] += server or 0.0
+        stats['bytes'] += size
+        stats['max_wall'] = max(stats['max_wall'], wall)
+
+    def record(self, kind: str, query_string: str, wall: float,
+               response=None, size: int = None, route: str = None) -> dict:
+        """
+            Record one call. `kind` is 'query', 'mutation', 'upsert', etc.
+            Returns the record as dict.
+        """
+        fp = fingerprint(query_string or kind)
+        server = server_latency(response) if response is not None else None
+        if size is None:
+            size = len(getattr(response, 'json', b'') or b'')
+        # outside of requests (e.g., scripts, CLI)
+        route = route or current_route() or '<no request>'
+
+        with self._lock:
+            if fp not in self._fingerprints and len(self._fingerprints) >= self.max_fingerprints:
+                key = '<other>'
+            else:
+                key = fp
+            if key not in self._fingerprints:
+                self._fingerprints[key] = {**self._empty(), 'kind': kind,
+                                           'fingerprint': key, 'routes': Counter()}
+            stats = self._fingerprints[key]
+            self._add(stats, wall, server, size)
+            stats['routes'][route] += 1
+
+            if route not in self._routes:
+                self._routes[route] = self._empty()
+            self._add(self._routes[route], wall, server, size)
+
+        if has_app_context():
+            if self.REQUEST_KEY not in g:
+                setattr(g, self.REQUEST_KEY, self._empty())
+            self._add(getattr(g, self.REQUEST_KEY), wall, server, size)
+
+        return {'kind': kind, 'fingerprint': fp, 'wall': wall, 'server': server,
+                'bytes': size, 'route': route}
+
+    def request_stats(self) -> dict:
+        """ Aggregates of the current request """
+        if has_app_context() and self.REQUEST_KEY in g:
+            return dict(getattr(g, self.REQUEST_KEY))
+        return self._empty()
+
+    def summary(self, sort_by: str = 'wall', limit: int = 20) -> list:
+        """ Fingerprints with the highest `sort_by` ('wall', 'count', 'server', 'bytes', 'max_wall') """
+        with self._lock:
+            entries = [{**stats,
+                        'id': fingerprint_id(stats['fingerprint']),
+                        'routes': dict(stats['routes'].most_common(5))}
+                       for stats in self._fingerprints.values()]
+        entries.sort(key=lambda s: s[sort_by], reverse=True)
+        return entries[:limit]
+
+    def routes(self, sort_by: str = 'wall') -> dict:
+        """ Aggregates per Flask endpoint """
+        with self._lock:
+            routes = {route: dict(stats) for route, stats in self._routes.items()}
+        return dict(sorted(routes.items(), key=lambda item: item[1][sort_by], reverse=True))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._fingerprints = {}
+            self._routes = {}
@@ -0,0 +1,143 @@
+"""
+    Request scoped batching of point lookups
+    Lookups (`uid -> unique_name / dgraph.type`, `field value -> uid`)
+    are collected and resolved together in one multi-block query.
+    Results are memoized until the request ends or a mutation happens.
+"""
+
+import re
+
+from .utils import validate_uid
+
+_predicate_regex = re.compile(r'^[A-Za-z_][\w.]*$')
+
+
+class DGraphLoader:
+
+    """
+        Collects and memoizes point lookups.
+        Use `prime_nodes()` / `prime_uids()` to announce lookups that are
+        needed soon, the next `load` resolves all of them in one query.
+
+        :param dgraph:
+            DGraph extension used for sending queries
+        :param batch_size:
+            maximum number of `eq()` lookups (query blocks) per round trip
+        :param node_batch_size:
+            maximum number of uids per round trip, all of them are
+            resolved in one query block
+    """
+
+    def __init__(self, dgraph, batch_size: int = 100, node_batch_size: int = 1000) -> None:
+        self.dgraph = dgraph
+        self.batch_size = batch_size
+        self.node_batch_size = node_batch_size
+
+        # key: uid, val: {'uid', 'unique_name', 'dgraph.type'} or None
+        self._nodes = {}
+        # key: (field, value), val: uid or None
+        self._uids = {}
+
+        self._pending_nodes = []
+        self._pending_uids = []
+
+    def __repr__(self) -> str:
+        return f'<DGraph Loader ({len(self._nodes)} nodes, {len(self._uids)} uids)>'
+
+    def clear(self) -> None:
+        self._nodes = {}
+        self._uids = {}
+        self._pending_nodes = []
+        self._pending_uids = []
+
+    """
+        Announce lookups
+    """
+
+    def prime_nodes(self, uids: list) -> None:
+        """ Queue uids for the next batch. Values that are not uids are ignored """
+        for uid in uids:
+            uid = validate_uid(uid)
+            if not uid or uid in self._nodes or uid in self._pending_nodes:
+                continue
+            self._pending_nodes.append(uid)
+
+    def prime_uids(self, field: str, values: list) -> None:
+        """ Queue `eq(field, value)` lookups for the next batch """
+        if not _predicate_regex.match(field):
+            raise ValueError(f'Invalid predicate name: {field}')
+        for value in values:
+            key = (field, str(value).strip())
+            if key in self._uids or key in self._pending_uids:
+                continue
+            self._pending_uids.append(key)
+
+    """
+        Resolve lookups
+    """
+
+    def node(self, uid: str) -> dict:
+        """ Get `uid`, `unique_name` and `dgraph.type` of a node """
+        uid = validate_uid(uid)
+        if not uid:
+            return None
+        if uid not in self._nodes:
+            self.prime_nodes([uid])
+            self.flush()
+        return self._nodes[uid]
+
+    def nodes(self, uids: list) -> dict:
+        """
+            Get many nodes at once, returns a dict `{uid: node or None}`
+            (e.g., to check the dgraph.type of all related entries)
+        """
+        self.prime_nodes(uids)
+        self.flush()
+        return {uid: self._nodes.get(validate_uid(uid)) for uid in uids if validate_uid(uid)}
+
+    def uid(self, field: str, value: str) -> str:
+        """ Get the first uid where `field` equals `value` """
+        key = (field, str(value).strip())
+        if key not in self._uids:
+            self.prime_uids(field, [value])
+            self.flush()
+        return self._uids[key]
+
+    def flush(self) -> None:
+        """ Resolve all queued lookups """
+        while len(self._pending_nodes) > 0 or len(self._pending_uids) > 0:
+            nodes = self._pending_nodes[:self.node_batch_size]
+            self._pending_nodes = self._pending_nodes[self.node_batch_size:]
+            uids = self._pending_uids[:self.batch_size]
+            self._pending_uids = self._pending_uids[self.batch_size:]
+            self._resolve(nodes, uids)
+
+    def _resolve(self, nodes: list, uids: list) -> None:
+        variables = {}
+        blocks = []
+        if len(nodes) > 0:
+            # uids are validated hex strings, safe to use in the query text
+            blocks.append(
+                f'nodes(func: uid({", ".join(nodes)})) @filter(has(dgraph.type)) {{ uid unique_name dgraph.type }}')
+        for i, (field, value) in enumerate(uids):
+            variables[f'$e{i}'] = value
+            blocks.append(f'e{i}(func: eq({field}, $e{i})) {{ uid }}')
+
+        if len(blocks) == 0:
+            return
+
+        if len(variables) > 0:
+            query_vars = ", ".join([f'{var}: string' for var in variables])
+            query_string = f'query batch({query_vars}) {{ ' + \
+                " ".join(blocks) + ' }'
+            data = self.dgraph.query(query_string, variables=variables)
+        else:
+            data = self.dgraph.query('{ ' + " ".join(blocks) + ' }')
+
+        # compare as numbers, DGraph drops leading zeros (0x01a -> 0x1a)
+        found = {int(node['uid'], 16): node for node in data.get('nodes', [])}
+        for uid in nodes:
+            self._nodes[uid] = found.get(int(uid, 16))
+        for i, key in enumerate(uids):
+            result = data.get(f'e{i}', [])
+            self._uids[key] = result[0]['uid'] if len(result) > 0 else None
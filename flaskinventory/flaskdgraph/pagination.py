@@ -0,0 +1,63 @@
+"""
+    Cursor based pagination for large result sets
+    Pages are requested with `first: $first, after: $after` and the uid of the
+    last node is the cursor for the next page. Unlike `offset` every page
+    costs the same, no matter how deep into the result set it is.
+"""
+
+import json
+import time
+from typing import Callable, Iterator
+
+import pydgraph
+
+
+def iter_query(client: pydgraph.DgraphClient,
+               query_string: str,
+               variables: dict = None,
+               page_size: int = 1000,
+               block: str = None,
+               decode: Callable = json.loads,
+               on_page: Callable = None) -> Iterator[dict]:
+    """
+        Generator that yields the nodes of one query block page by page.
+        All pages are read in the same read-only transaction (same snapshot).
+
+        The query has to declare `$first: int` and `$after: string` and use
+        them in the root function of the block. Results are in uid order,
+        so the block cannot use `orderasc` / `orderdesc`.
+
+        query all_sources($first: int, $after: string) {
+            q(func: type("Source"), first: $first, after: $after) { uid name }
+        }
+
+        :param block:
+            name of the query block, default: the first block of the response
+        :param on_page:
+            called with `(start time, response)` after each page (e.g., for instrumentation)
+    """
+    if page_size < 1:
+        raise ValueError('page_size has to be a positive integer!')
+
+    variables = dict(variables or {})
+    variables['$first'] = str(page_size)
+    after = '0x0'
+
+    txn = client.txn(read_only=True)
+    try:
+        while True:
+            variables['$after'] = after
+            start = time.perf_counter()
+            res = txn.query(query_string, variables=variables)
+            if on_page:
+                on_page(start, res)
+            data = decode(res.json)
+            if block is None:
+                block = next(iter(data.keys()), None)
+            page = data.get(block, []) if block else []
+            yield from page
+            if len(page) < page_size:
+                break
+            after = page[-1]['uid']
+    finally:
+        txn.discard()
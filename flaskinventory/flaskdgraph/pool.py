@@ -0,0 +1,290 @@
+"""
+    Connection pool for DGraph alpha endpoints
+    Keeps several client stubs per endpoint and hands them out round-robin.
+    Endpoints that repeatedly fail are ejected and probed again after a while.
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+
+import grpc
+import pydgraph
+from pydgraph.proto import api_pb2 as api
+
+# short names for common gRPC channel arguments
+CHANNEL_OPTIONS = {
+    # seconds between keepalive pings
+    'keepalive_time': ('grpc.keepalive_time_ms', lambda v: int(v * 1000)),
+    # seconds to wait for a keepalive ping to be answered
+    'keepalive_timeout': ('grpc.keepalive_timeout_ms', lambda v: int(v * 1000)),
+    # send keepalive pings also when there are no calls in flight
+    'keepalive_permit_without_calls': ('grpc.keepalive_permit_without_calls', int),
+    # bytes, limit for responses (large `expand(_all_)` queries)
+    'max_receive_message_length': ('grpc.max_receive_message_length', int),
+    # bytes, limit for requests (large mutations)
+    'max_send_message_length': ('grpc.max_send_message_length', int),
+}
+
+COMPRESSION = {None: grpc.Compression.NoCompression,
+               'none': grpc.Compression.NoCompression,
+               'gzip': grpc.Compression.Gzip,
+               'deflate': grpc.Compression.Deflate}
+
+
+def channel_options(options) -> list:
+    """
+        Convert the `DGRAPH_OPTIONS` setting to gRPC channel arguments.
+        Accepts a list of `(key, value)` tuples (passed on as is) or a dict with
+        short names, e.g.:
+        `{'keepalive_time': 30, 'max_message_length': 64 * 1024 ** 2, 'compression': 'gzip'}`
+        Keys that start with `grpc.` are passed on unchanged.
+    """
+    if options is None:
+        return None
+    if not isinstance(options, dict):
+        return list(options)
+
+    converted = []
+    for key, value in options.items():
+        if key.startswith('grpc.'):
+            converted.append((key, value))
+        elif key == 'max_message_length':
+            converted.append(('grpc.max_receive_message_length', int(value)))
+            converted.append(('grpc.max_send_message_length', int(value)))
+        elif key == 'compression':
+            if value not in COMPRESSION:
+                raise ValueError(f'Unknown DGraph channel compression: {value}')
+            converted.append(('grpc.default_compression_algorithm', int(COMPRESSION[value])))
+        elif key in CHANNEL_OPTIONS:
+            name, convert = CHANNEL_OPTIONS[key]
+            converted.append((name, convert(value)))
+        else:
+            raise ValueError(f'Unknown DGraph channel option: {key}')
+    return converted
+
+
+class Endpoint:
+
+    """
+        A single DGraph alpha with a fixed number of client stubs
+    """
+
+    def __init__(self, address: str, size: int = 2, credentials=None, options=None) -> None:
+        self.address = address
+        self.size = max(int(size), 1)
+        self.credentials = credentials
+        self.options = options
+
+        self.stubs = []
+        self.clients = []
+        self._cycle = None
+        self._lock = threading.Lock()
+
+        # health tracking
+        self.failures = 0
+        self.ejected_at = None
+
+    def __repr__(self) -> str:
+        status = 'ejected' if self.ejected else 'healthy'
+        return f'<DGraph Endpoint "{self.address}" ({status})>'
+
+    def connect(self) -> None:
+        for _ in range(self.size):
+            stub = pydgraph.DgraphClientStub(self.address,
+                                             credentials=self.credentials,
+                                             options=self.options)
+            self.stubs.append(stub)
+            self.clients.append(pydgraph.DgraphClient(stub))
+        self._cycle = itertools.cycle(self.clients)
+
+    def next_client(self) -> pydgraph.DgraphClient:
+        with self._lock:
+            if self._cycle is None:
+                self.connect()
+            return next(self._cycle)
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_at is not None
+
+    def warmup(self, timeout: float = 2) -> bool:
+        """ Open all channels of the endpoint, returns True if every stub answered """
+        with self._lock:
+            if self._cycle is None:
+                self.connect()
+        try:
+            for stub in self.stubs:
+                stub.check_version(api.Check(), timeout=timeout)
+            return True
+        except grpc.RpcError:
+            return False
+
+    def probe(self, timeout: float = 2) -> bool:
+        """ Ask the alpha for its version, returns True if it answered """
+        if not self.stubs:
+            self.connect()
+        try:
+            self.stubs[0].check_version(api.Check(), timeout=timeout)
+            return True
+        except grpc.RpcError:
+            return False
+
+    def close(self) -> None:
+        with self._lock:
+            for stub in self.stubs:
+                try:
+                    stub.close()
+                except Exception:
+                    pass
+            self.stubs = []
+            self.clients = []
+            self._cycle = None
+
+
+class DGraphPool:
+
+    """
+        Pool of DGraph endpoints.
+        `acquire()` returns the next healthy endpoint together with one of its clients.
+        Callers report the outcome with `mark_failed()` / `mark_healthy()`.
+
+        :param endpoints:
+            list of alpha addresses (e.g., `['alpha1:9080', 'alpha2:9080']`)
+        :param size:
+            number of client stubs per endpoint
+        :param max_failures:
+            consecutive failures before an endpoint is ejected
+        :param retry_interval:
+            seconds until an ejected endpoint is probed again
+
+        gRPC channels must not be shared across processes. A pool belongs to the
+        process that created it (`pid`), forked workers have to create their own.
+    """
+
+    def __init__(self, endpoints: list,
+                 size: int = 2,
+                 credentials=None,
+                 options=None,
+                 max_failures: int = 3,
+                 retry_interval: float = 30,
+                 probe_timeout: float = 2) -> None:
+
+        if isinstance(endpoints, str):
+            endpoints = [e.strip() for e in endpoints.split(',') if e.strip() != '']
+
+        if not endpoints:
+            raise ValueError('DGraph connection pool needs at least one endpoint!')
+
+        self.logger = logging.getLogger(__name__)
+        self.pid = os.getpid()
+
+        options = channel_options(options)
+        self.endpoints = [Endpoint(address, size=size, credentials=credentials, options=options)
+                          for address in endpoints]
+        self.max_failures = max_failures
+        self.retry_interval = retry_interval
+        self.probe_timeout = probe_timeout
+
+        self._cycle = itertools.cycle(self.endpoints)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def __repr__(self) -> str:
+        return f'<DGraph Pool {self.endpoints}>'
+
+    @property
+    def owned(self) -> bool:
+        """ False if the pool was inherited from a parent process """
+        return self.pid == os.getpid()
+
+    @property
+    def healthy(self) -> list:
+        return [e for e in self.endpoints if not e.ejected]
+
+    def _readmit(self) -> None:
+        # probe ejected endpoints once their retry interval is over
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if not endpoint.ejected:
+                continue
+            if now - endpoint.ejected_at < self.retry_interval:
+                continue
+            # claim the probe, so concurrent threads wait for another interval
+            endpoint.ejected_at = now
+            if endpoint.probe(timeout=self.probe_timeout):
+                self.logger.warning(f'DGraph endpoint is back: {endpoint.address}')
+                self.mark_healthy(endpoint)
+
+    def acquire(self, exclude: list = None) -> tuple:
+        """
+            Get the next endpoint (round-robin) and a client for it.
+            Returns a tuple: `(<Endpoint>, <DgraphClient>)`
+        """
+        exclude = exclude or []
+        self._readmit()
+        with self._lock:
+            for _ in range(len(self.endpoints)):
+                endpoint = next(self._cycle)
+                if endpoint.ejected or endpoint in exclude:
+                    continue
+                break
+            else:
+                # no healthy endpoint left: better try anything than nothing
+                candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+                endpoint = candidates[0]
+        return endpoint, endpoint.next_client()
+
+    def client(self) -> pydgraph.DgraphClient:
+        _, client = self.acquire()
+        return client
+
+    def mark_failed(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            endpoint.failures += 1
+            if endpoint.failures >= self.max_failures and not endpoint.ejected:
+                endpoint.ejected_at = time.monotonic()
+                self.logger.error(
+                    f'Ejecting DGraph endpoint after {endpoint.failures} failures: {endpoint.address}')
+
+    def mark_healthy(self, endpoint: Endpoint) -> None:
+        if endpoint.failures == 0 and not endpoint.ejected:
+            return
+        with self._lock:
+            endpoint.failures = 0
+            endpoint.ejected_at = None
+
+    def warmup(self) -> int:
+        """ Connect to all endpoints, returns the number of reachable endpoints """
+        reachable = 0
+        for endpoint in self.endpoints:
+            if endpoint.warmup(timeout=self.probe_timeout):
+                self.mark_healthy(endpoint)
+                reachable += 1
+            else:
+                self.logger.error(f'DGraph endpoint not reachable: {endpoint.address}')
+                self.mark_failed(endpoint)
+        return reachable
+
+    def close(self) -> None:
+        if not self.owned:
+            # channels of the parent process are left alone
+            return
+        for endpoint in self.endpoints:
+            endpoint.close()
+
+
+def is_connection_failure(error: Exception) -> bool:
+    """ Check whether an exception means that the endpoint could not be reached """
+    if isinstance(error, pydgraph.errors.ConnectionError):
+        return True
+    if isinstance(error, grpc.RpcError):
+        try:
+            return error.code() in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+        except AttributeError:
+            return False
+    return False
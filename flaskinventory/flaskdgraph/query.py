@@ -1,3 +1,9 @@
+import base64
+import json
+import threading
+import time
+from copy import deepcopy
+
 from .schema import Schema
 
 from wtforms import SubmitField, SelectField, StringField, RadioField
@@ -16,10 +22,60 @@ from .customformfields import TomSelectMultipleField
 # checking for equality
 
 
-def build_query_string(query: dict, public=True) -> str:
+# Cursor Pagination:
+# results are sorted by name and unique_name (as tie breaker)
+# a cursor is the name and unique_name of the first / last entry of the current page
+# the next page has all entries that come after the cursor, the previous page all
+# entries that come before it (queried in reverse order).
+# uids cannot be compared in filters, so they cannot serve as cursor.
+
+def encode_cursor(direction: str, name: str, unique_name: str) -> str:
+    """
+        Make an opaque cursor token.
+        `direction` is 'next' (entries after) or 'prev' (entries before)
+    """
+    payload = json.dumps([direction, name or '', unique_name or ''], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> tuple:
+    """
+        Read a cursor token, returns a tuple `(direction, name, unique_name)`
+        or None for invalid tokens
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, name, unique_name = json.loads(
+            base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(name, str) or not isinstance(unique_name, str):
+        return None
+    return direction, name, unique_name
+
+
+def cursor_variables(cursor: tuple) -> dict:
+    """ Query variables for a decoded cursor """
+    if not cursor:
+        return {}
+    _, name, unique_name = cursor
+    return {'$cursorName': name, '$cursorUniqueName': unique_name}
+
+
+def build_query_string(query: dict, public=True, total=True, results=True) -> str:
     """
         Construct a query string from a dictionary of filters.
         Returns a dql query string with two queries: `total` and `q`
+
+        :param total:
+            include the `total` query (count of all matching entries)
+        :param results:
+            include the `q` query (entries of the current page)
+
+        The `q` query is paginated with `_page` (offset) or with a `_cursor`
+        token (see `encode_cursor()`), the cursor takes precedence.
     """
 
     from flaskinventory.flaskdgraph.dgraph_types import Facet, MutualRelationship, SingleRelationship
@@ -42,6 +98,13 @@ def build_query_string(query: dict, public=True) -> str:
     except (KeyError, ValueError):
         page = 0
 
+    # get parameter: cursor of the next / previous page
+    try:
+        cursor = query.pop('_cursor')
+        cursor = decode_cursor(cursor[0] if isinstance(cursor, list) else cursor)
+    except KeyError:
+        cursor = None
+
     # special treatment for free text search
     # maybe incorporate searchable predicates in Schema someday...
     filters = []
@@ -69,7 +132,7 @@ def build_query_string(query: dict, public=True) -> str:
 
     except (KeyError, ValueError):
         search_terms = None
-        variables = None
+        variables = {}
 
     # special treatment for dgraph.type
 
@@ -128,7 +191,9 @@ def build_query_string(query: dict, public=True) -> str:
     if public:
         filters.append('eq(entry_review_status, "accepted")')
 
-    for predicate, val in cleaned_query.items():
+    # same filters in the same order produce the same query string
+    # (e.g., for caching the total count)
+    for predicate, val in sorted(cleaned_query.items(), key=lambda item: item[0].predicate):
         # get predicate from Schema
 
         # check if we have a non-default operator
@@ -197,38 +262,71 @@ def build_query_string(query: dict, public=True) -> str:
     else:
         cascade = ""
 
+    # the total count does not depend on the page
+    if results and cursor:
+        variables.update(cursor_variables(cursor))
+        direction, _, _ = cursor
+        if direction == 'prev':
+            # previous page is read backwards, callers have to reverse the results
+            ordering = 'orderdesc: name, orderdesc: unique_name'
+            comparator = 'lt'
+        else:
+            ordering = 'orderasc: name, orderasc: unique_name'
+            comparator = 'gt'
+        pagination = f'{ordering}, first: {max_results}'
+        results_filters = f"""{filters} AND ({comparator}(name, $cursorName) OR
+                            (eq(name, $cursorName) AND {comparator}(unique_name, $cursorUniqueName)))"""
+    else:
+        pagination = f'orderasc: name, orderasc: unique_name, first: {max_results}, offset: {page * max_results}'
+        results_filters = filters
+
     if variables:
         variables_declaration = ", ".join([f'{k}: string' for k in variables])
         variables_declaration = f'query search({variables_declaration})'
     else:
         variables_declaration = ''
 
-    query_string = f"""
-        {variables_declaration}
-        {{
+    total_block = f"""
         total(func: has(dgraph.type)) 
             @filter({filters}) {cascade} {{
                 {" ".join(query_parts_total)}
             }}
+    """ if total else ''
 
-        q(func: has(dgraph.type), orderasc: name, first: {max_results}, offset: {page * max_results}) 
-            @filter({filters}) {cascade} {{
+    results_block = f"""
+        q(func: has(dgraph.type), {pagination}) 
+            @filter({results_filters}) {cascade} {{
                 {" ".join(query_parts)}
             }}
+    """ if results else ''
+
+    query_string = f"""
+        {variables_declaration}
+        {{
+        {total_block}
+        {results_block}
         }}
     """
 
     return query_string
 
 
-def generate_query_forms(dgraph_types: list = None, populate_obj: dict = None) -> FlaskForm:
+# form classes of `generate_query_forms()` per tuple of dgraph types
+# as `(created, dgraph write generation, form class)`
+_query_form_classes = {}
+_query_form_lock = threading.Lock()
 
-    if populate_obj is None:
-        populate_obj = {}
+# seconds until the choices of a form class are loaded again
+QUERY_FORM_TTL = 300
 
-    # if no type is specified, just create a form for all types
-    if not dgraph_types:
-        dgraph_types = Schema.get_types()
+
+def invalidate_query_forms() -> None:
+    """ Drop all cached query form classes (e.g., after changing choices) """
+    with _query_form_lock:
+        _query_form_classes.clear()
+
+
+def _build_query_form_class(dgraph_types: tuple) -> type:
 
     class F(FlaskForm):
 
@@ -241,13 +339,14 @@ def generate_query_forms(dgraph_types: list = None, populate_obj: dict = None) -
             return getattr(self, field, None)
 
     setattr(F, 'dgraph.type', TomSelectMultipleField(
-        'Entity Type', choices=dgraph_types))
+        'Entity Type', choices=list(dgraph_types)))
 
     for dt in dgraph_types:
         fields = Schema.get_queryable_predicates(dt)
         for k, v in fields.items():
             if not hasattr(F, k):
-                setattr(F, k, v.query_field)
+                # query fields change the render_kw and choices of the predicate
+                setattr(F, k, deepcopy(v).query_field)
                 if isinstance(v.operators, list):
                     operator_selection = SelectField(
                         'operator', name=f'{v}*operator', choices=v.operators)
@@ -257,6 +356,42 @@ def generate_query_forms(dgraph_types: list = None, populate_obj: dict = None) -
                         'connector', name=f'{v}*connector', choices=[('AND', 'and'), ('OR', 'or')])
                     setattr(F, f'{k}*connector', connector_selection)
 
+    return F
+
+
+def get_query_form_class(dgraph_types: list = None, ttl: float = QUERY_FORM_TTL) -> type:
+    """
+        Get the query form class for a list of dgraph types.
+        Classes are built once and reused until `ttl` seconds passed
+        or something was written to DGraph (choices could have changed).
+    """
+    from flaskinventory import dgraph
+
+    # if no type is specified, just create a form for all types
+    if not dgraph_types:
+        dgraph_types = Schema.get_types()
+    key = tuple(dgraph_types)
+
+    cached = _query_form_classes.get(key)
+    if cached is not None:
+        created, generation, form_class = cached
+        if generation == dgraph.generation and time.monotonic() - created < ttl:
+            return form_class
+
+    generation = dgraph.generation
+    form_class = _build_query_form_class(key)
+    with _query_form_lock:
+        _query_form_classes[key] = (time.monotonic(), generation, form_class)
+    return form_class
+
+
+def generate_query_forms(dgraph_types: list = None, populate_obj: dict = None) -> FlaskForm:
+
+    if populate_obj is None:
+        populate_obj = {}
+
+    F = get_query_form_class(dgraph_types)
+
     form = F(formdata=populate_obj)
 
     return form
@@ -0,0 +1,155 @@
+"""
+    Retry policy for DGraph transactions
+    Aborted transactions (conflicting concurrent writes) and transient
+    gRPC errors are retried with exponential backoff and jitter.
+    A transient error can also occur after DGraph committed the write
+    (e.g., the connection is lost before the response arrives), so writes
+    that add new nodes are only retried when they were aborted.
+"""
+
+import logging
+import random
+import re
+import threading
+import time
+
+import grpc
+import pydgraph
+
+# gRPC status codes of errors that are likely gone when trying again
+TRANSIENT_CODES = (grpc.StatusCode.UNAVAILABLE,
+                   grpc.StatusCode.RESOURCE_EXHAUSTED)
+
+
+def is_conflict(error: Exception) -> bool:
+    """ Transaction was aborted because of a conflicting write """
+    return isinstance(error, pydgraph.errors.AbortedError)
+
+
+def is_transient(error: Exception) -> bool:
+    """ Error that is likely gone when trying again """
+    if isinstance(error, (pydgraph.errors.RetriableError, pydgraph.errors.ConnectionError)):
+        return True
+    if isinstance(error, grpc.RpcError):
+        try:
+            return error.code() in TRANSIENT_CODES
+        except AttributeError:
+            return False
+    return False
+
+
+_blank_node_regex = re.compile(r'_:[\w.\-]+')
+
+
+def creates_nodes(set_nquads=None, set_obj=None) -> bool:
+    """
+        Whether a mutation adds new nodes (blank nodes or objects without uid),
+        running it twice would add them twice
+    """
+    if set_nquads:
+        if isinstance(set_nquads, bytes):
+            set_nquads = set_nquads.decode('utf-8')
+        if _blank_node_regex.search(set_nquads):
+            return True
+    if isinstance(set_obj, list):
+        return any(creates_nodes(set_obj=obj) for obj in set_obj)
+    if isinstance(set_obj, dict):
+        uid = set_obj.get('uid')
+        if uid is None or str(uid).startswith('_:'):
+            return True
+        return any(creates_nodes(set_obj=val) for val in set_obj.values()
+                   if isinstance(val, (dict, list)))
+    return False
+
+
+class RetryPolicy:
+
+    """
+        How often and how long to wait before a transaction is retried.
+        Also keeps counters of retries, conflicts and writes that were given up.
+
+        :param max_attempts:
+            total number of attempts (1 = no retries)
+        :param base_delay:
+            seconds to wait before the first retry, doubles with every attempt
+        :param max_delay:
+            upper limit for the wait between two attempts
+        :param jitter:
+            wait a random time between 0 and the delay ("full jitter")
+    """
+
+    def __init__(self, max_attempts: int = 5,
+                 base_delay: float = 0.05,
+                 max_delay: float = 2,
+                 jitter: bool = True) -> None:
+        self.max_attempts = max(int(max_attempts), 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.conflicts = 0
+        self.failures = 0
+
+    def __repr__(self) -> str:
+        return f'<DGraph RetryPolicy max_attempts={self.max_attempts} {self.stats}>'
+
+    def should_retry(self, error: Exception, idempotent: bool = True) -> bool:
+        """ Writes that are not idempotent are only retried when they were aborted """
+        return is_conflict(error) or (idempotent and is_transient(error))
+
+    def delay(self, attempt: int) -> float:
+        """ Seconds to wait after the n-th failed attempt (starting at 1) """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def record(self, error: Exception, retry: bool) -> None:
+        with self._lock:
+            if is_conflict(error):
+                self.conflicts += 1
+            if retry:
+                self.retries += 1
+            else:
+                self.failures += 1
+
+    def call(self, fn, idempotent: bool = True):
+        """
+            Call `fn()` until it succeeds, raises an error that should not be retried,
+            or the maximum number of attempts is reached.
+            With `idempotent=False` transient errors are raised right away.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn()
+            except Exception as e:
+                if not self.should_retry(e, idempotent=idempotent):
+                    raise
+                retry = attempt < self.max_attempts
+                self.record(e, retry)
+                if not retry:
+                    self.logger.error(
+                        f'DGraph transaction failed after {attempt} attempts: {e}')
+                    raise
+                delay = self.delay(attempt)
+                self.logger.warning(
+                    f'DGraph transaction failed (attempt {attempt}), retrying in {delay:.2f}s: {e}')
+                time.sleep(delay)
+
+    @property
+    def stats(self) -> dict:
+        return {'retries': self.retries,
+                'conflicts': self.conflicts,
+                'failures': self.failures}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.retries = 0
+            self.conflicts = 0
+            self.failures = 0
@@ -1,5 +1,6 @@
-from copy import deepcopy
+from copy import copy
 from datetime import datetime
+from types import MappingProxyType
 from flask_wtf import FlaskForm
 from wtforms import SubmitField
 from wtforms import IntegerField
@@ -9,6 +10,10 @@ from flaskinventory.users.constants import USER_ROLES
 
 class Schema:
 
+    # The getters return read-only views of the registry (no copies).
+    # Predicate objects are shared by all callers: clone them
+    # (e.g., with `copy()`) before changing their state.
+
     # registry of all types and which predicates they have
     # Key = Dgraph Type (string), val = dict of predicates
     __types__ = {}
@@ -20,6 +25,12 @@ class Schema:
 
     __inheritance__ = {}
 
+    # lookup indices, built once when a type is registered
+    # key = lower case name of type, val = name of type
+    __types_by_name__ = {}
+    # key = name of type, val = tuple of the type and all its parents
+    __resolved_inheritance__ = {}
+
     # Registry of permissions for each type
     __perm_registry_new__ = {}
     __perm_registry_edit__ = {}
@@ -41,8 +52,12 @@ class Schema:
 
     __queryable_predicates_by_type__ = {}
 
+    # registry of all predicates and facets that hold datetime values
+    # e.g., {'founded', 'audience_size|date'}
+    __datetime_predicates__ = set()
+
     def __init_subclass__(cls) -> None:
-        from .dgraph_types import _PrimitivePredicate, Facet, Predicate, SingleRelationship, ReverseRelationship, MutualRelationship
+        from .dgraph_types import _PrimitivePredicate, Facet, Predicate, SingleRelationship, ReverseRelationship, MutualRelationship, DateTime
         predicates = {key: getattr(cls, key) for key in cls.__dict__ if isinstance(
             getattr(cls, key), (Predicate, MutualRelationship))}
 
@@ -82,6 +97,9 @@ class Schema:
                         set(Schema.__inheritance__[cls.__name__]))
 
         Schema.__types__[cls.__name__] = predicates
+        Schema.__types_by_name__[cls.__name__.lower()] = cls.__name__
+        Schema.__resolved_inheritance__[cls.__name__] = (
+            cls.__name__, *Schema.__inheritance__.get(cls.__name__, []))
         Schema.__reverse_relationship_predicates__[
             cls.__name__] = reverse_predicates
         Schema.__perm_registry_new__[cls.__name__] = cls.__permission_new__
@@ -93,11 +111,15 @@ class Schema:
             if isinstance(attribute, (Predicate, MutualRelationship)):
                 setattr(attribute, 'predicate', key)
                 setattr(attribute, 'bound_dgraph_type', cls.__name__)
+                if isinstance(attribute, DateTime):
+                    cls.__datetime_predicates__.add(key)
                 if attribute.facets:
                     for facet in attribute.facets.values():
                         facet.predicate = key
                         if facet.queryable:
                             queryable_predicates.update({str(facet): facet})
+                        if facet.type == datetime:
+                            cls.__datetime_predicates__.add(str(facet))
                 if key not in cls.__predicates_types__:
                     cls.__predicates_types__.update({key: [cls.__name__]})
                 else:
@@ -147,10 +169,15 @@ class Schema:
         if not dgraph_type:
             return None
         assert isinstance(dgraph_type, str), TypeError
-        for t in list(cls.__types__.keys()):
-            if t.lower() == dgraph_type.lower():
-                return t
-        return None
+        return cls.__types_by_name__.get(dgraph_type.lower())
+
+    @classmethod
+    def get_datetime_predicates(cls) -> set:
+        """
+            Get all predicates and facets that hold datetime values.
+            `Schema.get_datetime_predicates()` -> {'founded', 'published_date', ...}
+        """
+        return set(cls.__datetime_predicates__)
 
     @classmethod
     def get_predicates(cls, _cls) -> dict:
@@ -161,7 +188,7 @@ class Schema:
         """
         if not isinstance(_cls, str):
             _cls = _cls.__name__
-        return deepcopy(cls.__types__[_cls])
+        return MappingProxyType(cls.__types__[_cls])
 
     @classmethod
     def get_relationships(cls, _cls) -> dict:
@@ -187,7 +214,7 @@ class Schema:
         if not isinstance(_cls, str):
             _cls = _cls.__name__
         if _cls in cls.__reverse_relationship_predicates__:
-            return deepcopy(cls.__reverse_relationship_predicates__[_cls])
+            return MappingProxyType(cls.__reverse_relationship_predicates__[_cls])
         else:
             return None
 
@@ -202,20 +229,20 @@ class Schema:
             `FileFormat.predicates()` -> Only predicates for this DGraph Type
         """
         try:
-            predicates = deepcopy(cls.__types__[cls.__name__])
+            predicates = cls.__types__[cls.__name__]
         except KeyError:
-            predicates = deepcopy(cls.__predicates__)
+            predicates = cls.__predicates__
 
-        return predicates
+        return MappingProxyType(predicates)
 
     @classmethod
     def relationship_predicates(cls) -> dict:
-        return deepcopy(cls.__relationship_predicates__)
+        return MappingProxyType(cls.__relationship_predicates__)
 
     @classmethod
     def reverse_predicates(cls) -> dict:
         if cls.__name__ in cls.__reverse_relationship_predicates__:
-            return deepcopy(cls.__reverse_relationship_predicates__[cls.__name__])
+            return MappingProxyType(cls.__reverse_relationship_predicates__[cls.__name__])
         else:
             return None
 
@@ -229,14 +256,24 @@ class Schema:
         return predicates
 
     @classmethod
-    def resolve_inheritance(cls, _cls) -> list:
+    def get_inheritance(cls, _cls) -> tuple:
+        """
+            Get a DGraph Type and all types it inherits from
+            `Schema.get_inheritance('Source')` -> ('Source', 'Entry')
+        """
         if not isinstance(_cls, str):
             _cls = _cls.__name__
-        assert _cls in cls.__types__, f'DGraph Type "{_cls}" not found!'
-        dgraph_types = [_cls]
-        if _cls in cls.__inheritance__:
-            dgraph_types += cls.__inheritance__[_cls]
-        return dgraph_types
+        resolved = cls.__resolved_inheritance__.get(_cls)
+        assert resolved is not None, f'DGraph Type "{_cls}" not found!'
+        return resolved
+
+    @classmethod
+    def resolve_inheritance(cls, _cls) -> list:
+        """
+            Same as `get_inheritance()` but returns a new list
+            (e.g., for `dgraph.type` of new entries)
+        """
+        return list(cls.get_inheritance(_cls))
 
     @classmethod
     def permissions_new(cls, _cls) -> int:
@@ -254,9 +291,9 @@ class Schema:
     def get_queryable_predicates(cls, _cls=None) -> dict:
         if _cls is None:
             try:
-                return deepcopy(cls.__queryable_predicates_by_type__[cls.__name__])
+                return MappingProxyType(cls.__queryable_predicates_by_type__[cls.__name__])
             except KeyError:
-                return deepcopy(cls.__queryable_predicates__)
+                return MappingProxyType(cls.__queryable_predicates__)
 
         if not isinstance(_cls, str):
             _cls = _cls.__name__
@@ -264,9 +301,9 @@ class Schema:
             _cls = cls.get_type(_cls)
 
         try:
-            return deepcopy(cls.__queryable_predicates_by_type__[_cls])
+            return MappingProxyType(cls.__queryable_predicates_by_type__[_cls])
         except KeyError:
-            return {}
+            return MappingProxyType({})
 
     @staticmethod
     def populate_form(form: FlaskForm, populate_obj: dict, fields: dict) -> FlaskForm:
@@ -297,11 +334,11 @@ class Schema:
     def generate_new_entry_form(cls, dgraph_type=None, populate_obj: dict = None) -> FlaskForm:
 
         if dgraph_type:
-            fields = cls.get_predicates(dgraph_type)
+            fields = dict(cls.get_predicates(dgraph_type))
             if cls.get_reverse_predicates(dgraph_type):
                 fields.update(cls.get_reverse_predicates(dgraph_type))
         else:
-            fields = cls.predicates()
+            fields = dict(cls.predicates())
             if cls.reverse_predicates():
                 fields.update(cls.reverse_predicates())
 
@@ -377,6 +414,8 @@ class Schema:
                         else:
                             choices = [(populate_obj[k]['uid'], populate_obj[k].get('name', populate_obj[k]['uid']))]
                         
+                        # do not change the predicate in the registry
+                        v = copy(v)
                         v.choices_tuples = choices
                 setattr(F, k, v.wtf_field)
 
@@ -0,0 +1,78 @@
+"""
+    Slow query log
+    Queries and mutations that take longer than a threshold are written
+    as JSON lines to a rotating log file (`logs/dgraph_slow_queries.log`).
+    Values of variables and string literals are redacted.
+    Use `tools/slowlog.py` to rank the logged fingerprints.
+"""
+
+import datetime
+import json
+import logging
+import random
+
+from .instrumentation import fingerprint, fingerprint_id, redact_literals
+
+LOGGER_NAME = 'flaskinventory.dgraph.slow_queries'
+
+
+def redact_variables(variables: dict) -> dict:
+    """
+        Replace the values of query variables by their type and length
+        `redact_variables({'$email': 'me@example.com'})` -> {'$email': '<str:14>'}
+    """
+    if not variables:
+        return None
+    return {key: f'<{type(val).__name__}:{len(str(val))}>' for key, val in variables.items()}
+
+
+class SlowQueryLog:
+
+    """
+        Writes slow DGraph calls to a log.
+
+        :param threshold:
+            seconds, calls that take longer are logged
+        :param sample_rate:
+            share of logged calls (0 - 1) that also include the DQL text
+            (with string literals redacted)
+    """
+
+    def __init__(self, threshold: float, sample_rate: float = 0.1, handler: logging.Handler = None) -> None:
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if handler is not None:
+            # do not add the same file twice (e.g., several apps in tests)
+            for existing in self.logger.handlers:
+                if getattr(existing, 'baseFilename', None) == getattr(handler, 'baseFilename', False):
+                    handler.close()
+                    break
+            else:
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self.logger.addHandler(handler)
+
+    def __repr__(self) -> str:
+        return f'<DGraph SlowQueryLog threshold={self.threshold}s>'
+
+    def check(self, kind: str, query_string: str, wall: float,
+              variables: dict = None, size: int = 0, route: str = None) -> bool:
+        """ Log the call if it was slow, returns True if it was logged """
+        if self.threshold is None or wall < self.threshold:
+            return False
+        fp = fingerprint(query_string or kind)
+        entry = {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                 'kind': kind,
+                 'id': fingerprint_id(fp),
+                 'fingerprint': fp,
+                 'duration': round(wall, 6),
+                 'bytes': size,
+                 'route': route,
+                 'variables': redact_variables(variables)}
+        if query_string and random.random() < self.sample_rate:
+            entry['query'] = redact_literals(query_string)
+        self.logger.info(json.dumps(entry))
+        return True
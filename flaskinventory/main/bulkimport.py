@@ -0,0 +1,363 @@
+"""
+    Bulk import of new entries
+    Records (CSV or NDJSON) are validated by the same sanitizers as the
+    web forms. A pool of worker threads validates batches of records, the
+    lookups of a batch (related entries, unique names) are resolved together
+    by the DGraphLoader. Valid records are committed in chunks, each chunk in
+    one conditional upsert that reserves its unique names. The outcome of every
+    record is appended to a checkpoint file, an interrupted import continues
+    where it stopped.
+"""
+
+import copy
+import csv
+import json
+import os
+import secrets
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from flask import Flask, current_app
+from flask_login import login_user
+from slugify import slugify
+
+from flaskinventory import dgraph
+from flaskinventory.errors import InventoryValidationError, InventoryPermissionError
+from flaskinventory.flaskdgraph import Schema
+from flaskinventory.flaskdgraph.dgraph_types import NewID, serialize_nquads
+from flaskinventory.main.sanitizer import Sanitizer, make_sanitizer
+from flaskinventory.main.enrichment import schedule_enrichment
+from flaskinventory.main.unique_names import UniqueNameAllocator
+from flaskinventory.users.dgraph import User
+
+# status of a record
+VALID = 'valid'
+IMPORTED = 'imported'
+INVALID = 'invalid'
+FAILED = 'failed'
+
+
+def read_records(path: str, fmt: str = None) -> Iterator:
+    """
+        Records of a CSV file (first row is the header) or a NDJSON file (one object per line).
+        Empty values are dropped. Lines that are not valid JSON are yielded as exception,
+        they are reported as invalid records.
+    """
+    if fmt is None:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield {key.strip(): val.strip() for key, val in row.items()
+                       if key and isinstance(val, str) and val.strip() != ''}
+        elif fmt in ['ndjson', 'jsonl']:
+            for line in f:
+                if line.strip() == '':
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield InventoryValidationError(f'Invalid JSON: {e}')
+        else:
+            raise ValueError(f'Unknown format: {fmt}')
+
+
+class ImportCheckpoint:
+
+    """
+        Outcome of every record (one JSON object per line), records are
+        identified by their position in the input.
+        Imported records are skipped when the import is resumed,
+        invalid records as well unless `retry_invalid` is set.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.results = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        # last line of an interrupted import
+                        continue
+                    self.results[result['record']] = result
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __repr__(self) -> str:
+        return f'<ImportCheckpoint {self.path} ({len(self.results)} records)>'
+
+    def done(self, record: int, retry_invalid: bool = False) -> bool:
+        result = self.results.get(record)
+        if result is None:
+            return False
+        if result['status'] == INVALID:
+            return not retry_invalid
+        return result['status'] == IMPORTED
+
+    def write(self, results: list) -> None:
+        for result in results:
+            self._file.write(json.dumps(result) + '\n')
+            self.results[result['record']] = result
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _namespace(obj, prefix: str, renamed: dict):
+    # copy of the entries of a record with prefixed blank nodes,
+    # keeps records apart that are committed in the same chunk
+    if isinstance(obj, NewID):
+        key = str(obj)
+        if key not in renamed:
+            newid = copy.copy(obj)
+            newid.newid = f'_:{prefix}{key[2:]}'
+            renamed[key] = newid
+        return renamed[key]
+    if isinstance(obj, dict):
+        return {key: _namespace(val, prefix, renamed) for key, val in obj.items()}
+    if isinstance(obj, list):
+        return [_namespace(val, prefix, renamed) for val in obj]
+    return obj
+
+
+def _uid_values(value) -> list:
+    if isinstance(value, str):
+        value = value.split(',')
+    elif not isinstance(value, (list, tuple, set)):
+        value = [value]
+    return [str(v).strip() for v in value if str(v).strip().startswith('0x')]
+
+
+class BulkImporter:
+
+    """
+        Validate and commit many new entries of one dgraph type.
+
+        :param user:
+            the entries are added by this user
+        :param batch_size:
+            records per validation batch, the lookups of a batch are resolved together
+        :param workers:
+            number of threads that validate batches
+        :param chunk_size:
+            records per transaction
+        :param checkpoint:
+            path of the checkpoint file, import without checkpoints if not set
+        :param dry_run:
+            only validate the records
+        :param retry_invalid:
+            when resuming, validate records again that were invalid before
+        :param ip:
+            recorded as ip address of the new entries
+        :param enrich:
+            make third party requests while validating (slow), otherwise
+            lookups are queued as enrichment jobs and websites are not resolved
+    """
+
+    def __init__(self, app: Flask, user: User, dgraph_type: str,
+                 batch_size: int = 100, workers: int = 4, chunk_size: int = 200,
+                 checkpoint: str = None, dry_run: bool = False,
+                 retry_invalid: bool = False, ip: str = '127.0.0.1', enrich: bool = False) -> None:
+        self.app = app
+        self.user = user
+        self.dgraph_type = Schema.get_type(dgraph_type)
+        if self.dgraph_type is None:
+            raise InventoryValidationError(f'Unknown dgraph type: {dgraph_type}')
+        if user.user_role < Schema.permissions_new(self.dgraph_type):
+            raise InventoryPermissionError(
+                f'User {user} cannot add entries of type {self.dgraph_type}')
+        self.batch_size = batch_size
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.retry_invalid = retry_invalid
+        self.ip = ip
+        self.enrich = enrich
+        self.checkpoint = ImportCheckpoint(checkpoint) if checkpoint and not dry_run else None
+        # unique names assigned during this import
+        self.reserved = set()
+
+    def __repr__(self) -> str:
+        return f'<BulkImporter {self.dgraph_type} ({self.workers} workers)>'
+
+    def run(self, records: Iterable, report: Callable = None) -> dict:
+        """
+            Import `records` (dicts, e.g., from `read_records`).
+            `report(result)` is called with the outcome of every record,
+            returns the number of records per status.
+        """
+        stats = {VALID: 0, IMPORTED: 0, INVALID: 0, FAILED: 0, 'skipped': 0}
+        with self.app.app_context(), ThreadPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = deque()
+            for batch in self._batches(records, stats):
+                in_flight.append(executor.submit(self.validate_batch, batch))
+                # keep the number of buffered batches bounded
+                if len(in_flight) >= self.workers * 2:
+                    self._finish(in_flight.popleft().result(), stats, report)
+            while len(in_flight) > 0:
+                self._finish(in_flight.popleft().result(), stats, report)
+        if self.checkpoint:
+            self.checkpoint.close()
+        return stats
+
+    def _batches(self, records: Iterable, stats: dict):
+        batch = []
+        for number, record in enumerate(records, start=1):
+            if self.checkpoint and self.checkpoint.done(number, retry_invalid=self.retry_invalid):
+                stats['skipped'] += 1
+                continue
+            batch.append((number, record))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+    """
+        Validation (worker threads)
+    """
+
+    def validate_batch(self, batch: list) -> list:
+        """
+            Run the sanitizer for every record of the batch.
+            Returns a list of `(result, entries, enrichment jobs)`,
+            `entries` is None for invalid records
+        """
+        validated = []
+        # every batch gets its own request (and DGraphLoader)
+        with self.app.test_request_context(environ_base={'REMOTE_ADDR': self.ip}):
+            login_user(self.user)
+            self._prime([record for _, record in batch if isinstance(record, dict)])
+            for number, record in batch:
+                result = {'record': number, 'status': INVALID}
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    if not isinstance(record, dict):
+                        raise InventoryValidationError('Record is not an object')
+                    result['name'] = record.get('name')
+                    if record.get('uid'):
+                        raise InventoryValidationError(
+                            'Bulk imports only add new entries, remove the uid of the record')
+                    sanitizer = make_sanitizer(dict(record), self.dgraph_type, enrich=self.enrich)
+                except Exception as e:
+                    result['error'] = ' '.join(str(e).split())
+                    validated.append((result, None, None))
+                    continue
+                result['status'] = VALID
+                validated.append((result,
+                                  [sanitizer.entry, *sanitizer.related_entries],
+                                  sanitizer.enrichment_jobs))
+        return validated
+
+    def _prime(self, records: list) -> None:
+        # resolve related entries and unique names of the whole batch in a few queries
+        uids = []
+        for record in records:
+            for value in record.values():
+                uids += _uid_values(value)
+        nodes = dgraph.loader.nodes(uids)
+
+        names = []
+        for record in records:
+            if not record.get('name'):
+                continue
+            names.append(slugify(str(record['name']), separator="_"))
+            if self.dgraph_type == 'Source':
+                channel = nodes.get(next(iter(_uid_values(record.get('channel', ''))), None))
+                country = nodes.get(next(iter(_uid_values(record.get('country', ''))), None))
+                if channel and country:
+                    names += Sanitizer.source_unique_name_candidates(
+                        record['name'], channel=channel.get('unique_name'),
+                        country=country.get('unique_name'))
+        dgraph.loader.prime_uids('unique_name', names)
+        dgraph.loader.flush()
+
+    """
+        Commits (main thread)
+    """
+
+    def _finish(self, validated: list, stats: dict, report: Callable = None) -> None:
+        valid = []
+        for result, entries, jobs in validated:
+            if entries is None:
+                continue
+            self._reserve(entries)
+            result['unique_name'] = str(entries[0].get('unique_name'))
+            valid.append((result, entries, jobs))
+
+        if not self.dry_run:
+            for i in range(0, len(valid), self.chunk_size):
+                self._commit(valid[i:i + self.chunk_size])
+
+        results = [result for result, _, _ in validated]
+        if self.checkpoint:
+            self.checkpoint.write(results)
+        for result in results:
+            stats[result['status']] += 1
+            if report:
+                report(result)
+
+    def _reserve(self, entries: list) -> None:
+        # the loader only knows unique names that were taken before the import
+        for entry in entries:
+            if not isinstance(entry.get('uid'), NewID) or not entry.get('unique_name'):
+                continue
+            unique_name = str(entry['unique_name'])
+            while unique_name in self.reserved:
+                unique_name = f'{entry["unique_name"]}_{secrets.token_urlsafe(4)}'
+            entry['unique_name'] = unique_name
+            self.reserved.add(unique_name)
+
+    def _commit(self, chunk: list, max_attempts: int = 3) -> None:
+        records = []
+        enrichment_jobs = []
+        for result, entries, jobs in chunk:
+            renamed = {}
+            entries = _namespace(entries, f'r{result["record"]}_', renamed)
+            records.append((result, entries))
+            enrichment_jobs += [(kind, renamed.get(str(target), target), payload)
+                                for kind, target, payload in jobs]
+
+        # the unique names of the chunk are reserved like in `Sanitizer.commit`:
+        # the transaction is only applied if none of them was taken meanwhile
+        unique_names = UniqueNameAllocator()
+        for _, entries in records:
+            for entry in entries:
+                if isinstance(entry.get('uid'), NewID) and entry.get('unique_name'):
+                    unique_names.request(entry, [entry['unique_name']])
+
+        error = 'Could not reserve the unique names of this chunk'
+        for _ in range(max_attempts):
+            unique_names.resolve()
+            nquads = "\n".join(serialize_nquads(*entries) for _, entries in records)
+            # all records of the chunk are committed in one transaction
+            # not idempotent, see `Sanitizer.commit`
+            response = dgraph.upsert(unique_names.upsert_query,
+                                     set_nquads=nquads, cond=unique_names.cond, idempotent=False)
+            if not response:
+                error = 'Transaction failed'
+                break
+            if unique_names.applied(response):
+                break
+            current_app.logger.info(
+                f'Unique names taken by a concurrent submission: {unique_names.taken}. Allocating again.')
+        else:
+            response = None
+
+        if not response:
+            for result, _ in records:
+                result['status'] = FAILED
+                result['error'] = error
+            return
+
+        for result, entries in records:
+            result['status'] = IMPORTED
+            result['unique_name'] = str(entries[0].get('unique_name'))
+            result['uid'] = response.uids.get(str(entries[0]['uid'])[2:])
+        schedule_enrichment(enrichment_jobs, response)
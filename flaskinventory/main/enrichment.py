@@ -0,0 +1,228 @@
+"""
+    Deferred enrichment of new entries
+    With `DEFERRED_ENRICHMENT` enabled, the Sanitizer does not wait for
+    third party APIs (wikidata, geocoding, social media profiles). It collects
+    enrichment jobs instead, which are put in a persistent queue after the
+    entry was stored. A pool of workers drains the queue and patches the
+    entries. Only predicates that are still empty are set, values entered
+    by users are never overwritten.
+"""
+
+import datetime
+import threading
+
+from flask import Flask, current_app
+
+from flaskinventory import dgraph
+from flaskinventory.errors import InventoryValidationError
+from flaskinventory.flaskdgraph import Schema
+from flaskinventory.flaskdgraph.dgraph_types import UID, NewID, Scalar, serialize_nquads
+from flaskinventory.flaskdgraph.utils import validate_uid
+from flaskinventory.add.external import (get_wikidata, instagram, twitter,
+                                         vkontakte, telegram)
+from flaskinventory.main.model import OrganizationAutocode
+from flaskinventory.misc.jobqueue import JobQueue, WorkerPool
+
+EXTENSION_KEY = 'enrichment_queue'
+
+
+def _apply_patch(uid: str, patch: dict, overwrite: list = None) -> list:
+    """
+        Set the predicates in `patch` that the node does not have yet,
+        list predicates get the new values added. Predicates in `overwrite`
+        are always set. Returns the predicates that were changed.
+    """
+    uid = validate_uid(uid)
+    if not uid:
+        raise InventoryValidationError(f'Invalid uid: {uid}')
+    patch = {key: val for key, val in patch.items() if val is not None}
+    if len(patch) == 0:
+        return []
+    overwrite = overwrite or []
+
+    query_string = f'{{ q(func: uid({uid})) @filter(has(dgraph.type)) {{ uid {" ".join(patch.keys())} }} }}'
+    result = dgraph.query(query_string)
+    if len(result['q']) == 0:
+        raise InventoryValidationError(f'Entry <{uid}> does not exist')
+    node = result['q'][0]
+
+    changes = {'uid': UID(uid)}
+    for key, val in patch.items():
+        current = node.get(key)
+        if isinstance(val, (list, set)):
+            if current is None:
+                current = []
+            elif not isinstance(current, list):
+                current = [current]
+            current = [str(c) for c in current]
+            new_values = [v for v in val if str(v) not in current]
+            if len(new_values) > 0:
+                changes[key] = new_values
+        elif current is None or key in overwrite:
+            changes[key] = val
+
+    if len(changes) == 1:
+        return []
+    if not dgraph.upsert(None, set_nquads=serialize_nquads(changes)):
+        raise InventoryValidationError(f'Could not update entry <{uid}>')
+    return [key for key in changes.keys() if key != 'uid']
+
+
+""" Job Handlers """
+
+
+def enrich_wikidata(uid: str, payload: dict) -> dict:
+    """ Same as `Sanitizer.parse_wikidata` """
+    wikidata = get_wikidata(payload['name'])
+    if not wikidata:
+        return {'changed': []}
+    predicates = Schema.get_predicates(payload['dgraph_type'])
+    patch = {key: val for key, val in wikidata.items() if key in predicates.keys()}
+    return {'changed': _apply_patch(uid, patch)}
+
+
+def enrich_organization(uid: str, payload: dict) -> dict:
+    """ Same as `OrganizationAutocode._resolve_org` """
+    patch = OrganizationAutocode.lookup_org(payload['name'])
+    patch.pop('name', None)
+    return {'changed': _apply_patch(uid, patch)}
+
+
+def enrich_geocode(uid: str, payload: dict) -> dict:
+    """ Run the `autocode` of a predicate (e.g., `AddressAutocode`) """
+    field = Schema.get_predicates(payload['dgraph_type'])[payload['predicate']]
+    validated = field.autocode(payload['query'])
+    if validated is None:
+        return {'changed': []}
+    if not isinstance(validated, dict):
+        validated = {payload['predicate']: validated}
+    return {'changed': _apply_patch(uid, validated)}
+
+
+_profile_lookups = {'instagram': instagram,
+                    'twitter': twitter,
+                    'vkontakte': vkontakte,
+                    'telegram': telegram}
+
+
+def enrich_profile(uid: str, payload: dict) -> dict:
+    """ Same as `Sanitizer.fetch_instagram`, `fetch_twitter`, etc. """
+    channel = payload['channel']
+    profile = _profile_lookups[channel](payload['username'])
+    if not profile:
+        raise InventoryValidationError(
+            f"{channel} profile not found: {payload['username']}")
+
+    patch = {}
+    overwrite = []
+    if profile.get('fullname'):
+        patch['other_names'] = [profile['fullname']]
+    if profile.get('followers'):
+        patch['audience_size'] = Scalar(str(datetime.date.today()),
+                                        facets={'count': int(profile['followers']),
+                                                'unit': 'followers'})
+    if profile.get('verified') is not None:
+        patch['verified_account'] = profile.get('verified')
+    if profile.get('joined'):
+        joined = profile.get('joined')
+        if isinstance(joined, (datetime.date, datetime.datetime)):
+            joined = joined.isoformat()
+        patch['founded'] = joined
+    if profile.get('description'):
+        patch['description'] = profile.get('description')
+    if profile.get('telegram_id'):
+        patch['channel_url'] = profile.get('telegram_id')
+        overwrite.append('channel_url')
+    return {'changed': _apply_patch(uid, patch, overwrite=overwrite)}
+
+
+HANDLERS = {'wikidata': enrich_wikidata,
+            'organization': enrich_organization,
+            'geocode': enrich_geocode,
+            'profile': enrich_profile}
+
+
+""" Queue & Workers """
+
+
+def init_enrichment(app: Flask, workers: int = None) -> JobQueue:
+    """
+        Open the job queue (`ENRICHMENT_QUEUE`) and start
+        `ENRICHMENT_WORKERS` worker threads for this app
+    """
+    queue = JobQueue(app.config.get('ENRICHMENT_QUEUE', 'enrichment_queue.sqlite'),
+                     max_attempts=app.config.get('ENRICHMENT_MAX_ATTEMPTS', 3),
+                     retry_delay=app.config.get('ENRICHMENT_RETRY_DELAY', 30))
+    app.extensions[EXTENSION_KEY] = queue
+    # jobs of workers that were killed while running
+    queue.requeue_stale(app.config.get('ENRICHMENT_JOB_TIMEOUT', 600))
+
+    if workers is None:
+        workers = app.config.get('ENRICHMENT_WORKERS', 2)
+    if workers > 0:
+        start_workers(app, workers)
+    return queue
+
+
+def start_workers_on_first_request(app: Flask) -> None:
+    """
+        Start `ENRICHMENT_WORKERS` worker threads once the app serves its first request.
+        Processes that never serve requests (CLI tools, tests) do not run workers,
+        and servers that fork after loading the app start them in every worker process.
+    """
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_enrichment_workers():
+        if 'enrichment_workers' in app.extensions:
+            return
+        with lock:
+            if 'enrichment_workers' in app.extensions:
+                return
+            size = app.config.get('ENRICHMENT_WORKERS', 2)
+            if size > 0:
+                start_workers(app, size)
+            else:
+                app.extensions['enrichment_workers'] = None
+
+
+def start_workers(app: Flask, size: int) -> WorkerPool:
+
+    def in_app_context(handler, target, payload):
+        with app.app_context():
+            return handler(target, payload)
+
+    pool = WorkerPool(app.extensions[EXTENSION_KEY], HANDLERS, size=size,
+                      poll_interval=app.config.get('ENRICHMENT_POLL_INTERVAL', 1.0),
+                      wrap=in_app_context)
+    pool.start()
+    app.extensions['enrichment_workers'] = pool
+    return pool
+
+
+def schedule_enrichment(jobs: list, response=None) -> list:
+    """
+        Put the enrichment jobs of a Sanitizer in the queue.
+        Blank nodes are resolved with the uids of the mutation `response`.
+        Returns the ids of the queued jobs.
+    """
+    if not jobs:
+        return []
+    queue = current_app.extensions.get(EXTENSION_KEY)
+    if queue is None:
+        current_app.logger.warning(
+            f'Deferred enrichment is not initialized, {len(jobs)} jobs are dropped')
+        return []
+    uids = dict(response.uids) if response is not None and hasattr(response, 'uids') else {}
+    job_ids = []
+    for kind, target, payload in jobs:
+        if isinstance(target, NewID):
+            uid = uids.get(target.newid.replace('_:', ''))
+            if uid is None:
+                current_app.logger.warning(
+                    f'Cannot schedule {kind} enrichment: blank node {target} was not created')
+                continue
+        else:
+            uid = str(target)
+        job_ids.append(queue.enqueue(kind, uid, payload))
+    return job_ids
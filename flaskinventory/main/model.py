@@ -71,24 +71,29 @@ class SourceCountrySelection(ListRelationship):
                             overwrite=True, *args, **kwargs)
 
     def get_choices(self):
+        self._cached_choices(self._query_choices)
+
+    def _query_choices(self) -> tuple:
 
         query_country = '''country(func: type("Country"), orderasc: name) @filter(eq(opted_scope, true)) { uid unique_name name  }'''
         query_multinational = '''multinational(func: type("Multinational"), orderasc: name) { uid unique_name name other_names }'''
 
         query_string = '{ ' + query_country + query_multinational + ' }'
 
-        choices = dgraph.query(query_string=query_string)
+        result = dgraph.query(query_string=query_string)
 
         if len(self.relationship_constraint) == 1:
-            self.choices = {c['uid']: c['name'] for c in choices[self.relationship_constraint[0].lower()]}
-            self.choices_tuples = [(c['uid'], c['name']) for c in choices[self.relationship_constraint[0].lower()]]
+            choices = {c['uid']: c['name'] for c in result[self.relationship_constraint[0].lower()]}
+            choices_tuples = [(c['uid'], c['name']) for c in result[self.relationship_constraint[0].lower()]]
 
         else:
-            self.choices = {}
-            self.choices_tuples = {}
+            choices = {}
+            choices_tuples = {}
             for dgraph_type in self.relationship_constraint:
-                self.choices_tuples[dgraph_type] = [(c['uid'], c['name']) for c in choices[dgraph_type.lower()]]
-                self.choices.update({c['uid']: c['name'] for c in choices[dgraph_type.lower()]})
+                choices_tuples[dgraph_type] = [(c['uid'], c['name']) for c in result[dgraph_type.lower()]]
+                choices.update({c['uid']: c['name'] for c in result[dgraph_type.lower()]})
+
+        return choices, choices_tuples
 
 
 class SubunitAutocode(ListRelationship):
@@ -100,6 +105,10 @@ class SubunitAutocode(ListRelationship):
                             overwrite=True, *args, **kwargs)
         
     def get_choices(self):
+        # subunits are grouped by the names of their countries
+        self._cached_choices(self._query_choices, depends_on=['Subunit', 'Country'])
+
+    def _query_choices(self) -> tuple:
 
         query_string = '''{
                             q(func: type(Country)) {
@@ -111,15 +120,17 @@ class SubunitAutocode(ListRelationship):
                         }
                         '''
 
-        choices = dgraph.query(query_string=query_string)
+        result = dgraph.query(query_string=query_string)
 
-        self.choices = {}
-        self.choices_tuples = {}
+        choices = {}
+        choices_tuples = {}
 
-        for country in choices["q"]:
+        for country in result["q"]:
             if country.get('subunit'):
-                self.choices_tuples[country['name']] = [(s['uid'], s['name']) for s in country['subunit']]
-                self.choices.update({s['uid']: s['name'] for s in country['subunit']})
+                choices_tuples[country['name']] = [(s['uid'], s['name']) for s in country['subunit']]
+                choices.update({s['uid']: s['name'] for s in country['subunit']})
+
+        return choices, choices_tuples
 
 
     def _geo_query_subunit(self, query):
@@ -267,9 +278,11 @@ class OrganizationAutocode(ReverseListRelationship):
         
         return uids
 
-    def _resolve_org(self, org):
-
-        geo_result = geocode(org['name'])
+    @staticmethod
+    def lookup_org(name: str) -> dict:
+        """ Address and wikidata of a new organization """
+        org = {}
+        geo_result = geocode(name)
         if geo_result:
             try:
                 org['address_geo'] = GeoScalar('Point', [
@@ -283,12 +296,22 @@ class OrganizationAutocode(ReverseListRelationship):
             except:
                 pass
 
-        wikidata = get_wikidata(org['name'])
+        wikidata = get_wikidata(name)
 
         if wikidata:
             for key, val in wikidata.items():
                 if key not in org.keys():
                     org[key] = val
+
+        return org
+
+    def _resolve_org(self, org):
+
+        # with deferred enrichment the Sanitizer queues the lookups instead
+        if not current_app.config.get('DEFERRED_ENRICHMENT', False):
+            for key, val in self.lookup_org(org['name']).items():
+                if key not in org.keys():
+                    org[key] = val
         
         if self.relationship_constraint:
             org['dgraph.type'] = self.relationship_constraint
@@ -12,7 +12,6 @@ main = Blueprint('main', __name__)
 @main.route('/')
 @main.route('/home')
 def home():
-    # needs caching!
     c_choices = get_country_choices()
 
     class Q(SimpleQuery):
@@ -36,7 +35,7 @@ def home():
                             }
                         }'''
     
-    result = dgraph.query(query_string)
+    result = dgraph.query(query_string, cache=True)
     for entry in result['data']:
         if 'Entry' in entry['dgraph.type']:
             entry['dgraph.type'].remove('Entry')
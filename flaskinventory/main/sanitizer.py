@@ -1,19 +1,21 @@
 from flaskinventory.flaskdgraph import Schema
 from flaskinventory.flaskdgraph.dgraph_types import (UID, MutualRelationship, NewID, Predicate, ReverseRelationship, Scalar,
-                                                     SingleRelationship, GeoScalar, Variable, make_nquad, dict_to_nquad)
+                                                     SingleRelationship, GeoScalar, Variable, serialize_nquads, dict_to_obj)
 from flaskinventory.flaskdgraph.utils import validate_uid
 from flaskinventory.errors import InventoryValidationError, InventoryPermissionError
 from flaskinventory.auxiliary import icu_codes
 from flaskinventory.add.external import (instagram, twitter, get_wikidata, telegram, vkontakte,
                                          parse_meta, siterankdata, find_sitemaps, find_feeds,
-                                         build_url)
+                                         build_url, perform_request)
 from flaskinventory.users.constants import USER_ROLES
 from flaskinventory.users.dgraph import User
 from flaskinventory import dgraph
 from flask import current_app
 from werkzeug.datastructures import ImmutableMultiDict
 
-from flaskinventory.main.model import Entry, Organization, Source
+from flaskinventory.main.model import Entry, Organization, Source, OrganizationAutocode
+from flaskinventory.main.unique_names import UniqueNameAllocator
+from flaskinventory.main.enrichment import schedule_enrichment
 from flaskinventory.misc import get_ip
 from flaskinventory.misc.utils import IMD2dict
 from flask_login import current_user
@@ -23,19 +25,84 @@ from flask_login import current_user
 from slugify import slugify
 import secrets
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import datetime
+from types import MappingProxyType
 from dateutil import parser as dateparser
 
+# key: (sanitizer class, dgraph type, fields), val: ValidationPlan
+_validation_plans = {}
+
+
+class ValidationPlan:
+
+    """
+        Validation steps of a Sanitizer class for one set of fields,
+        compiled once and shared by all instances (see `Sanitizer.get_plan`).
+
+        `steps` is a tuple of `(key, field, with_data, without_data)`:
+        the Sanitizer method that validates submitted data and the
+        method for fields without data (autocode, default), or None.
+    """
+
+    __slots__ = ('fields', 'hooks', 'steps', 'prefetch', 'overwrite')
+
+    def __init__(self, sanitizer_class: type, fields: dict) -> None:
+        self.fields = fields
+        # `parse_*` methods run before the fields are validated
+        self.hooks = tuple(name for name in dir(sanitizer_class)
+                           if name.startswith('parse_') and callable(getattr(sanitizer_class, name)))
+
+        steps = []
+        for key, item in fields.items():
+            if hasattr(item, 'autocode'):
+                without_data = sanitizer_class._validate_autocode
+            elif hasattr(item, 'default'):
+                without_data = sanitizer_class._validate_default
+            else:
+                without_data = None
+
+            if isinstance(item, ReverseRelationship):
+                with_data = sanitizer_class._validate_reverse
+            elif isinstance(item, MutualRelationship):
+                with_data = sanitizer_class._validate_mutual
+            elif isinstance(item, SingleRelationship):
+                with_data = sanitizer_class._validate_single
+            elif hasattr(item, 'validate'):
+                with_data = sanitizer_class._validate_value
+            else:
+                with_data = without_data
+            steps.append((key, item, with_data, without_data))
+        self.steps = tuple(steps)
+
+        self.prefetch = tuple(key for key, item in fields.items()
+                              if isinstance(item, (SingleRelationship, ReverseRelationship, MutualRelationship))
+                              and item.relationship_constraint)
+        self.overwrite = tuple((key, item.predicate) for key, item in fields.items() if item.overwrite)
+
+    def __repr__(self) -> str:
+        return f'<ValidationPlan {len(self.steps)} fields, {len(self.hooks)} hooks>'
+
 
 class Sanitizer:
     """ Base Class for validating data and generating mutation object
         Validates all predicates from dgraph type 'Entry'
         also keeps track of user & ip address.
         Relevant return attributes are upsert_query (string), set_nquads (string), delete_nquads (string)
+        and upsert_cond (string), the condition that reserves the unique names of new entries.
+        Use `commit()` to send the mutation.
+        With `json_mutation=True` JSON mutation objects are generated instead of nquads:
+        set_obj (list), delete_obj (list)
+        With `DEFERRED_ENRICHMENT` lookups of third party APIs are collected in
+        enrichment_jobs (list) instead, see `flaskinventory.main.enrichment`
+        With `enrich=False` no third party requests are made at all (e.g., bulk imports):
+        lookups are collected as with `DEFERRED_ENRICHMENT`, websites are not resolved
     """
 
     upsert_query = None
+    upsert_cond = None
 
     def __init__(self, data: dict, fields: dict = None, dgraph_type=Entry, entry_review_status=None, **kwargs):
 
@@ -47,10 +114,8 @@ class Sanitizer:
         if not isinstance(dgraph_type, str):
             dgraph_type = dgraph_type.__name__
         self.dgraph_type = dgraph_type
-        self.fields = fields or Schema.get_predicates(dgraph_type)
-        if self.dgraph_type and fields is None:
-            if Schema.get_reverse_predicates(dgraph_type):
-                self.fields.update(Schema.get_reverse_predicates(dgraph_type))
+        self.plan = self.get_plan(dgraph_type, fields)
+        self.fields = fields or self.plan.fields
 
         if self.user.user_role < USER_ROLES.Contributor:
             raise InventoryPermissionError
@@ -58,10 +123,15 @@ class Sanitizer:
         self.data = data
 
         self.is_upsert = kwargs.get('is_upsert', False)
+        self.json_mutation = kwargs.get('json_mutation', False)
+        self.enrich = kwargs.get('enrich', True)
+        self.deferred = current_app.config.get('DEFERRED_ENRICHMENT', False) or not self.enrich
+        self.enrichment_jobs = []
         self.skip_keys = kwargs.get('skip_keys', [])
         self.entry_review_status = entry_review_status
         self.overwrite = {}
         self.newsubunits = []
+        self.unique_names = UniqueNameAllocator()
 
         self.entry = {}
         self.related_entries = []
@@ -71,6 +141,8 @@ class Sanitizer:
         self.delete_nquads = None
         self.upsert_query = None
         self.set_nquads = None
+        self.delete_obj = None
+        self.set_obj = None
 
         if not self.is_upsert:
             self.entry['dgraph.type'] = Schema.resolve_inheritance(dgraph_type)
@@ -83,8 +155,30 @@ class Sanitizer:
         if self.dgraph_type == 'ResearchPaper':
             self.process_researchpaper()
 
-        self._delete_nquads()
-        self._set_nquads()
+        self.unique_names.resolve()
+        self._generate_mutation()
+
+    @classmethod
+    def get_plan(cls, dgraph_type: str, fields: dict = None) -> ValidationPlan:
+        """
+            Compiled validation plan for the `fields` (default: predicates and
+            reverse predicates of `dgraph_type`), cached per class and set of fields
+        """
+        if fields:
+            # the plan keeps the fields alive, their ids stay unique
+            key = (cls, dgraph_type, tuple((name, id(item)) for name, item in fields.items()))
+        else:
+            key = (cls, dgraph_type, None)
+        plan = _validation_plans.get(key)
+        if plan is None:
+            if not fields:
+                fields = dict(Schema.get_predicates(dgraph_type))
+                if Schema.get_reverse_predicates(dgraph_type):
+                    fields.update(Schema.get_reverse_predicates(dgraph_type))
+                fields = MappingProxyType(fields)
+            plan = ValidationPlan(cls, fields)
+            _validation_plans[key] = plan
+        return plan
 
     @staticmethod
     def _validate_inputdata(data: dict, user: User, ip: str) -> bool:
@@ -116,7 +210,7 @@ class Sanitizer:
 
         entry_review_status = check.get('entry_review_status')
 
-        edit_fields = fields or Schema.get_predicates(dgraph_type)
+        edit_fields = fields or dict(Schema.get_predicates(dgraph_type))
         if dgraph_type and fields is None:
             if Schema.get_reverse_predicates(dgraph_type):
                 edit_fields.update(Schema.get_reverse_predicates(dgraph_type))
@@ -130,11 +224,58 @@ class Sanitizer:
 
         return cls(data, is_upsert=True, dgraph_type=dgraph_type, entry_review_status=entry_review_status, fields=edit_fields, **kwargs)
 
+    def _generate_mutation(self):
+        # start from scratch, a retry must not add a second reservation
+        self.upsert_query = None
+        self.upsert_cond = None
+        self._delete_nquads()
+        self._set_nquads()
+        self._reserve_unique_names()
+
+    def _reserve_unique_names(self):
+        # the mutation is only applied if the unique names are still free
+        reservation = self.unique_names.upsert_query
+        if reservation is None:
+            self.upsert_cond = None
+            return
+        if self.upsert_query:
+            self.upsert_query += ' ' + reservation
+        else:
+            self.upsert_query = reservation
+        self.upsert_cond = self.unique_names.cond
+
+    def commit(self, max_attempts: int = 3):
+        """
+            Send the mutation to DGraph, returns the response (or False).
+            If a concurrent submission took one of the unique names meanwhile,
+            the names are allocated again and the mutation is repeated.
+            Collected enrichment jobs are queued once the mutation is applied.
+        """
+        for _ in range(max_attempts):
+            # a reservation is not idempotent: if a lost commit was applied,
+            # a retry finds the names taken and they would be allocated again
+            response = dgraph.upsert(self.upsert_query,
+                                     set_nquads=self.set_nquads, del_nquads=self.delete_nquads,
+                                     set_obj=self.set_obj, del_obj=self.delete_obj,
+                                     cond=self.upsert_cond,
+                                     idempotent=False if self.upsert_cond else None)
+            if not response:
+                return response
+            if self.unique_names.applied(response):
+                schedule_enrichment(self.enrichment_jobs, response)
+                return response
+            current_app.logger.info(
+                f'Unique names taken by a concurrent submission: {self.unique_names.taken}. Allocating again.')
+            self.unique_names.resolve()
+            self._generate_mutation()
+        raise InventoryValidationError(
+            'Could not reserve a unique name for this entry! Please try again.')
+
     def _set_nquads(self):
-        nquads = dict_to_nquad(self.entry)
-        for related in self.related_entries:
-            nquads += dict_to_nquad(related)
-        self.set_nquads = " \n".join(nquads)
+        if self.json_mutation:
+            self.set_obj = [dict_to_obj(obj) for obj in [self.entry, *self.related_entries]]
+        else:
+            self.set_nquads = serialize_nquads(self.entry, *self.related_entries)
 
     def _delete_nquads(self):
         if self.is_upsert:
@@ -159,14 +300,18 @@ class Sanitizer:
                     except KeyError:
                         pass
 
-            nquads = [" \n".join(dict_to_nquad(obj)) for obj in del_obj]
-            self.delete_nquads = " \n".join(nquads)
+            if self.json_mutation:
+                self.delete_obj = [dict_to_obj(obj) for obj in del_obj]
+            else:
+                self.delete_nquads = serialize_nquads(*del_obj)
             if upsert_query != '':
                 self.upsert_query = upsert_query
             else:
                 self.upsert_query = None
         else:
             self.delete_nquads = None
+            self.delete_obj = None
+            self.upsert_query = None
 
     @staticmethod
     def _check_entry(uid):
@@ -236,6 +381,22 @@ class Sanitizer:
                         if str(val) in self.facets.keys():
                             val.update_facets(self.facets[str(val)])
 
+    def _prefetch_related(self):
+        # relationship predicates check the dgraph.type of every related uid
+        # resolve them all with a single query before the fields are validated,
+        # the predicates then look up the types from the request's loader
+        uids = []
+        for key in self.plan.prefetch:
+            if key in self.skip_keys or not self.data.get(key):
+                continue
+            values = self.data[key]
+            if isinstance(values, str):
+                values = values.split(',')
+            if isinstance(values, (list, tuple, set)):
+                uids += [str(v).strip() for v in values]
+        if len(uids) > 0:
+            dgraph.loader.nodes(uids)
+
     def _parse(self):
         if self.data.get('uid'):
             uid = self.data.pop('uid')
@@ -248,65 +409,20 @@ class Sanitizer:
 
         self._preprocess_facets()
 
-        for item in dir(self):
-            if item.startswith('parse_'):
-                m = getattr(self, item)
-                if callable(m):
-                    m()
+        for hook in self.plan.hooks:
+            getattr(self, hook)()
+
+        self._prefetch_related()
 
-        for key, item in self.fields.items():
-            validated = None
+        for key, item, with_data, without_data in self.plan.steps:
             if key in self.skip_keys:
                 continue
 
-            if key in self.facets.keys():
-                facets = self.facets[key]
-            else:
-                facets = None
-
-            if self.data.get(key) and isinstance(item, ReverseRelationship):
-                validated = item.validate(
-                    self.data[key], self.entry_uid, facets=facets)
-                if isinstance(validated, list):
-                    self.related_entries += validated
-                else:
-                    self.related_entries.append(validated)
-                continue
-            elif self.data.get(key) and isinstance(item, MutualRelationship):
-                node_data, data_node = item.validate(
-                    self.data[key], self.entry_uid, facets=facets)
-                self.entry[item.predicate] = node_data
-                if isinstance(data_node, list):
-                    self.related_entries += data_node
-                else:
-                    self.related_entries.append(data_node)
+            step = with_data if self.data.get(key) else without_data
+            if step is None:
                 continue
 
-            elif self.data.get(key) and isinstance(item, SingleRelationship):
-                related_items = item.validate(self.data[key], facets=facets)
-                validated = []
-                if isinstance(related_items, list):
-                    for item in related_items:
-                        validated.append(item['uid'])
-                        if isinstance(item['uid'], NewID):
-                            self.related_entries.append(item)
-
-                else:
-                    validated = related_items['uid']
-                    if isinstance(related_items['uid'], NewID):
-                        self.related_entries.append(related_items)
-
-            elif self.data.get(key) and hasattr(item, 'validate'):
-                validated = item.validate(self.data[key], facets=facets)
-            elif hasattr(item, 'autocode'):
-                if item.autoinput in self.data.keys():
-                    validated = item.autocode(
-                        self.data[item.autoinput], facets=facets)
-            elif hasattr(item, 'default'):
-                validated = item.default
-                if hasattr(validated, 'facets') and facets is not None:
-                    validated.update_facets(facets)
-
+            validated = step(self, key, item, self.facets.get(key))
             if validated is None:
                 continue
 
@@ -325,14 +441,73 @@ class Sanitizer:
 
         if self.is_upsert:
             self.entry = self._add_entry_meta(self.entry)
-            self.overwrite[self.entry_uid] = [item.predicate for k, item in self.fields.items(
-            ) if item.overwrite and k in self.data.keys()]
+            self.overwrite[self.entry_uid] = [predicate for key, predicate in self.plan.overwrite
+                                              if key in self.data.keys()]
         else:
             self.entry = self._add_entry_meta(self.entry, newentry=True)
-            self.entry['unique_name'] = self.generate_unique_name(self.entry)
 
         self._postprocess_list_facets()
 
+    """
+        Validation steps (see `ValidationPlan`),
+        return the validated value or None if the step adds it by itself
+    """
+
+    def _validate_reverse(self, key, item, facets):
+        validated = item.validate(
+            self.data[key], self.entry_uid, facets=facets)
+        if not isinstance(validated, list):
+            validated = [validated]
+        self.related_entries += validated
+        if self.deferred and isinstance(item, OrganizationAutocode):
+            for org in validated:
+                if isinstance(org['uid'], NewID):
+                    self.enrichment_jobs.append(
+                        ('organization', org['uid'], {'name': org['name']}))
+
+    def _validate_mutual(self, key, item, facets):
+        node_data, data_node = item.validate(
+            self.data[key], self.entry_uid, facets=facets)
+        self.entry[item.predicate] = node_data
+        if isinstance(data_node, list):
+            self.related_entries += data_node
+        else:
+            self.related_entries.append(data_node)
+
+    def _validate_single(self, key, item, facets):
+        related_items = item.validate(self.data[key], facets=facets)
+        if isinstance(related_items, list):
+            validated = []
+            for related in related_items:
+                validated.append(related['uid'])
+                if isinstance(related['uid'], NewID):
+                    self.related_entries.append(related)
+            return validated
+
+        if isinstance(related_items['uid'], NewID):
+            self.related_entries.append(related_items)
+        return related_items['uid']
+
+    def _validate_value(self, key, item, facets):
+        return item.validate(self.data[key], facets=facets)
+
+    def _validate_autocode(self, key, item, facets):
+        if item.autoinput not in self.data.keys():
+            return None
+        if self.deferred:
+            self.enrichment_jobs.append(
+                ('geocode', self.entry_uid, {'dgraph_type': self.dgraph_type,
+                                             'predicate': key,
+                                             'query': self.data[item.autoinput]}))
+            return None
+        return item.autocode(self.data[item.autoinput], facets=facets)
+
+    def _validate_default(self, key, item, facets):
+        validated = item.default
+        if hasattr(validated, 'facets') and facets is not None:
+            validated.update_facets(facets)
+        return validated
+
     def process_related(self):
         for related in self.related_entries:
             related = self._add_entry_meta(
@@ -365,37 +540,21 @@ class Sanitizer:
                     'You do not have the required permissions to change the review status!')
 
     def parse_unique_name(self):
+        # new entries get their unique name with the entry meta (`generate_unique_name`)
         if self.data.get('unique_name'):
             unique_name = self.data['unique_name'].strip().lower()
             if self.is_upsert:
-                check = dgraph.get_uid('unique_name', unique_name)
-                if check:
-                    if check != str(self.entry_uid):
-                        raise InventoryValidationError(
-                            'Unique Name already taken!')
+                self.unique_names.request(self.entry, [unique_name], exact=True)
             self.entry['unique_name'] = unique_name
-        elif not self.is_upsert:
-            name = slugify(self.data.get('name'), separator="_")
-
-            query_string = f''' query quicksearch($value: string)
-                                {{
-                                data1(func: eq(unique_name, $value)) {{
-                                        unique_name
-                                        uid
-                                }}
-                                
-                            }}'''
-
-            result = dgraph.query(query_string, variables={'$value': name})
-
-            if len(result['data1']) == 0:
-                self.entry['unique_name'] = name
-            else:
-                self.entry['unique_name'] = f'{name}_{secrets.token_urlsafe(4)}'
 
     def parse_wikidata(self):
         predicates = Schema.get_predicates(self.dgraph_type)
         if not self.is_upsert:
+            if self.deferred:
+                self.enrichment_jobs.append(
+                    ('wikidata', self.entry_uid, {'name': self.data.get('name'),
+                                                  'dgraph_type': self.dgraph_type}))
+                return
             wikidata = get_wikidata(self.data.get('name'))
             if wikidata:
                 for key, val in wikidata.items():
@@ -411,6 +570,11 @@ class Sanitizer:
                         self.entry[key] += val
 
     def generate_unique_name(self, entry: dict):
+        """
+            Request a unique name based on the name of the entry.
+            Returns the preferred name, the allocator assigns a free one
+            (with a random suffix if needed) when all names are resolved
+        """
         try:
             unique_name = slugify(str(entry['name']), separator="_")
         except KeyError:
@@ -419,10 +583,8 @@ class Sanitizer:
             unique_name = slugify(str(entry['uid']), separator="_")
             if hasattr(entry['uid'], 'original_value'):
                 entry['name'] = entry['uid'].original_value
-        if dgraph.get_uid('unique_name', unique_name):
-            unique_name += f'_{secrets.token_urlsafe(4)}'
 
-        return unique_name
+        return self.unique_names.request(entry, [unique_name])
 
     def process_researchpaper(self):
         """
@@ -443,7 +605,8 @@ class Sanitizer:
 
         self.entry['name'] = f'{author} ({year}): {title}'
 
-        self.entry['unique_name'] = slugify(self.entry['name'], separator="_")
+        self.unique_names.request(
+            self.entry, [slugify(self.entry['name'], separator="_")])
 
     def process_source(self):
         """
@@ -457,10 +620,13 @@ class Sanitizer:
         except KeyError:
             channel = dgraph.get_unique_name(self.data['channel'])
 
-        if channel == 'website':
-            self.resolve_website()
-            self.fetch_siterankdata()
-            self.fetch_feeds()
+        if channel == 'website' and not self.enrich:
+            self.entry['name'] = Scalar(self._website_name(self.entry['name']))
+            self.entry['channel_url'] = build_url(self.data['name'])
+        elif channel == 'website':
+            self.enrich_website()
+        elif self.deferred and channel in ['instagram', 'twitter', 'vkontakte', 'telegram']:
+            self.defer_profile(channel)
         elif channel == 'instagram':
             self.fetch_instagram()
         elif channel == 'twitter':
@@ -477,8 +643,8 @@ class Sanitizer:
         except TypeError:
             country_uid = self.entry['country']
 
-        self.entry['unique_name'] = self.source_unique_name(
-            self.entry['name'], channel=channel, country_uid=country_uid)
+        self.unique_names.request(self.entry, self.source_unique_name_candidates(
+            self.entry['name'], channel=channel, country=dgraph.get_unique_name(country_uid.query)))
 
         # inherit from main source
         for source in self.related_entries:
@@ -492,7 +658,7 @@ class Sanitizer:
                         raise InventoryValidationError(
                             f'No channel provided for related source {source["name"]}! Please indicate channel')
                     source['entry_review_status'] = 'draft'
-                    source['unique_name'] = secrets.token_urlsafe(8)
+                    self.unique_names.request(source, [secrets.token_urlsafe(8)])
                     source['publication_kind'] = self.entry.get(
                         'publication_kind')
                     source['special_interest'] = self.entry.get(
@@ -508,53 +674,85 @@ class Sanitizer:
                         'party_affiliated')
 
     @staticmethod
-    def source_unique_name(name, channel=None, country=None, country_uid=None):
+    def source_unique_name_candidates(name, channel=None, country=None) -> list:
+        """ Unique names for a source in order of preference """
         name = slugify(str(name), separator="_")
         channel = slugify(str(channel), separator="_")
-        if country_uid:
-            country = dgraph.query(
-                f'''{{ q(func: uid({country_uid.query})) {{ unique_name }} }}''')
-            country = country['q'][0]['unique_name']
-
-        country = slugify(country, separator="_")
-        query_string = f'''{{
-                            field1 as var(func: eq(unique_name, "{name}"))
-                            field2 as var(func: eq(unique_name, "{name}_{channel}"))
-                            field3 as var(func: eq(unique_name, "{name}_{country}_{channel}"))
-                        
-                            data1(func: uid(field1)) {{
-                                    unique_name
-                                    uid
-                            }}
-                        
-                            data2(func: uid(field2)) {{
-                                unique_name
-                                uid
-                            }}
-
-                            data3(func: uid(field3)) {{
-                                unique_name
-                                uid
-                            }}
-                            
-                        }}'''
-
-        result = dgraph.query(query_string)
-
-        if len(result['data1']) == 0:
-            return f'{name}'
-        elif len(result['data2']) == 0:
-            return f'{name}_{channel}'
-        elif len(result['data3']) == 0:
-            return f'{name}_{country}_{channel}'
-        else:
-            return f'{name}_{country}_{channel}_{secrets.token_urlsafe(4)}'
+        country = slugify(str(country), separator="_")
+        return [f'{name}', f'{name}_{channel}', f'{name}_{country}_{channel}']
+
+    @staticmethod
+    def _website_name(url: str) -> str:
+        # clean up the display name of the website
+        name = str(url).replace(
+            'http://', '').replace('https://', '').lower()
+
+        if name.endswith('/'):
+            name = name[:-1]
+        return name
 
-    def resolve_website(self):
+    def enrich_website(self):
+        """
+            Lookups for new websites run concurrently:
+            the homepage is fetched once and shared by `parse_meta`,
+            `find_sitemaps` and `find_feeds`, siterankdata is requested meanwhile.
+            Each request times out after `EXTERNAL_REQUEST_TIMEOUT` seconds,
+            lookups that are not done after `SOURCE_ENRICHMENT_DEADLINE` seconds
+            are skipped and the entry is saved without them.
+        """
+        timeout = current_app.config.get('EXTERNAL_REQUEST_TIMEOUT', 10)
+        deadline = time.monotonic() + current_app.config.get('SOURCE_ENRICHMENT_DEADLINE', 20)
+        app = current_app._get_current_object()
+
+        def in_app_context(func, *args, **kwargs):
+            with app.app_context():
+                return func(*args, **kwargs)
+
+        site = str(self.entry['name'])
+        results = {}
+        executor = ThreadPoolExecutor(max_workers=3)
+        try:
+            lookups = {executor.submit(in_app_context, siterankdata, self._website_name(site),
+                                       timeout=timeout): 'siterankdata'}
+            try:
+                homepage = perform_request(build_url(site), timeout=timeout)
+            except InventoryValidationError:
+                raise
+            except Exception as e:
+                current_app.logger.warning(f'Could not fetch {site}: {e}')
+                raise InventoryValidationError(
+                    f"Could not resolve website! URL provided does not exist: {self.data.get('name')}")
+
+            self.resolve_website(response=homepage)
+
+            lookups[executor.submit(in_app_context, find_sitemaps, self.entry['name'],
+                                    response=homepage, timeout=timeout)] = 'sitemaps'
+            lookups[executor.submit(in_app_context, find_feeds, self.entry['name'],
+                                    response=homepage, timeout=timeout)] = 'feeds'
+
+            done, pending = wait(lookups, timeout=max(0, deadline - time.monotonic()))
+            for future in done:
+                try:
+                    results[lookups[future]] = future.result()
+                except Exception as e:
+                    current_app.logger.warning(
+                        f'Could not fetch {lookups[future]} for {self.entry["name"]}! Exception: {e}')
+            for future in pending:
+                current_app.logger.warning(
+                    f'Skipped {lookups[future]} for {self.entry["name"]}: deadline exceeded')
+        finally:
+            # late lookups are abandoned, their requests end with their own timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self._add_siterankdata(results.get('siterankdata'))
+        self._add_feeds(results.get('sitemaps') or [], results.get('feeds') or [])
+
+    def resolve_website(self, response=None):
         # first check if website exists
         entry_name = str(self.entry['name'])
         try:
-            result = parse_meta(entry_name)
+            result = parse_meta(entry_name, response=response,
+                                timeout=current_app.config.get('EXTERNAL_REQUEST_TIMEOUT', 10))
             names = result['names']
             urls = result['urls']
         except:
@@ -565,12 +763,7 @@ class Sanitizer:
             raise InventoryValidationError(
                 f"Could not resolve website! URL provided does not exist: {self.data.get('name')}")
 
-        # clean up the display name of the website
-        entry_name = entry_name.replace(
-            'http://', '').replace('https://', '').lower()
-
-        if entry_name.endswith('/'):
-            entry_name = entry_name[:-1]
+        entry_name = self._website_name(entry_name)
 
         # append automatically retrieved names to other_names
         if len(names) > 0:
@@ -595,35 +788,33 @@ class Sanitizer:
         self.entry['channel_url'] = build_url(
             self.data['name'])
 
-    def fetch_siterankdata(self):
-        try:
-            daily_visitors = siterankdata(self.entry['name'])
-        except Exception as e:
-            current_app.logger.warning(
-                f'Could not fetch siterankdata for {self.entry["name"]}! Exception: {e}')
-            daily_visitors = None
-
+    def _add_siterankdata(self, daily_visitors):
         if daily_visitors:
             self.entry['audience_size'] = Scalar(datetime.date.today(), facets={
                 'count': daily_visitors,
                 'unit': "daily visitors",
                 'data_from': f"https://siterankdata.com/{str(self.entry['name']).replace('www.', '')}"})
 
-    def fetch_feeds(self):
+    def _add_feeds(self, sitemaps: list, feeds: list):
         self.entry['channel_feeds'] = []
-        sitemaps = find_sitemaps(self.entry['name'])
         if len(sitemaps) > 0:
             for sitemap in sitemaps:
                 self.entry['channel_feeds'].append(
                     Scalar(sitemap, facets={'kind': 'sitemap'}))
 
-        feeds = find_feeds(self.entry['name'])
-
         if len(feeds) > 0:
             for feed in feeds:
                 self.entry['channel_feeds'].append(
                     Scalar(feed, facets={'kind': 'rss'}))
 
+    def defer_profile(self, channel: str):
+        # the profile is fetched by an enrichment worker after the entry is stored
+        username = self.data['name'].replace('@', '')
+        self.entry['name'] = username.lower()
+        self.entry['channel_url'] = username
+        self.enrichment_jobs.append(
+            ('profile', self.entry_uid, {'channel': channel, 'username': username}))
+
     def fetch_instagram(self):
         profile = instagram(self.data['name'].replace('@', ''))
         if profile:
@@ -753,24 +944,16 @@ class OrganizationSanitizer(Sanitizer):
             self.entry['dgraph.type'].append('Organization')
 
 
-def make_sanitizer(data: dict, dgraph_type, edit=False):
+def make_sanitizer(data: dict, dgraph_type, edit=False, enrich=True):
+    """
+        Sanitizer for any dgraph type: validates the predicates
+        and reverse predicates of the type (with a cached plan).
+        With `enrich=False` no third party requests are made
+    """
 
     if not isinstance(dgraph_type, str):
         dgraph_type = dgraph_type.__name__
 
-    fields = Schema.get_predicates(dgraph_type)
-    if Schema.get_reverse_predicates(dgraph_type):
-        fields.update(Schema.get_reverse_predicates(dgraph_type))
-
-    class S(Sanitizer):
-
-        def __init__(self, d, dtype='Entry', *args, **kwargs):
-
-            super().__init__(d, *args, **kwargs)
-
-            if not self.is_upsert:
-                self.entry['dgraph.type'].append(dtype)
-
     if edit:
-        return S.edit(data, fields=fields, dtype=dgraph_type)
-    return S(data, fields=fields, dtype=dgraph_type)
+        return Sanitizer.edit(data, dgraph_type=dgraph_type, enrich=enrich)
+    return Sanitizer(data, dgraph_type=dgraph_type, enrich=enrich)
@@ -0,0 +1,126 @@
+"""
+    Allocation of unique names
+    A Sanitizer asks for the unique names of an entry and its new related
+    entries (each with a list of candidates in order of preference).
+    All candidates are checked in one query, the chosen names are then
+    reserved by the mutation itself: it is a conditional upsert that is only
+    applied if none of the names was taken by a concurrent submission meanwhile.
+"""
+
+import json
+import secrets
+
+from flaskinventory import dgraph
+from flaskinventory.errors import InventoryValidationError
+from flaskinventory.flaskdgraph.dgraph_types import UID
+
+CHECK_BLOCK = 'unique_name_check'
+
+
+class UniqueNameAllocator:
+
+    """
+        Collects the candidates for the unique names of one mutation.
+
+        `request()` registers the candidates of an entry,
+        `resolve()` assigns the first free candidate to every entry,
+        `upsert_query` and `cond` reserve the assigned names,
+        `applied(response)` tells whether the reservation succeeded.
+    """
+
+    def __init__(self) -> None:
+        # key: id(entry), val: (entry, candidates, exact)
+        self._requests = {}
+        # names that were taken by other entries during a failed reservation
+        self.taken = set()
+        # key: unique name, val: uid of the entry that keeps it (edits) or None
+        self.assigned = {}
+
+    def __repr__(self) -> str:
+        return f'<UniqueNameAllocator {len(self._requests)} entries>'
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def request(self, entry: dict, candidates: list, exact: bool = False) -> str:
+        """
+            Register the `candidates` for the unique name of `entry`, replaces earlier requests
+            for the same entry. If none of them is free, a random suffix is added to the last one.
+            With `exact=True` the first candidate is required (e.g., set by a user).
+            Returns the preferred candidate, the entry keeps it until `resolve()` is called.
+        """
+        candidates = [c for c in dict.fromkeys(str(c).strip() for c in candidates) if c != '']
+        if len(candidates) == 0:
+            raise InventoryValidationError('Cannot generate a unique name!')
+        self._requests[id(entry)] = (entry, candidates, exact)
+        entry['unique_name'] = candidates[0]
+        return candidates[0]
+
+    def resolve(self) -> dict:
+        """
+            Check all candidates in one query and assign the first free candidate to every entry.
+            Returns a dict `{unique name: entry}`
+        """
+        candidates = [c for _, entry_candidates, _ in self._requests.values() for c in entry_candidates]
+        dgraph.loader.prime_uids('unique_name', candidates)
+        dgraph.loader.flush()
+
+        self.assigned = {}
+        resolved = {}
+        for entry, entry_candidates, exact in self._requests.values():
+            own_uid = str(entry['uid']) if isinstance(entry.get('uid'), UID) else None
+            unique_name = None
+            for candidate in entry_candidates:
+                if candidate in resolved or candidate in self.taken:
+                    continue
+                holder = dgraph.get_uid('unique_name', candidate)
+                if holder and (own_uid is None or int(holder, 16) != int(own_uid, 16)):
+                    continue
+                unique_name = candidate
+                break
+            if unique_name is None:
+                if exact:
+                    raise InventoryValidationError(
+                        f'Unique Name already taken: {entry_candidates[0]}')
+                unique_name = f'{entry_candidates[-1]}_{secrets.token_urlsafe(4)}'
+            entry['unique_name'] = unique_name
+            resolved[unique_name] = entry
+            self.assigned[unique_name] = own_uid
+        return resolved
+
+    @property
+    def upsert_query(self) -> str:
+        """ Query blocks that look up who else holds the assigned names """
+        if len(self.assigned) == 0:
+            return None
+        blocks = []
+        for i, (unique_name, own_uid) in enumerate(self.assigned.items()):
+            block = f'un{i} as var(func: eq(unique_name, {json.dumps(unique_name, ensure_ascii=False)}))'
+            if own_uid:
+                block += f' @filter(NOT uid({own_uid}))'
+            blocks.append(block)
+        variables = ", ".join(f'un{i}' for i in range(len(self.assigned)))
+        blocks.append(f'{CHECK_BLOCK}(func: uid({variables})) {{ uid unique_name }}')
+        return " ".join(blocks)
+
+    @property
+    def cond(self) -> str:
+        """ Condition of the mutation: none of the assigned names is taken """
+        if len(self.assigned) == 0:
+            return None
+        return '@if(' + ' AND '.join(f'eq(len(un{i}), 0)' for i in range(len(self.assigned))) + ')'
+
+    def applied(self, response) -> bool:
+        """
+            Whether the reservation of a mutation `response` succeeded.
+            If not, the names that were taken meanwhile are remembered
+            and the next `resolve()` picks other candidates.
+        """
+        if len(self.assigned) == 0:
+            return True
+        try:
+            taken = json.loads(response.json).get(CHECK_BLOCK, [])
+        except (AttributeError, TypeError, ValueError):
+            return True
+        self.taken.update(node['unique_name'] for node in taken)
+        return len(taken) == 0
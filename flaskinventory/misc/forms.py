@@ -15,7 +15,7 @@ def get_country_choices(opted=True, multinational=False, addblank=False) -> list
     if multinational:
         query_string += ''' m(func: type("Multinational"), orderasc: name) { name uid } '''
     query_string += '}'
-    countries = dgraph.query(query_string)
+    countries = dgraph.query(query_string, cache=True)
     c_choices = [(country.get('uid'), country.get('name'))
                  for country in countries['q']]
     if multinational:
@@ -0,0 +1,265 @@
+"""
+    Persistent job queue
+    Jobs are stored in a local SQLite database and processed by a pool of
+    worker threads. Several processes (e.g., gunicorn workers) can share
+    the same database file, every job is claimed by exactly one worker.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_schema = '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        target TEXT NOT NULL,
+        payload TEXT,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        result TEXT,
+        created REAL NOT NULL,
+        updated REAL NOT NULL,
+        available REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available);
+    CREATE INDEX IF NOT EXISTS jobs_target ON jobs (target);
+'''
+
+
+class JobQueue:
+
+    """
+        Queue of jobs in a SQLite database.
+
+        :param path:
+            location of the database file (created if it does not exist)
+        :param max_attempts:
+            failing jobs are retried (with exponential backoff)
+            until they failed this many times
+        :param retry_delay:
+            seconds before the first retry
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, retry_delay: float = 30) -> None:
+        self.path = os.path.abspath(path)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_schema)
+
+    def __repr__(self) -> str:
+        return f'<JobQueue {self.path}>'
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread (and process)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def enqueue(self, kind: str, target: str, payload: dict = None) -> int:
+        """ Add a job, returns its id """
+        now = time.time()
+        cursor = self._connection().execute(
+            '''INSERT INTO jobs (kind, target, payload, status, created, updated, available)
+               VALUES (?, ?, ?, ?, ?, ?, ?)''',
+            (kind, str(target), json.dumps(payload or {}), QUEUED, now, now, now))
+        return cursor.lastrowid
+
+    def claim(self) -> dict:
+        """ Take the oldest job that is due and mark it as running, returns None if there is none """
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                '''SELECT id FROM jobs WHERE status = ? AND available <= ?
+                   ORDER BY available, id LIMIT 1''', (QUEUED, now)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                '''UPDATE jobs SET status = ?, attempts = attempts + 1, updated = ?
+                   WHERE id = ?''', (RUNNING, now, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self.get(row['id'])
+
+    def complete(self, job_id: int, result: dict = None) -> None:
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = NULL, updated = ? WHERE id = ?',
+            (DONE, json.dumps(result) if result is not None else None, time.time(), job_id))
+
+    def fail(self, job_id: int, error: str) -> str:
+        """ Record a failed attempt, the job is queued again until it ran out of attempts. Returns the new status """
+        job = self.get(job_id)
+        now = time.time()
+        if job['attempts'] < self.max_attempts:
+            status = QUEUED
+            available = now + self.retry_delay * 2 ** (job['attempts'] - 1)
+        else:
+            status = FAILED
+            available = job['available']
+        self._connection().execute(
+            'UPDATE jobs SET status = ?, error = ?, updated = ?, available = ? WHERE id = ?',
+            (status, str(error), now, available, job_id))
+        return status
+
+    def retry(self, job_id: int = None) -> int:
+        """ Queue failed jobs (or a single job) again, returns the number of jobs """
+        now = time.time()
+        if job_id is None:
+            cursor = self._connection().execute(
+                'UPDATE jobs SET status = ?, attempts = 0, updated = ?, available = ? WHERE status = ?',
+                (QUEUED, now, now, FAILED))
+        else:
+            cursor = self._connection().execute(
+                'UPDATE jobs SET status = ?, attempts = 0, updated = ?, available = ? WHERE id = ?',
+                (QUEUED, now, now, job_id))
+        return cursor.rowcount
+
+    def requeue_stale(self, timeout: float) -> int:
+        """ Queue jobs again that are running for longer than `timeout` seconds (e.g., their worker died) """
+        now = time.time()
+        cursor = self._connection().execute(
+            'UPDATE jobs SET status = ?, updated = ?, available = ? WHERE status = ? AND updated < ?',
+            (QUEUED, now, now, RUNNING, now - timeout))
+        return cursor.rowcount
+
+    def get(self, job_id: int) -> dict:
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row(row)
+
+    def jobs(self, target: str = None, status: str = None, limit: int = 100) -> list:
+        """ Most recent jobs, optionally only of one target or with one status """
+        query = 'SELECT * FROM jobs'
+        conditions, params = [], []
+        if target is not None:
+            conditions.append('target = ?')
+            params.append(str(target))
+        if status is not None:
+            conditions.append('status = ?')
+            params.append(status)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        return [self._row(row) for row in self._connection().execute(query, params)]
+
+    def stats(self) -> dict:
+        """ Number of jobs per status """
+        rows = self._connection().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')
+        stats = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        stats.update({row['status']: row['n'] for row in rows})
+        return stats
+
+    def purge(self, older_than: float) -> int:
+        """ Delete finished jobs that are older than `older_than` seconds """
+        cursor = self._connection().execute(
+            'DELETE FROM jobs WHERE status = ? AND updated < ?', (DONE, time.time() - older_than))
+        return cursor.rowcount
+
+
+class WorkerPool:
+
+    """
+        Threads that process the jobs of a `JobQueue`.
+
+        :param handlers:
+            maps the kind of a job to a function `handler(target, payload)`,
+            the return value (if any) is stored as result of the job.
+            Exceptions mark the attempt as failed.
+        :param wrap:
+            called as `wrap(handler, target, payload)` instead of the handler,
+            e.g., to run the handler inside an app context
+    """
+
+    def __init__(self, queue: JobQueue, handlers: dict, size: int = 2,
+                 poll_interval: float = 1.0, wrap: Callable = None) -> None:
+        self.queue = queue
+        self.handlers = handlers
+        self.size = size
+        self.poll_interval = poll_interval
+        self.wrap = wrap
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def __repr__(self) -> str:
+        return f'<WorkerPool {len(self._threads)} workers for {self.queue}>'
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._run, name=f'jobqueue-worker-{i}', daemon=True)
+                         for i in range(self.size)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_once(self) -> bool:
+        """ Process one job, returns False if the queue had nothing to do """
+        job = self.queue.claim()
+        if job is None:
+            return False
+        handler = self.handlers.get(job['kind'])
+        try:
+            if handler is None:
+                raise KeyError(f'No handler for jobs of kind "{job["kind"]}"')
+            if self.wrap:
+                result = self.wrap(handler, job['target'], job['payload'])
+            else:
+                result = handler(job['target'], job['payload'])
+        except Exception as e:
+            status = self.queue.fail(job['id'], e)
+            self.logger.warning(f'Job {job["id"]} ({job["kind"]} for {job["target"]}) failed, now {status}: {e}')
+            return True
+        self.queue.complete(job['id'], result)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                busy = self.run_once()
+            except Exception as e:
+                self.logger.error(f'Job queue worker error: {e}')
+                busy = False
+            if not busy:
+                self._stop.wait(self.poll_interval)
@@ -4,7 +4,7 @@ from flask import current_app
 from flaskinventory import dgraph
 from flaskinventory.flaskdgraph import Schema
 from flaskinventory.flaskdgraph.dgraph_types import (UID, NewID, Predicate, Scalar,
-                                        GeoScalar, Variable, make_nquad, dict_to_nquad)
+                                        GeoScalar, Variable, make_nquad, serialize_nquads)
 from flaskinventory.flaskdgraph.utils import validate_uid
 from flaskinventory.errors import InventoryDatabaseError
 from flaskinventory.users.emails import send_accept_email
@@ -94,7 +94,7 @@ def accept_entry(uid, user):
     accepted = {'uid': UID(uid), 'entry_review_status': 'accepted',
                 "reviewed_by": UID(user.id, facets={'timestamp': datetime.now()})}
 
-    set_nquads = " \n ".join(dict_to_nquad(accepted))
+    set_nquads = serialize_nquads(accepted, sep=" \n ")
 
     dgraph.upsert(None, set_nquads=set_nquads)
     
@@ -128,7 +128,7 @@ def reject_entry(uid, user):
 
     rejected = {'uid': uid, 'entry_review_status': 'rejected', 'dgraph.type': 'Rejected',
                 "reviewed_by": UID(user.id, facets={'timestamp': datetime.now()})}
-    set_nquads = " \n ".join(dict_to_nquad(rejected))
+    set_nquads = serialize_nquads(rejected, sep=" \n ")
 
     dgraph.upsert(query, del_nquads=del_nquads)
     dgraph.upsert(None, set_nquads=set_nquads)
@@ -134,16 +134,18 @@ def get_user_data(**kwargs):
     uid = kwargs.get('uid', None)
     email = kwargs.get('email', None)
 
+    variables = None
     if uid:
         query_func = f'{{ q(func: uid({uid}))'
     elif email:
-        query_func = f'{{ q(func: eq(email, "{email}"))'
+        query_func = 'query get_user($email: string) { q(func: eq(email, $email))'
+        variables = {'$email': email}
     else:
         raise ValueError()
 
     query_fields = f'{{ uid email pw_reset @facets user_displayname user_orcid date_joined user_role user_affiliation preference_emails }} }}'
     query_string = query_func + query_fields
-    data = dgraph.query(query_string)
+    data = dgraph.query(query_string, variables=variables)
     if len(data['q']) == 0:
         return None
     data = data['q'][0]
@@ -158,8 +160,9 @@ def check_user(uid):
     return data['user'][0]['uid']
 
 def check_user_by_email(email):
-    query_string = f'''{{ user(func: eq(email, "{email}")) @filter(type("User")) {{ uid }} }}'''
-    data = dgraph.query(query_string)
+    query_string = '''query check_user($email: string) {
+                        user(func: eq(email, $email)) @filter(type("User")) { uid } }'''
+    data = dgraph.query(query_string, variables={'$email': email})
     if len(data['user']) == 0:
         return None
     return data['user'][0]['uid']
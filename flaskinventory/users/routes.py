@@ -1,7 +1,7 @@
 from datetime import datetime
 import secrets
 from flask import (Blueprint, render_template, url_for,
-                   flash, redirect, request, abort, Markup)
+                   flash, redirect, request, abort, Markup, jsonify)
 from flask_login import login_user, current_user, logout_user, login_required
 from flaskinventory import dgraph
 from flaskinventory.flaskdgraph.utils import validate_uid
@@ -210,6 +210,20 @@ def admin_view():
     return render_template('users/admin.html', title='Manage Users', users=users_table)
 
 
+@users.route('/users/admin/dgraph')
+@login_required
+@requires_access_level(USER_ROLES.Admin)
+def admin_dgraph_stats():
+    """ DGraph query statistics of this worker process """
+    sort_by = request.args.get('sort', 'wall')
+    if sort_by not in ['wall', 'count', 'server', 'bytes', 'max_wall']:
+        sort_by = 'wall'
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({'queries': dgraph.instrumentation.summary(sort_by=sort_by, limit=limit),
+                    'routes': dgraph.instrumentation.routes(sort_by=sort_by),
+                    'retries': dgraph.retry_stats})
+
+
 @users.route('/users/<string:uid>/edit', methods=['GET', 'POST'])
 @login_required
 @requires_access_level(USER_ROLES.Admin)
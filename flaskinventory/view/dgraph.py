@@ -1,15 +1,22 @@
 from flaskinventory import dgraph
-from flaskinventory.flaskdgraph import Schema
+from flaskinventory.flaskdgraph import Schema, build_query_string
+from flaskinventory.flaskdgraph.cache import QueryCache, make_key
+from flaskinventory.flaskdgraph.query import decode_cursor, cursor_variables
 from flaskinventory.main.model import *
 
+import itertools
 from typing import Union
 from flaskinventory.flaskdgraph.utils import restore_sequence, validate_uid
 
+# total counts of the query route per filter set
+# turning pages only runs the query for the results
+query_totals = QueryCache(maxsize=1024, ttl=30)
+
 """
     Inventory Detail View Functions
 """
 
-def get_entry(unique_name: str = None, uid: str = None, dgraph_type: Union[str, Schema] = None) -> Union[dict, None]:
+def get_entry(unique_name: str = None, uid: str = None, dgraph_type: Union[str, Schema] = None, cache: bool = False) -> Union[dict, None]:
     query_var = 'query get_entry($value: string) '
     if unique_name:
         uid = dgraph.get_uid("unique_name", unique_name)
@@ -87,7 +94,29 @@ def get_entry(unique_name: str = None, uid: str = None, dgraph_type: Union[str,
     
     query_string = query_var + query_func + query_fields
 
-    data = dgraph.query(query_string, variables={'$value': var})
+    # count queries are sent together with the entry query
+    counts = {}
+    if dgraph_type == 'Channel':
+        counts['num_sources'] = (Source.channel.count(uid, _reverse=True, entry_review_status="accepted"), 'channel', 'count')
+    elif dgraph_type == 'Archive':
+        counts['num_sources'] = (Archive.sources_included.count(uid, entry_review_status="accepted"), 'sources_included', 'count(sources_included)')
+    elif dgraph_type == 'Dataset':
+        counts['num_sources'] = (Dataset.sources_included.count(uid, entry_review_status="accepted"), 'sources_included', 'count(sources_included)')
+    elif dgraph_type == 'Corpus':
+        counts['num_sources'] = (Corpus.sources_included.count(uid, entry_review_status="accepted"), 'sources_included', 'count(sources_included)')
+    elif dgraph_type == 'Country':
+        counts['num_sources'] = (Source.country.count(uid, _reverse=True, entry_review_status="accepted"), 'country', 'count')
+        counts['num_orgs'] = (Organization.country.count(uid, _reverse=True, entry_review_status="accepted"), 'country', 'count')
+    elif dgraph_type == 'Multinational':
+        counts['num_sources'] = (Source.country.count(uid, _reverse=True, entry_review_status="accepted"), 'country', 'count')
+    elif dgraph_type == 'Subunit':
+        counts['num_sources'] = (Source.geographic_scope_subunit.count(uid, _reverse=True, entry_review_status="accepted"), 'geographic_scope_subunit', 'count')
+
+    queries = {'entry': (query_string, {'$value': var})}
+    queries.update({key: count_query for key, (count_query, _, _) in counts.items()})
+    results = dgraph.query_many(queries, cache=cache)
+
+    data = results['entry']
 
     if len(data['entry']) == 0:
         return None
@@ -96,38 +125,45 @@ def get_entry(unique_name: str = None, uid: str = None, dgraph_type: Union[str,
 
     restore_sequence(data)
 
-    if dgraph_type == 'Channel':
-        num_sources = dgraph.query(Source.channel.count(uid, _reverse=True, entry_review_status="accepted"))
-        data['num_sources'] = num_sources['channel'][0]['count']
+    for key, (_, block, field) in counts.items():
+        data[key] = results[key][block][0][field]
 
-    elif dgraph_type == 'Archive':
-        num_sources = dgraph.query(Archive.sources_included.count(uid, entry_review_status="accepted"))
-        data['num_sources'] = num_sources['sources_included'][0]['count(sources_included)']
+    return data
 
-    elif dgraph_type == 'Dataset':
-        num_sources = dgraph.query(Dataset.sources_included.count(uid, entry_review_status="accepted"))
-        data['num_sources'] = num_sources['sources_included'][0]['count(sources_included)']
 
-    elif dgraph_type == 'Corpus':
-        num_sources = dgraph.query(Corpus.sources_included.count(uid, entry_review_status="accepted"))
-        data['num_sources'] = num_sources['sources_included'][0]['count(sources_included)']
 
-    elif dgraph_type == 'Country':
-        num_sources = dgraph.query(Source.country.count(uid, _reverse=True, entry_review_status="accepted"))
-        data['num_sources'] = num_sources['country'][0]['count']
-        num_orgs = dgraph.query(Organization.country.count(uid, _reverse=True, entry_review_status="accepted"))
-        data['num_orgs'] = num_orgs['country'][0]['count']
-    
-    elif dgraph_type == 'Multinational':
-        num_sources = dgraph.query(Source.country.count(uid, _reverse=True, entry_review_status="accepted"))
-        data['num_sources'] = num_sources['country'][0]['count']
+def query_entries(query: dict, search_terms: str = None) -> tuple:
+    """
+        Run a query of the query route (see `build_query_string()`)
+        Returns a tuple: `(total, results)` or `(None, None)` if there is nothing to query
+    """
+    results_query = build_query_string(dict(query), total=False)
+    if not results_query:
+        return None, None
 
-    elif dgraph_type == 'Subunit':
-        num_sources = dgraph.query(Source.geographic_scope_subunit.count(uid, _reverse=True, entry_review_status="accepted"))
-        data['num_sources'] = num_sources['geographic_scope_subunit'][0]['count']
+    variables = {'$searchTerms': search_terms} if search_terms else {}
 
-    return data
+    cursor = query.get('_cursor')
+    cursor = decode_cursor(cursor[0] if isinstance(cursor, list) else cursor)
+    results_variables = {**variables, **cursor_variables(cursor)}
+
+    total_query = build_query_string(dict(query), results=False)
+    key = make_key(total_query, variables)
+    total = query_totals.get(key)
+    if total is None:
+        res = dgraph.query_many({'total': (total_query, variables or None),
+                                 'q': (results_query, results_variables or None)})
+        total = res['total']['total'][0]['count']
+        query_totals.set(key, total)
+        result = res['q']['q']
+    else:
+        result = dgraph.query(results_query, variables=results_variables or None)['q']
+
+    # previous pages are queried in reverse order
+    if cursor and cursor[0] == 'prev':
+        result.reverse()
 
+    return total, result
 
 
 def get_rejected(uid):
@@ -164,18 +200,18 @@ def get_orphan(query):
 # List all entries of specified type, allows to pass in filters
 
 
-def list_by_type(typename, filt=None, fields=None, normalize=False):
-    query_head = f'{{ q(func: type("{typename}"), orderasc: name) '
-    if filt:
-        query_head += dgraph.build_filt_string(filt)
-
+def iter_by_type(typename, filt=None, fields=None, page_size=1000):
+    """
+        Generator over all entries of a type, ordered by name (and unique name).
+        Fetches them page by page with a name cursor (like the query route),
+        so memory use does not grow with the graph.
+    """
     query_fields = ''
     if fields == 'all':
         query_fields = " expand(_all_) "
     elif fields:
         query_fields = " ".join(fields)
     else:
-        normalize = True
         if typename == 'Source':
             query_fields = ''' uid unique_name name founded other_names
                                 channel { name }
@@ -190,35 +226,60 @@ def list_by_type(typename, filt=None, fields=None, normalize=False):
                                 sources_included: count(sources_included)
                                 ''' 
         if typename == 'ResearchPaper':
-            normalize = False   
             query_fields = ''' uid title authors @facets published_date journal
                                 sources_included: count(sources_included)
                                 '''
         if typename == 'Subunit':
-            normalize = False
             query_fields = ''' uid name unique_name other_names '''
         
         if typename == 'Tool':
-            normalize = False
             query_fields = ''' uid name authors @facets published_date journal
                                 '''
 
     query_fields += ''' country { name } '''
 
-    if normalize:
-        query_head += ''
+    # the cursor needs the name and unique name of each entry
+    for field in ['unique_name', 'name']:
+        if field not in query_fields.split():
+            query_fields = f' {field} ' + query_fields
 
-    query_string = query_head + \
-        ' { ' + query_fields + ' ' + ' } }'
+    # filters go into a var block, the cursor filters the ordered block
+    entries_block = f'entries as var(func: type("{typename}")) '
+    if filt:
+        entries_block += dgraph.build_filt_string(filt)
+    ordering = f'orderasc: name, orderasc: unique_name, first: {int(page_size)}'
+
+    first_page = f'''{{ {entries_block}
+                        q(func: uid(entries), {ordering}) {{ {query_fields} }} }}'''
+    next_page = f'''query list_by_type($cursorName: string, $cursorUniqueName: string) {{
+                        {entries_block}
+                        q(func: uid(entries), {ordering})
+                            @filter(gt(name, $cursorName) OR
+                                    (eq(name, $cursorName) AND gt(unique_name, $cursorUniqueName))) {{
+                            {query_fields} }} }}'''
+
+    page = dgraph.query(first_page)['q']
+    while len(page) > 0:
+        for entry in page:
+            if typename in ['ResearchPaper', 'Tool', 'Corpus', 'Dataset']:
+                restore_sequence(entry)
+            yield entry
+        last = page[-1]
+        # entries without a name come last and cannot serve as cursor
+        if len(page) < page_size or not last.get('name') or not last.get('unique_name'):
+            break
+        page = dgraph.query(next_page, variables=cursor_variables(
+            ('next', last['name'], last['unique_name'])))['q']
 
-    data = dgraph.query(query_string)
 
-    if len(data['q']) == 0:
+def list_by_type(typename, filt=None, fields=None, normalize=False):
+    """
+        Entries of a type ordered by name, streamed page by page (see `iter_by_type`).
+        Returns False if there are none.
+    """
+    entries = iter_by_type(typename, filt=filt, fields=fields)
+    first = next(entries, None)
+    if first is None:
         return False
 
-    data = data['q']
-    if typename in ['ResearchPaper', 'Tool', 'Corpus', 'Dataset']:
-        for paper in data:
-            restore_sequence(paper)
-
-    return data
+    return itertools.chain([first], entries)
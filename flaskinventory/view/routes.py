@@ -4,10 +4,10 @@ from flask_login import current_user, login_required
 from flaskinventory import dgraph
 from flaskinventory.flaskdgraph.dgraph_types import SingleChoice
 from flaskinventory.flaskdgraph import Schema, build_query_string
-from flaskinventory.flaskdgraph.query import generate_query_forms
+from flaskinventory.flaskdgraph.query import generate_query_forms, encode_cursor
 from flaskinventory.users.constants import USER_ROLES
 from flaskinventory.users.utils import requires_access_level
-from flaskinventory.view.dgraph import (get_entry, get_rejected)
+from flaskinventory.view.dgraph import (get_entry, get_rejected, query_entries)
 from flaskinventory.view.utils import can_view
 from flaskinventory.flaskdgraph.utils import validate_uid, restore_sequence
 from flaskinventory.review.utils import create_review_actions
@@ -93,7 +93,9 @@ def view_generic(dgraph_type=None, uid=None, unique_name=None):
         except:
             return abort(404)
 
-    data = get_entry(uid=uid, unique_name=unique_name, dgraph_type=dgraph_type)
+    # anonymous users all see the same page, so their view can come from the cache
+    data = get_entry(uid=uid, unique_name=unique_name, dgraph_type=dgraph_type,
+                     cache=not current_user.is_authenticated)
 
     if not data:
         return abort(404)
@@ -160,23 +162,27 @@ def query():
     total = None
     result = None
     pages = 1
+    next_cursor = None
+    previous_cursor = None
     r = {k: v for k, v in request.args.to_dict(
         flat=False).items() if v[0] != ''}
     try:
         json_output = r.pop('json')
     except:
         json_output = False
-    if len(r) > 0:
-        query_string = build_query_string(r)
-        if query_string:
-            search_terms = request.args.get('_terms', '')
-            if not search_terms == '':
-                variables = {'$searchTerms': search_terms}
-            else:
-                variables = None
-            result = dgraph.query(query_string, variables=variables)
-            total = result['total'][0]['count']
 
+    r_args = {k: v for k, v in request.args.to_dict(
+        flat=False).items() if v[0] != ''}
+    r_args.pop('_cursor', None)
+    try:
+        current_page = int(r_args.pop('_page')[0])
+    except:
+        current_page = 1
+
+    if len(r) > 0:
+        search_terms = request.args.get('_terms', '')
+        total, result = query_entries(r, search_terms=search_terms)
+        if result is not None:
             max_results = int(request.args.get('_max_results', 25))
             # make sure no random values are passed in as parameters
             if not max_results in [10, 25, 50]:
@@ -185,8 +191,6 @@ def query():
             # fancy ceiling division
             pages = -(total // -max_results)
 
-            result = result['q']
-
             # clean 'Entry' from types
             if len(result) > 0:
                 for item in result:
@@ -195,12 +199,13 @@ def query():
                     if any(t in item['dgraph.type'] for t in ['ResearchPaper', 'Tool', 'Corpus', 'Dataset']):
                         restore_sequence(item)
 
-    r_args = {k: v for k, v in request.args.to_dict(
-        flat=False).items() if v[0] != ''}
-    try:
-        current_page = int(r_args.pop('_page')[0])
-    except:
-        current_page = 1
+                # cursors for the neighbouring pages
+                if current_page < pages:
+                    next_cursor = encode_cursor(
+                        'next', result[-1].get('name'), result[-1].get('unique_name'))
+                if current_page > 1:
+                    previous_cursor = encode_cursor(
+                        'prev', result[0].get('name'), result[0].get('unique_name'))
 
     form = generate_query_forms(dgraph_types=['Source', 'Organization', 'Tool', 'Archive', 'Dataset', 'Corpus'],
                                 populate_obj=request.args)
@@ -210,9 +215,12 @@ def query():
                     '_page': current_page, 
                     '_total_pages': pages, 
                     '_total_results': total or 0, 
+                    '_next_cursor': next_cursor,
+                    '_previous_cursor': previous_cursor,
                     'result': result or []}
         return jsonify(j_result)
-    return render_template("query/index.html", form=form, result=result, r_args=r_args, total=total, pages=pages, current_page=current_page)
+    return render_template("query/index.html", form=form, result=result, r_args=r_args, total=total, pages=pages, current_page=current_page,
+                           next_cursor=next_cursor, previous_cursor=previous_cursor)
 
 
 @view.route("/query/json")
@@ -0,0 +1,434 @@
+#  Ugly hack to allow absolute import from the root folder
+# whatever its name is. Please forgive the heresy.
+
+if __name__ == "__main__":
+    from sys import path
+    from os.path import dirname
+
+    path.append(dirname(path[0]))
+    from test_setup import BasicTestSetup
+    from flaskinventory import dgraph
+
+    import unittest
+    from flaskinventory.flaskdgraph.pool import DGraphPool, channel_options
+    from flaskinventory.flaskdgraph.cache import QueryCache
+    from flaskinventory.flaskdgraph.decoder import ResponseDecoder
+    from flaskinventory.flaskdgraph.retry import RetryPolicy, creates_nodes
+    from flaskinventory.flaskdgraph.instrumentation import fingerprint
+    from flaskinventory.flaskdgraph.slowlog import SlowQueryLog
+    import logging
+    import tempfile
+    import json
+    import pydgraph
+    import datetime
+    import os
+    from flaskinventory.flaskdgraph import Schema
+    from flaskinventory.flaskdgraph.dgraph_types import relationship_choices
+    from flaskinventory.flaskdgraph.dgraph_types import (UID, NewID, Scalar, GeoScalar, Variable, Facet, make_nquad, dict_to_nquad,
+                                                         iter_nquads, write_nquads, serialize_nquads)
+    import io
+
+
+class TestDGraphClient(BasicTestSetup):
+
+    """
+        Test Cases for the DGraph extension
+    """
+
+    def test_pool_round_robin(self):
+        pool = DGraphPool(['localhost:9080', 'localhost:9080'], size=2)
+        first, _ = pool.acquire()
+        second, _ = pool.acquire()
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(pool.healthy), 2)
+        pool.close()
+
+    def test_pool_ejection(self):
+        pool = DGraphPool(['localhost:9080', 'localhost:1'],
+                          max_failures=1, retry_interval=3600)
+        unreachable = pool.endpoints[1]
+        self.assertFalse(unreachable.probe(timeout=1))
+        pool.mark_failed(unreachable)
+        self.assertTrue(unreachable.ejected)
+        for _ in range(4):
+            endpoint, client = pool.acquire()
+            self.assertEqual(endpoint.address, 'localhost:9080')
+            self.assertTrue(client.txn(read_only=True).query('{ q(func: has(dgraph.type), first: 1) { uid } }'))
+        pool.mark_healthy(unreachable)
+        self.assertFalse(unreachable.ejected)
+        pool.close()
+
+    def test_channel_options(self):
+        options = dict(channel_options({'keepalive_time': 30,
+                                         'max_message_length': 1024,
+                                         'compression': 'gzip',
+                                         'grpc.enable_retries': 0}))
+        self.assertEqual(options['grpc.keepalive_time_ms'], 30000)
+        self.assertEqual(options['grpc.max_receive_message_length'], 1024)
+        self.assertEqual(options['grpc.max_send_message_length'], 1024)
+        self.assertEqual(options['grpc.enable_retries'], 0)
+        self.assertIn('grpc.default_compression_algorithm', options)
+        self.assertRaises(ValueError, channel_options, {'keepalive': 30})
+
+    def test_pool_fork_safety(self):
+        with self.app.app_context():
+            self.assertEqual(dgraph.warmup(), 1)
+            pool = dgraph.pool
+            self.assertTrue(pool.owned)
+            # pretend the pool was created by a parent process
+            pool.pid = -1
+            try:
+                self.assertIsNot(dgraph.pool, pool)
+                self.assertTrue(dgraph.pool.owned)
+                self.assertTrue(dgraph.get_uid('unique_name', 'derstandard_print'))
+            finally:
+                pool.pid = os.getpid()
+                pool.close()
+
+    def test_query_failover(self):
+        with self.app.app_context():
+            pool = dgraph._pool
+            dgraph._pool = DGraphPool(['localhost:1', 'localhost:9080'])
+            try:
+                for _ in range(3):
+                    uid = dgraph.get_uid('unique_name', 'derstandard_print')
+                    self.assertEqual(uid, self.derstandard_print)
+            finally:
+                dgraph._pool.close()
+                dgraph._pool = pool
+
+    def test_query_cache(self):
+        query_string = '''query get_entry($value: string) {
+                            q(func: uid($value)) { uid name } }'''
+        with self.app.app_context():
+            cache = dgraph.cache
+            dgraph.cache = QueryCache(maxsize=16, ttl=60)
+            try:
+                variables = {'$value': self.derstandard_print}
+                first = dgraph.query(query_string, variables=variables, cache=True)
+                second = dgraph.query(query_string, variables=variables, cache=True)
+                self.assertEqual(first, second)
+                self.assertEqual(dgraph.cache.hits, 1)
+                # returns a fresh object on every hit
+                second['q'].pop()
+                third = dgraph.query(query_string, variables=variables, cache=True)
+                self.assertEqual(first, third)
+
+                dgraph.query('{ q(func: type("Country")) { uid } }', cache=True)
+                dgraph.query('{ q(func: type("Channel")) { uid } }', cache=True)
+                self.assertEqual(len(dgraph.cache), 3)
+
+                # editing an existing entry drops it and all collections
+                dgraph.invalidate({'uid': self.derstandard_print, 'name': 'Der Standard'})
+                self.assertEqual(len(dgraph.cache), 0)
+
+                # new entries only drop collections of their type
+                dgraph.query(query_string, variables=variables, cache=True)
+                dgraph.query('{ q(func: type("Country")) { uid } }', cache=True)
+                dgraph.query('{ q(func: type("Channel")) { uid } }', cache=True)
+                dgraph.invalidate('_:newcountry <dgraph.type> "Country" .')
+                self.assertEqual(len(dgraph.cache), 2)
+
+                # changing an embedded node drops the entries that contain it
+                dgraph.cache.clear()
+                embedded = '''query get_entry($value: string) {
+                                q(func: uid($value)) { uid name country { uid name } } }'''
+                entry = dgraph.query(embedded, variables=variables, cache=True)
+                country = entry['q'][0]['country'][0]['uid']
+                dgraph.invalidate({'uid': country, 'name': 'Renamed Country'})
+                self.assertEqual(len(dgraph.cache), 0)
+            finally:
+                dgraph.cache = cache
+
+    def test_response_decoder(self):
+        raw = b'''{"q": [{"name": "2021-01-01",
+                          "founded": "1988-01-01T00:00:00Z",
+                          "creation_date": "2022-03-04T10:00:00Z",
+                          "audience_size": ["2020-05-01T00:00:00Z"],
+                          "audience_size|data_from": {"0": "https://example.com"},
+                          "entry_added": {"uid": "0x1", "entry_added|timestamp": "2022-03-04T10:00:00Z"},
+                          "drafts|timestamp": "2022-03-04T10:00:00Z",
+                          "sources_included": [{"uid": "0x2",
+                                                "sources_included|from": "2015-01-01T00:00:00Z",
+                                                "sources_included|to": "2018-05-01T00:00:00Z"}],
+                          "papers": [{"uid": "0x3", "papers|from": "2015-01-01T00:00:00Z"}]}]}'''
+        for backend in ['json', 'orjson']:
+            decoder = ResponseDecoder(backend=backend)
+            data = decoder.decode(raw)['q'][0]
+            self.assertEqual(data['name'], '2021-01-01')
+            self.assertIsInstance(data['founded'], datetime.datetime)
+            self.assertIsInstance(data['creation_date'], datetime.datetime)
+            self.assertIsInstance(data['audience_size'][0], datetime.datetime)
+            self.assertEqual(data['audience_size|data_from']['0'], 'https://example.com')
+            self.assertIsInstance(data['entry_added']['entry_added|timestamp'], datetime.datetime)
+            self.assertIsInstance(data['drafts|timestamp'], datetime.datetime)
+            self.assertIsInstance(data['sources_included'][0]['sources_included|from'], datetime.datetime)
+            self.assertIsInstance(data['sources_included'][0]['sources_included|to'], datetime.datetime)
+            # facets of reverse edges are aliased
+            self.assertIsInstance(data['papers'][0]['papers|from'], datetime.datetime)
+
+    def test_loader_batching(self):
+        with self.app.app_context():
+            loader = dgraph.loader
+            self.assertIs(loader, dgraph.loader)
+            loader.prime_nodes(self.sources + ['not a uid'])
+            loader.prime_uids('unique_name', ['austria', 'germany'])
+            self.assertEqual(dgraph.get_dgraphtype(self.derstandard_print), 'Source')
+            # everything was resolved in the same round trip
+            self.assertEqual(len(loader._pending_nodes), 0)
+            self.assertEqual(len(loader._pending_uids), 0)
+            self.assertEqual(loader._uids[('unique_name', 'germany')], self.germany_uid)
+            self.assertEqual(dgraph.get_unique_name(self.falter_print_uid), 'falter_print')
+            self.assertEqual(dgraph.get_uid('unique_name', 'austria'), self.austria_uid)
+            self.assertEqual(dgraph.get_dgraphtype(self.derstandard_print, clean=[]).count('Entry'), 1)
+            # many uids in one query, leading zeros do not matter
+            padded = '0x0' + self.derstandard_print[2:]
+            nodes = loader.nodes(self.sources + [padded, '0xfffffffffff'])
+            self.assertEqual(nodes[padded]['unique_name'], 'derstandard_print')
+            self.assertIsNone(nodes['0xfffffffffff'])
+            # writes drop memoized lookups
+            dgraph.invalidate({'uid': self.derstandard_print})
+            self.assertEqual(len(loader._nodes), 0)
+
+    def test_query_many(self):
+        query_string = '''query get_entry($value: string) {
+                            q(func: uid($value)) { uid unique_name } }'''
+        with self.app.app_context():
+            results = dgraph.query_many({'entry': (query_string, {'$value': self.derstandard_print}),
+                                         'countries': '{ q(func: type("Country")) { count(uid) } }'})
+            self.assertEqual(results['entry']['q'][0]['unique_name'], 'derstandard_print')
+            self.assertGreater(results['countries']['q'][0]['count'], 0)
+
+            # lists in, lists out
+            results = dgraph.query_many([(query_string, {'$value': uid}) for uid in self.sources])
+            self.assertEqual([r['q'][0]['uid'] for r in results], self.sources)
+
+    def test_iter_query(self):
+        query_string = '''query all_sources($first: int, $after: string) {
+                            q(func: type("Source"), first: $first, after: $after) { uid } }'''
+        with self.app.app_context():
+            total = dgraph.query('{ q(func: type("Source")) { count(uid) } }')['q'][0]['count']
+            uids = [entry['uid'] for entry in dgraph.iter_query(query_string, page_size=2)]
+            self.assertEqual(len(uids), total)
+            self.assertEqual(len(set(uids)), total)
+            for uid in self.sources:
+                self.assertIn(uid, uids)
+
+    def test_write_retry(self):
+        with self.app.app_context():
+            policy = dgraph.retry_policy
+            dgraph.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+            attempts = []
+
+            def conflicting(txn):
+                attempts.append(1)
+                if len(attempts) < 3:
+                    raise pydgraph.errors.AbortedError()
+                return txn.query('{ q(func: has(dgraph.type), first: 1) { uid } }')
+
+            def aborted(txn):
+                raise pydgraph.errors.AbortedError()
+
+            def failing(txn):
+                raise ValueError('not retriable')
+
+            def unavailable(txn):
+                attempts.append(1)
+                raise pydgraph.errors.ConnectionError('connection lost')
+
+            try:
+                self.assertTrue(dgraph.write(conflicting))
+                self.assertEqual(len(attempts), 3)
+                self.assertEqual(dgraph.retry_stats, {'retries': 2, 'conflicts': 2, 'failures': 0})
+
+                with self.assertRaises(pydgraph.errors.AbortedError):
+                    dgraph.write(aborted)
+                self.assertEqual(dgraph.retry_stats, {'retries': 4, 'conflicts': 5, 'failures': 1})
+
+                with self.assertRaises(ValueError):
+                    dgraph.write(failing)
+                self.assertEqual(dgraph.retry_stats['failures'], 1)
+
+                # the write might have been committed, new nodes must not be added twice
+                attempts.clear()
+                with self.assertRaises(pydgraph.errors.ConnectionError):
+                    dgraph.write(unavailable, idempotent=False)
+                self.assertEqual(len(attempts), 1)
+                attempts.clear()
+                with self.assertRaises(pydgraph.errors.ConnectionError):
+                    dgraph.write(unavailable)
+                self.assertEqual(len(attempts), 3)
+
+                self.assertTrue(creates_nodes(set_nquads='_:new <name> "New" .'))
+                self.assertTrue(creates_nodes(set_obj={'name': 'New'}))
+                self.assertTrue(creates_nodes(set_obj={'uid': '0x1', 'publishes': [{'name': 'New'}]}))
+                self.assertFalse(creates_nodes(set_nquads='<0x1> <name> "Old" .'))
+                self.assertFalse(creates_nodes(set_obj={'uid': '0x1', 'name': 'Old'}))
+            finally:
+                dgraph.retry_policy = policy
+
+    def test_bulk_mutate(self):
+        nquads = [f'_:bulk{i} <name> "Bulk Test {i}" .' for i in range(10)]
+        # references a blank node from the first chunk
+        nquads.append('_:bulk10 <other_names> "Bulk Test 0" .')
+        progress = []
+        with self.app.app_context():
+            result = dgraph.bulk_mutate(nquads, chunk_size=4,
+                                        progress=lambda *args: progress.append(args))
+            try:
+                self.assertTrue(result.ok)
+                self.assertEqual(result.chunks, 3)
+                self.assertEqual(result.items, 11)
+                self.assertEqual(len(progress), 3)
+                self.assertEqual(len(result.uids), 11)
+            finally:
+                deleted = dgraph.bulk_mutate([{'uid': uid} for uid in result.uids.values()],
+                                             chunk_size=5, concurrency=2, delete=True)
+                self.assertTrue(deleted.ok)
+
+    def test_instrumentation(self):
+        self.assertEqual(fingerprint('{ q(func: eq(name, "Falter"), first: 5) { uid } }'),
+                         fingerprint('{ q(func: eq(name, "Der Standard"), first: 10) { uid } }'))
+        self.assertEqual(fingerprint('{ q(func: uid(0x1a)) { uid } }'), '{ q(func: uid(?)) { uid } }')
+
+        self.app.config['DGRAPH_INSTRUMENTATION_HEADERS'] = True
+        try:
+            with self.client:
+                response = self.client.get('/')
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(int(response.headers['X-DGraph-Queries']), 0)
+                self.assertIn('X-DGraph-Server-Time', response.headers)
+        finally:
+            self.app.config['DGRAPH_INSTRUMENTATION_HEADERS'] = None
+
+        summary = dgraph.instrumentation.summary(sort_by='count')
+        self.assertGreater(len(summary), 0)
+        self.assertIn('main.home', dgraph.instrumentation.routes())
+
+    def test_slow_query_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = logging.FileHandler(f'{tmp}/slow.log')
+            previous = dgraph.slow_query_log
+            dgraph.slow_query_log = SlowQueryLog(0, sample_rate=1, handler=handler)
+            try:
+                query_string = 'query get($name: string) { q(func: eq(name, $name)) { uid } }'
+                dgraph.query(query_string, variables={'$name': 'Falter'})
+                # user input inline in the query
+                dgraph.query('{ q(func: eq(email, "wp3@opted.eu")) { uid } }')
+                handler.flush()
+            finally:
+                dgraph.slow_query_log.logger.removeHandler(handler)
+                handler.close()
+                dgraph.slow_query_log = previous
+
+            with open(f'{tmp}/slow.log') as f:
+                entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['variables'], {'$name': '<str:6>'})
+        self.assertEqual(entries[0]['query'], query_string)
+        self.assertNotIn('Falter', json.dumps(entries[0]))
+        self.assertEqual(entries[1]['query'], '{ q(func: eq(email, ?)) { uid } }')
+        self.assertNotIn('wp3@opted.eu', json.dumps(entries[1]))
+
+    def test_schema_views(self):
+        predicates = Schema.get_predicates('Source')
+        # no copies: the same predicate objects on every call
+        self.assertIs(predicates['name'], Schema.get_predicates('Source')['name'])
+        with self.assertRaises(TypeError):
+            predicates['name'] = None
+        fields = dict(predicates)
+        fields.update(Schema.get_reverse_predicates('Source'))
+        self.assertNotIn('publishes_org', Schema.get_predicates('Source'))
+        self.assertIn('channel', Schema.get_queryable_predicates('source'))
+
+    def test_schema_index(self):
+        self.assertEqual(Schema.get_type('fileformat'), 'FileFormat')
+        self.assertEqual(Schema.get_type('SOURCE'), 'Source')
+        self.assertIsNone(Schema.get_type('notatype'))
+        self.assertEqual(Schema.get_inheritance('Source'), ('Source', 'Entry'))
+        # callers can extend the list
+        dgraph_types = Schema.resolve_inheritance('Organization')
+        dgraph_types.append('Test')
+        self.assertNotIn('Test', Schema.resolve_inheritance('Organization'))
+
+    def test_relationship_choices_cache(self):
+        country = Schema.get_predicates('Source')['country']
+        relationship_choices.clear()
+        with self.app.app_context():
+            country.get_choices()
+            misses = relationship_choices.misses
+            country.get_choices()
+            self.assertEqual(relationship_choices.misses, misses)
+            self.assertIn(self.austria_uid, country.choices)
+
+            # writes to unrelated nodes keep the choices
+            dgraph.invalidate({'uid': self.derstandard_print, 'name': 'Der Standard'})
+            country.get_choices()
+            self.assertEqual(relationship_choices.misses, misses)
+
+            # a new country or a change to a listed one drops them
+            dgraph.invalidate({'uid': '_:newcountry', 'dgraph.type': ['Entry', 'Country']})
+            country.get_choices()
+            self.assertEqual(relationship_choices.misses, misses + 1)
+            dgraph.invalidate({'uid': self.austria_uid, 'name': 'Austria'})
+            country.get_choices()
+            self.assertEqual(relationship_choices.misses, misses + 2)
+
+
+    def test_nquad_serializer(self):
+        timestamp = datetime.datetime(2022, 1, 1, 12, 30)
+        entry = {'uid': UID(self.derstandard_print),
+                 'name': ' Der "Standard" ',
+                 'founded': datetime.date(1988, 10, 19),
+                 'verified': True,
+                 'audience_size': 100,
+                 'other_names': [Scalar('DS', facets={'kind': 'acronym'}), 'Standard'],
+                 'country': UID(self.austria_uid, facets={'timestamp': timestamp}),
+                 'description': None}
+        nquads = dict_to_nquad(entry)
+        subject = f'<{self.derstandard_print}>'
+        self.assertEqual(nquads, [f'{subject} <name> "Der \\"Standard\\"" .',
+                                  f'{subject} <founded> "1988-10-19" .',
+                                  f'{subject} <verified> "true" .',
+                                  f'{subject} <audience_size> "100" .',
+                                  f'{subject} <other_names> "DS" (kind="acronym") .',
+                                  f'{subject} <other_names> "Standard" .',
+                                  f'{subject} <country> <{self.austria_uid}> (timestamp=2022-01-01T12:30:00) .'])
+        self.assertEqual(make_nquad(UID(self.derstandard_print), 'name', ' Der "Standard" '), nquads[0])
+        self.assertEqual(list(iter_nquads(entry)), nquads)
+
+        # all triples of a new entry share one blank node
+        subjects = {nquad.split(' ')[0] for nquad in iter_nquads({'name': 'New', 'other_names': ['A', 'B']})}
+        self.assertEqual(len(subjects), 1)
+
+        delete = {'uid': UID(self.derstandard_print), 'other_names': '*'}
+        self.assertEqual(serialize_nquads(entry, delete),
+                         " \n".join(nquads + [f'{subject} <other_names> * .']))
+        buffer = io.StringIO()
+        self.assertEqual(write_nquads(buffer, entry, delete, sep="\n"), len(nquads) + 1)
+        self.assertEqual(buffer.getvalue(), serialize_nquads(entry, delete, sep="\n"))
+
+    def test_slotted_values(self):
+        for value in [UID(self.austria_uid), NewID('Der Standard'), Scalar('Falter'),
+                      GeoScalar('Point', [16.37, 48.2]), Variable('v', 'uid'), Facet('kind')]:
+            self.assertFalse(hasattr(value, '__dict__'), type(value).__name__)
+
+        scalar = Scalar(' Der "Standard" ', facets={'kind': 'official'})
+        self.assertEqual(str(scalar), 'Der "Standard"')
+        self.assertEqual(scalar.value, '"Der \\"Standard\\""')
+        self.assertEqual(scalar.nquad, scalar.value)
+        self.assertEqual(Scalar('*').nquad, '*')
+        self.assertEqual(Scalar(False).nquad, '"false"')
+
+        founded = Scalar(datetime.date(1988, 10, 19))
+        self.assertEqual((founded.year, founded.month, founded.day), (1988, 10, 19))
+        self.assertEqual(str(founded), '1988-10-19')
+        self.assertFalse(hasattr(scalar, 'year'))
+
+        geo = GeoScalar('Point', [16.37, 48.2])
+        self.assertEqual(geo.value, {'type': 'Point', 'coordinates': [16.37, 48.2]})
+        self.assertEqual((geo.lon, geo.lat), (16.37, 48.2))
+        self.assertTrue(geo.nquad.endswith('^^<geo:geojson>'))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
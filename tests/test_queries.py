@@ -9,7 +9,9 @@ if __name__ == "__main__":
     path.append(dirname(path[0]))
     from test_setup import BasicTestSetup
     from flaskinventory.view.routes import build_query_string
+    from flaskinventory.flaskdgraph.query import get_query_form_class, generate_query_forms
     from flaskinventory import dgraph
+    from flaskinventory.view.dgraph import iter_by_type, list_by_type
 
 class TestQueries(BasicTestSetup):
 
@@ -66,6 +68,23 @@ class TestQueries(BasicTestSetup):
         res = dgraph.query(query_string)
         self.assertEqual(res['total'][0]['count'], 4)
 
+    def test_query_form_cache(self):
+        with self.app.test_request_context():
+            form_class = get_query_form_class(['Source', 'Organization'])
+            self.assertIs(form_class, get_query_form_class(['Source', 'Organization']))
+            self.assertIsNot(form_class, get_query_form_class(['Source']))
+
+            # each call still gets its own form instance
+            form = generate_query_forms(['Source', 'Organization'], populate_obj={})
+            self.assertIsInstance(form, form_class)
+            self.assertIsNot(form, generate_query_forms(['Source', 'Organization']))
+
+            # expired or after a write the class is built again
+            self.assertIsNot(form_class, get_query_form_class(['Source', 'Organization'], ttl=0))
+            form_class = get_query_form_class(['Source', 'Organization'])
+            dgraph.invalidate()
+            self.assertIsNot(form_class, get_query_form_class(['Source', 'Organization']))
+
     def test_query_route_post(self):
 
         with self.client as c:
@@ -296,6 +315,48 @@ class TestQueries(BasicTestSetup):
                              query_string=query)
             self.assertEqual(len(response.json['result']), 11)
 
+    def test_cursor_pagination(self):
+
+        with self.client as c:
+            query = {"dgraph.type": ["Source", "Organization"],
+                     "country": self.austria_uid,
+                     "_max_results": 10,
+                     "json": True}
+
+            first_page = c.get('/query', query_string=query).json
+            self.assertEqual(first_page['_total_results'], 11)
+            self.assertEqual(first_page['_total_pages'], 2)
+            self.assertEqual(len(first_page['result']), 10)
+            self.assertIsNone(first_page['_previous_cursor'])
+
+            # offset and cursor give the same second page
+            offset_page = c.get('/query', query_string={**query, '_page': 2}).json
+            cursor_page = c.get('/query', query_string={**query, '_page': 2,
+                                                        '_cursor': first_page['_next_cursor']}).json
+            self.assertEqual(len(cursor_page['result']), 1)
+            self.assertEqual([e['uid'] for e in offset_page['result']],
+                             [e['uid'] for e in cursor_page['result']])
+            self.assertIsNone(cursor_page['_next_cursor'])
+
+            # and back to the first page
+            previous_page = c.get('/query', query_string={**query, '_page': 1,
+                                                          '_cursor': cursor_page['_previous_cursor']}).json
+            self.assertEqual([e['uid'] for e in first_page['result']],
+                             [e['uid'] for e in previous_page['result']])
+
+    def test_iter_by_type(self):
+
+        with self.app.app_context():
+            ordered = dgraph.query('''{ q(func: type("Source"), orderasc: name, orderasc: unique_name) {
+                                        uid } }''')['q']
+            # small pages, so the name cursor is used
+            entries = list(iter_by_type('Source', page_size=2))
+            self.assertEqual([e['uid'] for e in entries], [e['uid'] for e in ordered])
+
+            self.assertEqual([e['uid'] for e in list_by_type('Source')],
+                             [e['uid'] for e in entries])
+            self.assertFalse(list_by_type('Source', filt={'eq': {'name': 'No Such Source'}}))
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -7,7 +7,7 @@ if __name__ == "__main__":
     from os.path import dirname
 
     path.append(dirname(path[0]))
-    from test_setup import BasicTestSetup
+    from test_setup import BasicTestSetup, Config
     from flaskinventory import dgraph
 
     import unittest
@@ -15,10 +15,18 @@ if __name__ == "__main__":
     import copy
     import secrets
     import datetime
+    import time
+    import json
+    import os
+    import re
+    import tempfile
+    from types import SimpleNamespace
     from flaskinventory.flaskdgraph import Schema
     from flaskinventory.flaskdgraph.dgraph_types import UID, Scalar
     from flaskinventory.main.model import Entry, Organization, Source
     from flaskinventory.main.sanitizer import Sanitizer, make_sanitizer
+    from flaskinventory.main.enrichment import init_enrichment, schedule_enrichment
+    from flaskinventory.main.bulkimport import BulkImporter, ImportCheckpoint, read_records
     from flaskinventory.errors import InventoryValidationError, InventoryPermissionError
     from flaskinventory import create_app, dgraph
     from flaskinventory.users.constants import USER_ROLES
@@ -119,6 +127,66 @@ class TestSanitizers(BasicTestSetup):
                               Sanitizer, self.mock_data2)
             
 
+    def test_unique_name_reservation(self):
+
+        with self.client:
+            response = self.client.post(
+                '/login', data={'email': 'contributor@opted.eu', 'password': 'contributor123'})
+            self.assertEqual(current_user.user_displayname, 'Contributor')
+
+            with self.app.app_context():
+                # unique name of an existing entry gets a suffix
+                sanitizer = Sanitizer({'name': 'derstandard mbh'})
+                self.assertTrue(sanitizer.entry['unique_name'].startswith('derstandard_mbh_'))
+                self.assertIn('unique_name_check', sanitizer.upsert_query)
+                self.assertTrue(sanitizer.upsert_cond.startswith('@if('))
+
+                sanitizer = Sanitizer({'name': 'Reserved Name Test'})
+                self.assertEqual(sanitizer.entry['unique_name'], 'reserved_name_test')
+
+                # a concurrent submission takes the name before the entry is committed
+                concurrent = dgraph.mutation({'uid': '_:concurrent', 'unique_name': 'reserved_name_test'})
+                concurrent_uid = concurrent.uids['concurrent']
+
+                response = sanitizer.commit()
+                new_uid = response.uids[str(sanitizer.entry_uid).replace('_:', '')]
+                self.assertNotEqual(sanitizer.entry['unique_name'], 'reserved_name_test')
+                self.assertIn('reserved_name_test', sanitizer.unique_names.taken)
+                # the retried mutation has exactly one reservation
+                self.assertEqual(sanitizer.upsert_query.count('unique_name_check'), 1)
+                self.assertEqual(sanitizer.upsert_query.count('un0 as var'), 1)
+                self.assertEqual(dgraph.get_uid('unique_name', 'reserved_name_test'), concurrent_uid)
+
+                dgraph.delete({'uid': concurrent_uid})
+                dgraph.delete({'uid': new_uid})
+
+            self.client.get('/logout')
+
+    def test_validation_plan(self):
+
+        with self.client:
+            response = self.client.post(
+                '/login', data={'email': 'contributor@opted.eu', 'password': 'contributor123'})
+            self.assertEqual(current_user.user_displayname, 'Contributor')
+
+            with self.app.app_context():
+                plan = Sanitizer.get_plan('Source')
+                self.assertIs(Sanitizer.get_plan('Source'), plan)
+                self.assertIn('parse_unique_name', plan.hooks)
+                steps = {key: (with_data, without_data) for key, _, with_data, without_data in plan.steps}
+                self.assertEqual(steps['publishes_org'][0], Sanitizer._validate_reverse)
+                self.assertEqual(steps['country'][0], Sanitizer._validate_single)
+                self.assertIn('country', plan.prefetch)
+
+                # instances share the plan of their type
+                sanitizer = make_sanitizer({'name': 'Validation Plan Org'}, Organization)
+                other = make_sanitizer({'name': 'Another Plan Org'}, 'Organization')
+                self.assertIs(sanitizer.plan, other.plan)
+                self.assertCountEqual(sanitizer.entry['dgraph.type'], ['Entry', 'Organization'])
+                self.assertIn('"Organization"', sanitizer.set_nquads)
+
+            self.client.get('/logout')
+
     def test_list_facets(self):
         mock_data = {
             'name': 'Test',
@@ -167,6 +235,43 @@ class TestSanitizers(BasicTestSetup):
                 self.assertIn('<other_names> "JB" (kind="CS-GO")',
                               sanitizer.set_nquads)
 
+    def test_json_mutation(self):
+        mock_data = {
+            'name': 'Test',
+            'other_names': 'Jay Jay,Jules',
+            'Jay Jay@kind': 'first'
+        }
+
+        with self.client:
+            response = self.client.post(
+                '/login', data={'email': 'contributor@opted.eu', 'password': 'contributor123'})
+            self.assertEqual(current_user.user_displayname, 'Contributor')
+
+            with self.app.app_context():
+                sanitizer = Sanitizer(mock_data, json_mutation=True)
+                self.assertIsNone(sanitizer.set_nquads)
+                entry = sanitizer.set_obj[0]
+                self.assertTrue(entry['uid'].startswith('_:'))
+                self.assertEqual(entry['name'], 'Test')
+                index = entry['other_names'].index('Jay Jay')
+                self.assertEqual(entry['other_names|kind'], {str(index): 'first'})
+                self.assertEqual(entry['entry_added']['uid'], current_user.id)
+                self.assertIn('entry_added|timestamp', entry['entry_added'])
+
+            self.client.get('/logout')
+
+        with self.client:
+            response = self.client.post(
+                '/login', data={'email': 'reviewer@opted.eu', 'password': 'reviewer123'})
+            with self.app.app_context():
+                edit_entry = {'uid': self.derstandard_mbh_uid, **self.mock_data1}
+                sanitizer = Sanitizer.edit(edit_entry, json_mutation=True)
+                self.assertIsNone(sanitizer.delete_nquads)
+                # list predicates are deleted with a null value
+                self.assertIn({'uid': self.derstandard_mbh_uid, 'other_names': None},
+                              sanitizer.delete_obj)
+                self.assertEqual(sanitizer.set_obj[0]['uid'], self.derstandard_mbh_uid)
+
     def test_edit_entry(self):
         # print('-- test_edit_entry() --\n')
 
@@ -243,6 +348,83 @@ class TestSanitizers(BasicTestSetup):
                 self.assertIsNotNone(sanitizer.set_nquads)
                 self.assertIsNone(sanitizer.delete_nquads)
 
+    def test_bulk_import(self):
+
+        records = [{'name': 'Bulk Import Org', 'founded': 1956,
+                    'ownership_kind': 'private ownership',
+                    'publishes': [self.falter_print_uid, self.derstandard_print]},
+                   {'name': 'Bulk Import Org', 'owns': self.derstandard_mbh_uid},
+                   {'uid': self.derstandard_mbh_uid, 'name': 'Existing Org'},
+                   {'name': 'Wrong Org', 'publishes': self.derstandard_mbh_uid}]
+
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'orgs.ndjson')
+        with open(path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            f.write('{"name": "Broken JSON\n')
+
+        importer = BulkImporter(self.app, self.contributor, 'organization',
+                                batch_size=2, workers=2, dry_run=True)
+        results = []
+        stats = importer.run(read_records(path), report=results.append)
+        self.assertEqual(stats['valid'], 2)
+        self.assertEqual(stats['invalid'], 3)
+        self.assertEqual(stats['imported'], 0)
+
+        results = {result['record']: result for result in results}
+        self.assertEqual(results[1]['unique_name'], 'bulk_import_org')
+        # unique names are not assigned twice within an import
+        self.assertNotEqual(results[2]['unique_name'], 'bulk_import_org')
+        self.assertIn('uid', results[3]['error'])
+        self.assertEqual(results[4]['status'], 'invalid')
+        self.assertIn('Invalid JSON', results[5]['error'])
+
+        # resuming skips imported and invalid records
+        checkpoint = ImportCheckpoint(os.path.join(tmp, 'orgs.checkpoint'))
+        checkpoint.write([{'record': 1, 'status': 'imported'},
+                          {'record': 3, 'status': 'invalid'},
+                          {'record': 4, 'status': 'failed'}])
+        checkpoint.close()
+        checkpoint = ImportCheckpoint(os.path.join(tmp, 'orgs.checkpoint'))
+        self.assertTrue(checkpoint.done(1))
+        self.assertFalse(checkpoint.done(2))
+        self.assertTrue(checkpoint.done(3))
+        self.assertFalse(checkpoint.done(3, retry_invalid=True))
+        self.assertFalse(checkpoint.done(4))
+        checkpoint.close()
+
+        with self.assertRaises(InventoryPermissionError):
+            BulkImporter(self.app, self.anon_user, 'Organization')
+
+    def test_bulk_import_reservation(self):
+
+        calls = []
+
+        def upsert(query, set_nquads=None, cond=None, **kwargs):
+            calls.append((query, set_nquads, cond))
+            if len(calls) == 1:
+                # a concurrent submission took the name meanwhile
+                taken = {'unique_name_check': [{'uid': '0xfff2', 'unique_name': 'bulk_reservation_org'}]}
+                return SimpleNamespace(uids={}, json=json.dumps(taken).encode('utf-8'))
+            blank_node = re.search(r'_:(r1_\w+)', set_nquads).group(1)
+            return SimpleNamespace(uids={blank_node: '0xfff3'}, json=b'{}')
+
+        importer = BulkImporter(self.app, self.contributor, 'organization', workers=1)
+        results = []
+        with patch.object(dgraph, 'upsert', side_effect=upsert):
+            stats = importer.run([{'name': 'Bulk Reservation Org'}], report=results.append)
+
+        self.assertEqual(stats['imported'], 1)
+        self.assertEqual(len(calls), 2)
+        query, set_nquads, cond = calls[0]
+        self.assertIn('eq(unique_name, "bulk_reservation_org")', query)
+        self.assertEqual(cond, '@if(eq(len(un0), 0))')
+        # the record got another name in the second attempt
+        self.assertNotEqual(results[0]['unique_name'], 'bulk_reservation_org')
+        self.assertIn(results[0]['unique_name'], calls[1][0])
+        self.assertEqual(results[0]['uid'], '0xfff3')
+
     def test_edit_org(self):
         overwrite_keys = ['country', 'publishes',
                           'is_person', 'founded', 'address_string']
@@ -367,11 +549,12 @@ class TestSanitizers(BasicTestSetup):
 
             self.client.get('/logout')
 
+    @patch('flaskinventory.main.sanitizer.perform_request')
     @patch('flaskinventory.main.sanitizer.parse_meta') 
     @patch('flaskinventory.main.sanitizer.siterankdata') 
     @patch('flaskinventory.main.sanitizer.find_sitemaps') 
     @patch('flaskinventory.main.sanitizer.find_feeds') 
-    def test_new_website(self, mock_find_feeds, mock_find_sitemaps, mock_siterankdata, mock_parse_meta):
+    def test_new_website(self, mock_find_feeds, mock_find_sitemaps, mock_siterankdata, mock_parse_meta, mock_perform_request):
         mock_parse_meta.return_value = {'names': ['Tagesthemen'], 
                                         'urls': ['https://www.tagesschau.de/']}
         mock_siterankdata.return_value = 3_000_000
@@ -420,6 +603,36 @@ class TestSanitizers(BasicTestSetup):
 
                 sanitizer = Sanitizer(new_website, dgraph_type=Source)
                 self.assertEqual(type(sanitizer.set_nquads), str)
+                # the homepage is fetched once and shared by all lookups
+                mock_perform_request.assert_called_once()
+                homepage = mock_perform_request.return_value
+                self.assertIs(mock_parse_meta.call_args.kwargs['response'], homepage)
+                self.assertIs(mock_find_sitemaps.call_args.kwargs['response'], homepage)
+                self.assertIs(mock_find_feeds.call_args.kwargs['response'], homepage)
+                self.assertEqual(len(sanitizer.entry['channel_feeds']), 2)
+                self.assertIn('audience_size', sanitizer.entry)
+
+                # slow lookups are skipped after the deadline
+                mock_siterankdata.side_effect = lambda *args, **kwargs: time.sleep(2) or 3_000_000
+                self.app.config['SOURCE_ENRICHMENT_DEADLINE'] = 0.5
+                try:
+                    start = time.perf_counter()
+                    sanitizer = Sanitizer(new_website, dgraph_type=Source)
+                    self.assertLess(time.perf_counter() - start, 2)
+                finally:
+                    self.app.config.pop('SOURCE_ENRICHMENT_DEADLINE')
+                self.assertNotIn('audience_size', sanitizer.entry)
+                self.assertEqual(len(sanitizer.entry['channel_feeds']), 2)
+
+                # bulk imports do not make third party requests
+                mock_perform_request.reset_mock()
+                mock_siterankdata.reset_mock()
+                sanitizer = make_sanitizer(new_website, Source, enrich=False)
+                mock_perform_request.assert_not_called()
+                mock_siterankdata.assert_not_called()
+                self.assertEqual(str(sanitizer.entry['name']), 'www.tagesschau.de')
+                self.assertEqual(sanitizer.entry['channel_url'], 'https://www.tagesschau.de/')
+                self.assertNotIn('channel_feeds', sanitizer.entry)
 
             self.client.get('/logout')
 
@@ -467,6 +680,115 @@ class TestSanitizers(BasicTestSetup):
 
             self.client.get('/logout')
 
+    @patch('flaskinventory.main.sanitizer.twitter')
+    def test_deferred_enrichment(self, mock_twitter):
+
+        new_twitter = {
+            "channel": self.channel_twitter,
+            "name": "@tagesschau",
+            "publication_kind": "tv show",
+            "geographic_scope": "national",
+            "country": self.germany_uid,
+            "languages": "de",
+            "publishes_org": [
+                            "ARD",
+                            self.derstandard_mbh_uid
+            ],
+        }
+
+        self.app.config['DEFERRED_ENRICHMENT'] = True
+        self.app.config['ENRICHMENT_QUEUE'] = os.path.join(tempfile.mkdtemp(), 'queue.sqlite')
+        try:
+            with self.client:
+                response = self.client.post(
+                    '/login', data={'email': 'reviewer@opted.eu', 'password': 'reviewer123'})
+                self.assertEqual(current_user.user_displayname, 'Reviewer')
+
+                with self.app.app_context():
+                    sanitizer = Sanitizer(new_twitter, dgraph_type=Source)
+                    self.assertEqual(type(sanitizer.set_nquads), str)
+                    mock_twitter.assert_not_called()
+                    self.assertEqual(sanitizer.entry['channel_url'], 'tagesschau')
+
+                    kinds = {job[0]: job for job in sanitizer.enrichment_jobs}
+                    self.assertEqual(kinds['profile'][1], sanitizer.entry_uid)
+                    self.assertEqual(kinds['profile'][2], {'channel': 'twitter', 'username': 'tagesschau'})
+                    self.assertEqual(kinds['organization'][2], {'name': 'ARD'})
+
+                    # blank nodes are resolved with the uids of the mutation
+                    queue = init_enrichment(self.app, workers=0)
+                    uids = {job[1].newid.replace('_:', ''): hex(1000 + i)
+                            for i, job in enumerate(sanitizer.enrichment_jobs)}
+                    job_ids = schedule_enrichment(sanitizer.enrichment_jobs,
+                                                  SimpleNamespace(uids=uids))
+                    self.assertEqual(len(job_ids), len(sanitizer.enrichment_jobs))
+                    self.assertEqual(queue.stats()['queued'], len(job_ids))
+                    job = queue.get(job_ids[0])
+                    self.assertEqual(job['kind'], sanitizer.enrichment_jobs[0][0])
+                    self.assertEqual(job['target'], hex(1000))
+
+                self.client.get('/logout')
+        finally:
+            self.app.config['DEFERRED_ENRICHMENT'] = False
+            self.app.extensions.pop('enrichment_queue', None)
+
+    def test_deferred_edit(self):
+
+        edit_source = {
+            "uid": self.derstandard_print,
+            "publishes_org": ["Deferred Edit Publisher"],
+        }
+
+        self.app.config['DEFERRED_ENRICHMENT'] = True
+        self.app.config['ENRICHMENT_QUEUE'] = os.path.join(tempfile.mkdtemp(), 'queue.sqlite')
+        try:
+            with self.client:
+                response = self.client.post(
+                    '/login', data={'email': 'reviewer@opted.eu', 'password': 'reviewer123'})
+                self.assertEqual(current_user.user_displayname, 'Reviewer')
+
+                with self.app.app_context():
+                    queue = init_enrichment(self.app, workers=0)
+                    sanitizer = Sanitizer.edit(edit_source, dgraph_type=Source)
+                    jobs = [job for job in sanitizer.enrichment_jobs if job[0] == 'organization']
+                    self.assertEqual(len(jobs), 1)
+                    self.assertEqual(jobs[0][2], {'name': 'Deferred Edit Publisher'})
+
+                    # jobs are queued by the commit itself, no route can forget them
+                    new_org = jobs[0][1].newid.replace('_:', '')
+                    with patch.object(dgraph, 'upsert') as mock_upsert:
+                        mock_upsert.return_value = SimpleNamespace(uids={new_org: '0xfff1'}, json=b'{}')
+                        sanitizer.commit()
+                    queued = queue.jobs(target='0xfff1')
+                    self.assertEqual(len(queued), 1)
+                    self.assertEqual(queued[0]['kind'], 'organization')
+
+                self.client.get('/logout')
+        finally:
+            self.app.config['DEFERRED_ENRICHMENT'] = False
+            self.app.extensions.pop('enrichment_queue', None)
+
+    def test_enrichment_workers(self):
+
+        class DeferredConfig(Config):
+            DEFERRED_ENRICHMENT = True
+            ENRICHMENT_QUEUE = os.path.join(tempfile.mkdtemp(), 'queue.sqlite')
+            ENRICHMENT_WORKERS = 1
+
+        app = create_app(config_class=DeferredConfig)
+        # creating the app (e.g., in CLI tools) does not start workers
+        self.assertIn('enrichment_queue', app.extensions)
+        self.assertNotIn('enrichment_workers', app.extensions)
+
+        app.test_client().get('/')
+        pool = app.extensions['enrichment_workers']
+        try:
+            self.assertIsNotNone(pool)
+            app.test_client().get('/')
+            self.assertIs(app.extensions['enrichment_workers'], pool)
+        finally:
+            pool.stop()
+
     @patch('flaskinventory.main.sanitizer.instagram') 
     def test_new_instagram(self, mock_instagram):
 
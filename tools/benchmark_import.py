@@ -0,0 +1,73 @@
+# script for measuring memory and time of building and serializing a synthetic import
+# creates the same kind of value objects the sanitizers create (UID, NewID, Scalar, ...)
+# the JSON mutation path (`dict_to_obj` + `json.dumps`, as with `json_mutation=True`) is the baseline
+# usage: python tools/benchmark_import.py --entries 10000
+
+import sys
+from os.path import dirname
+
+sys.path.append(dirname(sys.path[0]))
+
+import argparse
+import datetime
+import json
+import time
+import tracemalloc
+
+from flaskinventory.flaskdgraph.dgraph_types import (UID, NewID, Scalar, GeoScalar,
+                                                     iter_nquads, serialize_nquads, dict_to_obj)
+
+
+def make_entry(i: int) -> dict:
+    """ One synthetic news source, roughly like the output of `Sanitizer` """
+    timestamp = datetime.datetime(2022, 1, 1, 12, 0) + datetime.timedelta(minutes=i)
+    return {'uid': NewID(f'_:source{i}', suffix=i),
+            'dgraph.type': ['Entry', 'Source'],
+            'name': Scalar(f'Source {i}'),
+            'unique_name': f'source_{i}_print',
+            'other_names': [Scalar(f'S{i}', facets={'kind': 'acronym'}),
+                            Scalar(f'The Source {i}', facets={'kind': 'official'})],
+            'channel': UID('0x2a'),
+            'country': UID(hex(1000 + i % 40)),
+            'languages': ['de', 'en'],
+            'founded': Scalar(datetime.date(1950 + i % 70, 1, 1)),
+            'audience_size': Scalar(datetime.date(2022, 1, 1),
+                                    facets={'count': i * 10, 'unit': 'copies sold', 'data_from': 'benchmark'}),
+            'address_geo': GeoScalar('Point', [16.37 + i / 1e5, 48.2]),
+            'entry_review_status': 'pending',
+            'entry_added': UID('0x1', facets={'timestamp': timestamp, 'ip': '127.0.0.1'})}
+
+
+def measure(label: str, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    duration = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<28} {duration:>8.3f}s  current={current / 2**20:>8.2f} MiB  peak={peak / 2**20:>8.2f} MiB')
+    return result, duration, peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark building and serializing a synthetic import")
+    arg_parser.add_argument('--entries', type=int, default=10000,
+                            help='number of synthetic entries (default: 10000)')
+    args = arg_parser.parse_args()
+
+    print(f'{args.entries} synthetic entries\n')
+    entries, _, _ = measure('build entries', lambda: [make_entry(i) for i in range(args.entries)])
+    _, json_time, json_peak = measure('serialize (JSON, baseline)',
+                                      lambda: json.dumps([dict_to_obj(d) for d in entries], default=str))
+    _, string_time, string_peak = measure('serialize (string)', lambda: serialize_nquads(*entries))
+    _, stream_time, stream_peak = measure('serialize (streaming)',
+                                          lambda: sum(1 for d in entries for _ in iter_nquads(d)))
+
+    print('\ncompared to the JSON baseline')
+    for label, duration, peak in [('serialize (string)', string_time, string_peak),
+                                  ('serialize (streaming)', stream_time, stream_peak)]:
+        print(f'{label:<28} time x{duration / json_time:.2f}  peak x{peak / json_peak:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# script for comparing nquad and JSON mutations of synthetic news sources
+# measures client side serialization and, with --server, how long DGraph takes to apply them
+# mutations are sent without committing, the transaction is discarded afterwards
+# usage: python tools/benchmark_mutations.py --entries 1000 --batch 100 --server localhost:9080
+
+import sys
+from os.path import dirname
+
+sys.path.append(dirname(sys.path[0]))
+
+import argparse
+import json
+import time
+
+import pydgraph
+
+from flaskinventory.flaskdgraph.dgraph_types import serialize_nquads, dict_to_obj
+from flaskinventory.flaskdgraph.instrumentation import server_latency
+from benchmark_import import make_entry
+
+FORMATS = {'nquads': lambda batch: serialize_nquads(*batch),
+           'json': lambda batch: json.dumps([dict_to_obj(d) for d in batch])}
+
+
+def serialize(batches: list, fmt: str) -> tuple:
+    start = time.perf_counter()
+    payloads = [FORMATS[fmt](batch) for batch in batches]
+    return time.perf_counter() - start, payloads
+
+
+def apply(client: pydgraph.DgraphClient, payloads: list, fmt: str) -> tuple:
+    wall, server = 0.0, 0.0
+    for payload in payloads:
+        txn = client.txn()
+        try:
+            start = time.perf_counter()
+            if fmt == 'nquads':
+                mutation = pydgraph.Mutation(set_nquads=payload.encode('utf-8'))
+            else:
+                mutation = pydgraph.Mutation(set_json=payload.encode('utf-8'))
+            response = txn.do_request(txn.create_request(mutations=[mutation]))
+            wall += time.perf_counter() - start
+            server += server_latency(response) or 0.0
+        finally:
+            txn.discard()
+    return wall, server
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare nquad and JSON mutations")
+    arg_parser.add_argument('--entries', type=int, default=1000,
+                            help='number of synthetic sources (default: 1000)')
+    arg_parser.add_argument('--batch', type=int, default=100,
+                            help='sources per mutation (default: 100)')
+    arg_parser.add_argument('--server', default=None,
+                            help='DGraph alpha (e.g., localhost:9080), skip server side timings if not set')
+    args = arg_parser.parse_args()
+
+    entries = [make_entry(i) for i in range(args.entries)]
+    batches = [entries[i:i + args.batch] for i in range(0, len(entries), args.batch)]
+
+    client = None
+    if args.server:
+        client_stub = pydgraph.DgraphClientStub(args.server)
+        client = pydgraph.DgraphClient(client_stub)
+
+    print(f'{args.entries} sources in {len(batches)} mutations\n')
+    for fmt in FORMATS:
+        duration, payloads = serialize(batches, fmt)
+        size = sum(len(payload.encode('utf-8')) for payload in payloads)
+        line = f'{fmt:<8} serialize={duration:>7.3f}s  size={size / 2**20:>7.2f} MiB'
+        if client:
+            wall, server = apply(client, payloads, fmt)
+            line += f'  apply={wall:>7.3f}s  server={server:>7.3f}s'
+        print(line)
+
+    if client:
+        client_stub.close()
+
+
+if __name__ == '__main__':
+    main()
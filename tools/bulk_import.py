@@ -0,0 +1,85 @@
+# script for importing many new entries at once from a CSV or NDJSON file
+# every record is validated like an entry of the web forms, invalid records are listed in the report
+# third party lookups (wikidata, social media, ...) are queued for `tools/enrichment.py` and
+# websites are not resolved, unless --enrich is set
+# an interrupted import is resumed by running the same command again (see --checkpoint)
+# usage: python tools/bulk_import.py sources.csv --type Source --user wp3@opted.eu --report errors.csv
+#        python tools/bulk_import.py sources.ndjson --type Source --user wp3@opted.eu --dry-run
+
+import sys
+from os.path import dirname
+
+sys.path.append(dirname(sys.path[0]))
+
+import argparse
+import csv
+import time
+
+from flaskinventory import create_app
+from flaskinventory.main.bulkimport import BulkImporter, read_records, IMPORTED, VALID
+from flaskinventory.main.enrichment import init_enrichment
+from flaskinventory.users.dgraph import User
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Bulk import of new entries")
+    arg_parser.add_argument('input', help='CSV (with header) or NDJSON file')
+    arg_parser.add_argument('--type', default='Source', help='dgraph type of the entries (default: Source)')
+    arg_parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help='format of the input (default: guessed from file extension)')
+    arg_parser.add_argument('--user', required=True, help='email of the user who adds the entries')
+    arg_parser.add_argument('--workers', type=int, default=4, help='validation threads (default: 4)')
+    arg_parser.add_argument('--batch', type=int, default=100, help='records per validation batch (default: 100)')
+    arg_parser.add_argument('--chunk', type=int, default=200, help='records per transaction (default: 200)')
+    arg_parser.add_argument('--checkpoint', default=None,
+                            help='checkpoint file (default: <input>.checkpoint)')
+    arg_parser.add_argument('--retry-invalid', action='store_true',
+                            help='validate records again that were invalid in an earlier run')
+    arg_parser.add_argument('--dry-run', action='store_true', help='only validate, do not import')
+    arg_parser.add_argument('--enrich', action='store_true',
+                            help='fetch third party data during the import (slow)')
+    arg_parser.add_argument('--report', default=None, help='write records that were not imported to this CSV file')
+    args = arg_parser.parse_args()
+
+    app = create_app()
+    if not args.enrich:
+        app.config['DEFERRED_ENRICHMENT'] = True
+        init_enrichment(app, workers=0)
+
+    with app.app_context():
+        user = User(email=args.user)
+    if user.id is None:
+        sys.exit(f'User not found: {args.user}')
+
+    importer = BulkImporter(app, user, args.type,
+                            batch_size=args.batch, workers=args.workers, chunk_size=args.chunk,
+                            checkpoint=args.checkpoint or args.input + '.checkpoint',
+                            dry_run=args.dry_run, retry_invalid=args.retry_invalid,
+                            enrich=args.enrich)
+
+    report_file = None
+    writer = None
+    if args.report:
+        report_file = open(args.report, 'w', newline='', encoding='utf-8')
+        writer = csv.DictWriter(report_file, fieldnames=['record', 'name', 'status', 'error'],
+                                extrasaction='ignore')
+        writer.writeheader()
+
+    def report(result):
+        if writer and result['status'] not in [IMPORTED, VALID]:
+            writer.writerow(result)
+
+    start = time.perf_counter()
+    try:
+        stats = importer.run(read_records(args.input, fmt=args.format), report=report)
+    finally:
+        if report_file:
+            report_file.close()
+
+    print(f'Done in {time.perf_counter() - start:.1f}s')
+    for status, count in stats.items():
+        print(f'{status:<8} {count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,21 @@
+import sys
+from os.path import dirname
+
+sys.path.append(dirname(sys.path[0]))
+
 import pydgraph
 import json
-import sys
 from colorama import init, deinit, Fore, Style
 
+from flaskinventory.flaskdgraph.bulk import bulk_mutate, transaction_writer
+
+
+def report(chunk, items, error):
+    if error:
+        print(Fore.RED + f'Chunk {chunk} failed ({items} items): {error}' + Style.RESET_ALL)
+    else:
+        print(f'Chunk {chunk}: {items} items')
+
 def main():
     init()
     print(Fore.RED + 'WARNING!' + Style.RESET_ALL + " You are about to irreversibly change all entries.")
@@ -15,6 +28,7 @@ def main():
 
     client_stub = pydgraph.DgraphClientStub('localhost:9080')
     client = pydgraph.DgraphClient(client_stub)
+    write = transaction_writer(client)
 
     print(Fore.YELLOW + 'Running: Websites: Daily Visitors ' + Style.RESET_ALL)
 
@@ -44,13 +58,8 @@ def main():
     for e in result['q']:
         e.pop('audience_size|daily_visitors')
 
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_obj=result['q'])
-        txn.commit()
-    finally:
-        txn.discard()
+    # nodes are independent of each other, so chunks can be committed concurrently
+    bulk_mutate(write, result['q'], chunk_size=500, concurrency=4, progress=report)
 
     print(Fore.YELLOW + 'Running: Twitter / Instagram / Telegram / VK: Followers' + Style.RESET_ALL)
 
@@ -80,13 +89,8 @@ def main():
     for e in result['q']:
         e.pop('audience_size|followers')
 
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_obj=result['q'])
-        txn.commit()
-    finally:
-        txn.discard()
+    # nodes are independent of each other, so chunks can be committed concurrently
+    bulk_mutate(write, result['q'], chunk_size=500, concurrency=4, progress=report)
 
     print(Fore.YELLOW + 'Running: Facebook: Likes ' + Style.RESET_ALL)
 
@@ -116,13 +120,8 @@ def main():
     for e in result['q']:
         e.pop('audience_size|likes')
 
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_obj=result['q'])
-        txn.commit()
-    finally:
-        txn.discard()
+    # nodes are independent of each other, so chunks can be committed concurrently
+    bulk_mutate(write, result['q'], chunk_size=500, concurrency=4, progress=report)
 
 
 
@@ -155,13 +154,8 @@ def main():
     for e in result['q']:
         e.pop('audience_size|subscribers')
 
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_obj=result['q'])
-        txn.commit()
-    finally:
-        txn.discard()
+    # nodes are independent of each other, so chunks can be committed concurrently
+    bulk_mutate(write, result['q'], chunk_size=500, concurrency=4, progress=report)
 
 
 
@@ -191,13 +185,8 @@ def main():
     for e in result['q']:
         e.pop('audience_size|copies_sold')
 
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_obj=result['q'])
-        txn.commit()
-    finally:
-        txn.discard()
+    # nodes are independent of each other, so chunks can be committed concurrently
+    bulk_mutate(write, result['q'], chunk_size=500, concurrency=4, progress=report)
 
     # papers sold
 
@@ -227,13 +216,8 @@ def main():
     for e in result['q']:
         e.pop('audience_size|papers_sold')
 
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_obj=result['q'])
-        txn.commit()
-    finally:
-        txn.discard()
+    # nodes are independent of each other, so chunks can be committed concurrently
+    bulk_mutate(write, result['q'], chunk_size=500, concurrency=4, progress=report)
 
     print(Fore.GREEN + 'DONE!' + Style.RESET_ALL)
     deinit()
@@ -0,0 +1,63 @@
+# script for running and inspecting the background enrichment of new entries
+# (wikidata, geocoding and social media profiles, see `flaskinventory/main/enrichment.py`)
+# usage: python tools/enrichment.py --status
+#        python tools/enrichment.py --run --workers 4
+#        python tools/enrichment.py --retry-failed
+
+import sys
+from os.path import dirname
+
+sys.path.append(dirname(sys.path[0]))
+
+import argparse
+import datetime
+import time
+
+from flaskinventory import create_app
+from flaskinventory.main.enrichment import init_enrichment, start_workers
+from flaskinventory.misc.jobqueue import FAILED
+
+
+def print_jobs(jobs):
+    for job in jobs:
+        updated = datetime.datetime.fromtimestamp(job['updated']).isoformat(timespec='seconds')
+        print(f"{job['id']:>6}  {job['kind']:<12} {job['target']:<12} {job['status']:<8} "
+              f"attempts={job['attempts']}  {updated}  {job['error'] or ''}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Background enrichment of new entries")
+    arg_parser.add_argument('--status', action='store_true', help='number of jobs per status')
+    arg_parser.add_argument('--failed', action='store_true', help='list failed jobs')
+    arg_parser.add_argument('--retry-failed', action='store_true', help='queue failed jobs again')
+    arg_parser.add_argument('--run', action='store_true', help='process jobs until interrupted')
+    arg_parser.add_argument('--workers', type=int, default=2, help='number of workers for --run (default: 2)')
+    args = arg_parser.parse_args()
+
+    app = create_app()
+    # do not start the app's own workers here
+    queue = init_enrichment(app, workers=0)
+
+    if args.retry_failed:
+        print(f'{queue.retry()} failed jobs queued again')
+
+    if args.failed:
+        print_jobs(queue.jobs(status=FAILED))
+
+    if args.run:
+        pool = start_workers(app, args.workers)
+        print(f'Processing {queue} with {args.workers} workers, press Ctrl+C to stop')
+        try:
+            while True:
+                time.sleep(10)
+                print(queue.stats())
+        except KeyboardInterrupt:
+            pool.stop()
+
+    if args.status or not (args.failed or args.retry_failed or args.run):
+        for status, count in queue.stats().items():
+            print(f'{status:<8} {count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+# gunicorn settings for running the inventory with several worker processes
+# usage: gunicorn -c tools/gunicorn.conf.py 'flaskinventory:create_app()'
+# every worker opens its own DGraph connections after the fork
+
+import multiprocessing
+
+bind = 'unix:flaskinventory.sock'
+umask = 0o007
+workers = min(multiprocessing.cpu_count() * 2 + 1, 8)
+
+
+def post_worker_init(worker):
+    # connect to DGraph before the worker accepts the first request
+    from flaskinventory import dgraph
+    dgraph.warmup(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    from flaskinventory import dgraph
+    dgraph.close()
@@ -1,8 +1,21 @@
 import sys
+from os.path import dirname
+
+sys.path.append(dirname(sys.path[0]))
+
 import json
 import pydgraph
 from colorama import init, deinit, Fore, Style
 
+from flaskinventory.flaskdgraph.bulk import bulk_mutate, transaction_writer
+
+
+def report(chunk, items, error):
+    if error:
+        print(Fore.RED + f'Chunk {chunk} failed ({items} items): {error}' + Style.RESET_ALL)
+    else:
+        print(f'Chunk {chunk}: {items} items')
+
 def main():
     init()
     print(Fore.RED + 'WARNING!' + Style.RESET_ALL + " You are about to bulk insert test data.")
@@ -19,7 +32,7 @@ def main():
     # skip first two lines and last line
     sample_data = sample_data[2:]
     sample_data = sample_data[:-3]
-    sample_data = "\n".join(sample_data)
+    sample_data = [line for line in sample_data if line != '']
 
     with open('./data/countries_sample.json', 'r') as f:
         countries = json.load(f)
@@ -30,30 +43,12 @@ def main():
     client_stub = pydgraph.DgraphClientStub('localhost:9080')
     client = pydgraph.DgraphClient(client_stub)
     
-    # create transaction
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_nquads=sample_data)
-        txn.commit()
-    finally:
-        txn.discard()
-    
-    txn = client.txn()
-
-    try:
-        txn.mutate(set_obj=countries)
-        txn.commit()
-    finally:
-        txn.discard()
-
-    txn = client.txn()
+    write = transaction_writer(client)
 
-    try:
-        txn.mutate(set_obj={'set': non_optedcountries})
-        txn.commit()
-    finally:
-        txn.discard()
+    for data in [sample_data, countries['set'], non_optedcountries]:
+        result = bulk_mutate(write, data, chunk_size=1000, progress=report)
+        if not result.ok:
+            print(Fore.RED + f'{len(result.failed)} chunks failed!' + Style.RESET_ALL)
 
     # change all object's entry_review_status to "accepted"
     txn = client.txn()
@@ -0,0 +1,75 @@
+# script for ranking the entries of the DGraph slow query log
+# reads logs/dgraph_slow_queries.log (and rotated files) and groups them by fingerprint
+# usage: python tools/slowlog.py [logs/dgraph_slow_queries.log] --sort total --limit 20
+
+import argparse
+import glob
+import json
+from collections import Counter, defaultdict
+from os.path import dirname, join
+
+
+def read_entries(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def rank(entries, sort_by='total'):
+    fingerprints = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0,
+                                        'bytes': 0, 'routes': Counter(), 'query': None})
+    for entry in entries:
+        stats = fingerprints[entry['id']]
+        stats['kind'] = entry.get('kind')
+        stats['fingerprint'] = entry.get('fingerprint')
+        stats['count'] += 1
+        stats['total'] += entry['duration']
+        stats['max'] = max(stats['max'], entry['duration'])
+        stats['bytes'] += entry.get('bytes') or 0
+        stats['routes'][entry.get('route') or '<no request>'] += 1
+        if entry.get('query') and stats['query'] is None:
+            stats['query'] = entry['query']
+    for stats in fingerprints.values():
+        stats['avg'] = stats['total'] / stats['count']
+    return sorted(fingerprints.items(), key=lambda item: item[1][sort_by], reverse=True)
+
+
+def main():
+    default_path = join(dirname(dirname(__file__)), 'logs', 'dgraph_slow_queries.log')
+    parser = argparse.ArgumentParser(description='Rank slow DGraph queries by fingerprint')
+    parser.add_argument('path', nargs='?', default=default_path,
+                        help='path to the slow query log, rotated files are included')
+    parser.add_argument('--sort', choices=['total', 'count', 'avg', 'max'], default='total')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--queries', action='store_true',
+                        help='also print a sampled full query for each fingerprint')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.path + '*'))
+    if len(paths) == 0:
+        print(f'No log files found at {args.path}')
+        return
+
+    ranking = rank(read_entries(paths), sort_by=args.sort)
+    print(f'{len(ranking)} fingerprints in {len(paths)} file(s), sorted by {args.sort}\n')
+    for fp_id, stats in ranking[:args.limit]:
+        print(f"{fp_id}  {stats['kind']:<12} count={stats['count']:<6} "
+              f"total={stats['total']:.3f}s avg={stats['avg']:.3f}s max={stats['max']:.3f}s "
+              f"bytes={stats['bytes']}")
+        routes = ', '.join(f'{route} ({n})' for route, n in stats['routes'].most_common(3))
+        print(f'    routes: {routes}')
+        print(f"    {stats['fingerprint'][:300]}")
+        if args.queries and stats['query']:
+            print(f"    sample: {stats['query']}")
+        print()
+
+
+if __name__ == '__main__':
+    main()